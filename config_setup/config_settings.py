@@ -1,10 +1,100 @@
 # Config Settings
+import logging
+import threading
+from pydantic import ValidationError
 from config_setup.settings import Settings
-'''Esta función crea y devuelve una instancia de la clase Settings.
+'''Este módulo provee la instancia de Settings de toda la aplicación.
     El propósito de usar una función en lugar de instanciar la clase directamente en el código principal es:
         Modularidad: Centraliza la creación de la configuración en un solo lugar.
         Reutilización: Puedes usar esta función en varias partes de tu código sin necesidad de repetir lógica o inicializar la configuración en múltiples lugares.
-        Integración con FastAPI: Si estás utilizando FastAPI, puedes usar esta función como dependencia, lo que permite que el framework maneje su ciclo de vida.
+        Integración con FastAPI: Si estás utilizando FastAPI, puedes usar esta función como dependencia (Depends(get_settings)), lo que permite que el framework maneje su ciclo de vida.
+    La instancia se construye una sola vez por proceso (leer el .env y validarlo tiene un costo que no debe
+    pagarse en cada solicitud). Si el .env cambia (por ejemplo, al rotar el ACCESS_TOKEN) puede recargarse
+    con reload_settings(): la nueva instancia se valida por completo y recién entonces reemplaza a la anterior,
+    de modo que quien llame a get_settings() obtiene siempre una configuración válida y completa.
 '''
-def get_settings():
-    return Settings()
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+class SettingsProvider:
+    """
+    Mantiene la instancia vigente de Settings y la reemplaza de forma atómica al recargar.
+    """
+    def __init__(self):
+        self._settings: Settings = None
+        self._lock = threading.Lock()
+        self._subscribers: list = []
+        self.version = 0
+
+    def get(self) -> Settings:
+        settings = self._settings
+        if settings is None:
+            with self._lock:
+                if self._settings is None:
+                    self._settings = Settings()
+                    self.version = 1
+                settings = self._settings
+        return settings
+
+    def reload(self) -> bool:
+        """
+        Vuelve a leer el .env y las variables de entorno. Si la nueva configuración no es válida
+        se conserva la anterior.
+
+        Returns:
+            bool: True si la configuración cambió.
+        """
+        try:
+            new_settings = Settings()
+        except ValidationError as e:
+            # Se omiten los valores recibidos (input_value) porque pueden contener secretos
+            errors = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            logger.error(f"Configuración inválida, se conserva la anterior: {errors}")
+            return False
+        with self._lock:
+            old_settings = self._settings
+            if old_settings is not None and new_settings.model_dump() == old_settings.model_dump():
+                return False
+            self._settings = new_settings
+            self.version += 1
+        changed = sorted(
+            name for name in Settings.model_fields
+            if old_settings is None or getattr(old_settings, name) != getattr(new_settings, name)
+        )
+        # Solo se registran los nombres: los valores pueden ser secretos
+        logger.info(f"Configuración recargada (versión {self.version}), variables modificadas: {', '.join(changed)}")
+        for callback in list(self._subscribers):
+            try:
+                callback(old_settings, new_settings)
+            except Exception as e:
+                logger.error(f"Error al notificar la recarga de la configuración: {e}")
+        return True
+
+    def subscribe(self, callback):
+        """
+        Registra `callback(old_settings, new_settings)`, que se invoca después de cada recarga.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+_provider = SettingsProvider()
+
+def get_settings() -> Settings:
+    return _provider.get()
+
+def reload_settings(*_) -> bool:
+    return _provider.reload()
+
+def settings_version() -> int:
+    return _provider.version
+
+def subscribe_settings(callback):
+    _provider.subscribe(callback)
+
+def unsubscribe_settings(callback):
+    _provider.unsubscribe(callback)
+
+def settings_env_file() -> str:
+    return Settings.model_config.get("env_file") or ".env"
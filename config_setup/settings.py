@@ -14,6 +14,7 @@ Construye una clase con todas las variables de entorno necesarias y valida su de
 │   ├── __init__.py        # Inicializa el paquete de configuración
 │   └── settings.py        # Manejo de configuración de la aplicación
 """
+from typing import Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field, ValidationError
 
@@ -26,24 +27,166 @@ class Settings(BaseSettings):
     RECIPIENT_ITEM_1: str = Field(None, description="ID del ítem del destinatario, si es requerido")
     RECIPIENT_WAID_1: str = Field(None, description="ID de WhatsApp del destinatario, si es requerido")
     APP_ID: str = Field(..., description="ID de la aplicación")
+    APP_SECRET: Optional[str] = Field(None, description="App Secret de la aplicación, para verificar la firma X-Hub-Signature-256 del webhook")
     NGROK_AUTH_TOKEN: str = Field(..., description="Token de autenticación de ngrok")
     NGROK_COMMAND: str = Field(..., description="Comando para ngrok")
     NGROK_TIMEOUT: int = Field(..., description="Tiempo de espera para ngrok")
+    # Túnel de ngrok gestionado por el servidor (main.py lo activa)
+    NGROK_ENABLED: bool = Field(False, description="Vigilar (y lanzar si falta) el túnel de ngrok en segundo plano e informarlo en /health")
+    NGROK_API_URL: str = Field("http://127.0.0.1:4040", description="URL de la API local de ngrok")
+    NGROK_PROBE_INITIAL: float = Field(0.05, description="Segundos de la primera espera entre consultas mientras el túnel no está listo")
+    NGROK_PROBE_MAX: float = Field(2.0, description="Segundos máximos entre consultas mientras el túnel no está listo")
+    NGROK_HEALTH_INTERVAL: float = Field(30.0, description="Segundos entre verificaciones del túnel activo")
     DEBUG: bool = Field(None, description="Modo de depuración")
+    # Recarga de la configuración
+    SETTINGS_RELOAD_INTERVAL: float = Field(2.0, description="Segundos entre revisiones del .env para recargarlo en caliente (0 desactiva)")
+    # Estados de entrega (statuses)
+    DELIVERY_TRACKING_ENABLED: bool = Field(True, description="Registrar los estados de entrega (sent/delivered/read/failed) por mensaje")
+    DELIVERY_MAX_ENTRIES: int = Field(100_000, description="Cantidad máxima de mensajes seguidos en memoria")
+    DELIVERY_FLUSH_INTERVAL: float = Field(1.0, description="Segundos entre agregaciones en lote de los estados recibidos")
+    DELIVERY_BATCH_SIZE: int = Field(1000, description="Estados pendientes que adelantan la agregación")
+    DELIVERY_DB_PATH: Optional[str] = Field(None, description="Archivo SQLite donde guardar los estados agregados (opcional)")
+    DELIVERY_RETENTION: float = Field(7 * 86400.0, description="Segundos sin novedades tras los que se borra un registro de la base (0 sin límite)")
+    # Archivos multimedia
+    MEDIA_ENABLED: bool = Field(False, description="Descargar los archivos multimedia recibidos y habilitar las subidas")
+    MEDIA_CACHE_DIR: str = Field("data/media", description="Directorio de la caché de archivos multimedia")
+    MEDIA_CACHE_MAX_BYTES: int = Field(1024 ** 3, description="Tamaño máximo de la caché de medios en bytes")
+    MEDIA_MAX_CONCURRENCY: int = Field(4, description="Descargas y subidas simultáneas máximas")
+    MEDIA_CHUNK_SIZE: int = Field(64 * 1024, description="Tamaño de los bloques de descarga en bytes")
+    MEDIA_MAX_FILE_BYTES: int = Field(100 * 1024 ** 2, description="Tamaño máximo de un archivo descargado en bytes")
+    MEDIA_TIMEOUT: float = Field(60.0, description="Segundos máximos sin recibir datos durante una transferencia")
+    MEDIA_UPLOAD_TTL: float = Field(29 * 86400.0, description="Segundos durante los que se reutiliza el id de un archivo subido")
+    # Normalización de números de teléfono
+    PHONE_MAP_PATH: Optional[str] = Field(None, description="Archivo JSON de equivalencias {wa_id: número} (opcional)")
+    PHONE_COUNTRY_RULES: str = Field("", description="Reglas prefijo:reemplazo[:largo] separadas por comas, p. ej. '549:54:13,521:52:13'")
+    PHONE_CACHE_SIZE: int = Field(10_000, description="Cantidad máxima de números normalizados en caché")
+    # Reglas de respuesta automática
+    REPLY_RULES_PATH: str = Field("reply_rules.json", description="Archivo JSON con las reglas de respuesta (ver config_setup/reply_rules.example.json)")
+    REPLY_RULES_RELOAD_INTERVAL: float = Field(2.0, description="Segundos entre revisiones del archivo de reglas para recargarlo (0 desactiva)")
+    # Estado de las conversaciones
+    CONVERSATION_ENABLED: bool = Field(True, description="Mantener el estado de cada conversación por remitente (solo con un worker)")
+    CONVERSATION_MAX_ENTRIES: int = Field(50_000, description="Cantidad máxima de conversaciones en memoria")
+    CONVERSATION_TTL: float = Field(86400.0, description="Segundos de inactividad tras los que se descarta una conversación")
+    CONVERSATION_MAX_BYTES: int = Field(64 * 1024 * 1024, description="Tope estimado de memoria de las conversaciones (0 sin tope)")
+    CONVERSATION_DB_PATH: Optional[str] = Field(None, description="Archivo SQLite para que las conversaciones sobrevivan reinicios (opcional)")
+    CONVERSATION_FLUSH_INTERVAL: float = Field(1.0, description="Segundos entre escrituras en disco de las conversaciones modificadas")
+    # Exportación de eventos de mensajes (analítica)
+    EVENTS_ENABLED: bool = Field(False, description="Exportar los mensajes recibidos y enviados a archivos (ver services/event_query.py)")
+    EVENTS_DIR: str = Field("data/events", description="Directorio de los archivos de eventos")
+    EVENTS_FORMAT: str = Field("auto", description="Formato de los archivos: auto, parquet, arrow (requieren pyarrow) o jsonl")
+    EVENTS_FLUSH_INTERVAL: float = Field(5.0, description="Segundos entre escrituras en lote de los eventos")
+    EVENTS_BATCH_SIZE: int = Field(5000, description="Eventos pendientes que adelantan la escritura")
+    EVENTS_MAX_PENDING: int = Field(100_000, description="Tope de eventos pendientes en memoria (los que lo superan se descartan)")
+    EVENTS_ROTATE_BYTES: int = Field(64 * 1024 ** 2, description="Tamaño en bytes a partir del cual se abre un archivo nuevo")
+    EVENTS_ROTATE_INTERVAL: float = Field(3600.0, description="Segundos a partir de los cuales se abre un archivo nuevo")
+    EVENTS_MAX_FILES: int = Field(0, description="Archivos de eventos a conservar por worker (0 los conserva todos)")
+    # Índice de búsqueda del historial de mensajes (/search)
+    SEARCH_ENABLED: bool = Field(False, description="Indexar los mensajes recibidos y enviados para buscarlos en /search")
+    SEARCH_DB_PATH: str = Field("data/search.db", description="Archivo SQLite del índice de búsqueda")
+    SEARCH_FLUSH_INTERVAL: float = Field(1.0, description="Segundos entre escrituras en lote del índice")
+    SEARCH_BATCH_SIZE: int = Field(1000, description="Mensajes pendientes que adelantan la escritura")
+    SEARCH_MAX_PENDING: int = Field(100_000, description="Tope de mensajes pendientes de indexar en memoria")
+    SEARCH_RETENTION: float = Field(0.0, description="Segundos que se conservan los mensajes en el índice (0 sin límite)")
+    SEARCH_TOKEN: Optional[str] = Field(None, description="Token requerido en 'Authorization: Bearer' para usar /search (opcional)")
+    # Métricas (/metrics)
+    METRICS_MULTIPROC_DIR: str = Field("", description="Directorio donde cada worker vuelca sus métricas para sumarlas (se define solo con varios workers)")
+    METRICS_FLUSH_INTERVAL: float = Field(1.0, description="Segundos entre volcados de las métricas de cada worker")
+    METRICS_LOOP_LAG_INTERVAL: float = Field(0.5, description="Segundos entre mediciones del lag del event loop (0 desactiva)")
+    # Diagnóstico (staging)
+    DIAG_ENABLED: bool = Field(False, description="Activa el detector de bloqueos del event loop y el profiler por solicitud")
+    DIAG_STALL_THRESHOLD: float = Field(0.1, description="Segundos de bloqueo del event loop a partir de los cuales se captura la pila")
+    DIAG_PROFILE_HEADER: str = Field("X-Profile", description="Cabecera que activa el profiler para una solicitud")
+    DIAG_PROFILE_RATE: float = Field(0.0, description="Fracción (0-1) de solicitudes que se perfilan sin necesidad de la cabecera")
+    DIAG_PROFILE_INTERVAL: float = Field(0.005, description="Segundos entre muestras del profiler")
+    DIAG_PROFILE_DIR: str = Field("profiles", description="Directorio de los perfiles (collapsed stacks, .folded)")
+    # Logging
+    LOG_LEVEL: str = Field("INFO", description="Nivel mínimo de log de la aplicación")
+    LOG_JSON: bool = Field(True, description="Escribir los logs como JSON lines")
+    LOG_SAMPLE_RATE: float = Field(1.0, description="Fracción (0-1) de logs INFO/DEBUG del camino caliente que se escriben")
+    # Servidor (uvicorn)
+    SERVER_HOST: str = Field("0.0.0.0", description="Dirección donde escucha el servidor")
+    SERVER_PORT: int = Field(5000, description="Puerto donde escucha el servidor")
+    SERVER_WORKERS: Optional[int] = Field(None, description="Procesos worker de uvicorn (por defecto, la cantidad de CPUs)")
+    SERVER_LOOP: str = Field("auto", description="Event loop de uvicorn: auto (uvloop si está instalado), asyncio o uvloop")
+    SERVER_HTTP: str = Field("auto", description="Parser HTTP de uvicorn: auto (httptools si está instalado), h11 o httptools")
+    SERVER_RELOAD: bool = Field(False, description="Recarga automática al cambiar el código (solo desarrollo, fuerza un worker)")
+    SERVER_GRACEFUL_TIMEOUT: float = Field(30.0, description="Segundos para terminar las solicitudes en curso al apagar o recargar")
+    SERVER_LOG_LEVEL: str = Field("info", description="Nivel de log de uvicorn")
+    # Coordinación entre workers (se activa automáticamente con más de un worker)
+    COORDINATOR_ENABLED: bool = Field(False, description="Compartir deduplicación y límites de tasa entre workers")
+    COORDINATOR_HOST: str = Field("127.0.0.1", description="Dirección local del proceso coordinador")
+    COORDINATOR_PORT: int = Field(5099, description="Puerto local del proceso coordinador")
+    # Cliente HTTP saliente (Graph API)
+    WA_HTTP2: bool = Field(True, description="Usar HTTP/2 en el cliente de la Graph API (requiere el paquete h2)")
+    WA_POOL_MAX_CONNECTIONS: int = Field(100, description="Máximo de conexiones simultáneas del pool hacia la Graph API")
+    WA_POOL_MAX_KEEPALIVE: int = Field(20, description="Máximo de conexiones keep-alive ociosas en el pool")
+    WA_POOL_KEEPALIVE_EXPIRY: float = Field(30.0, description="Segundos que una conexión ociosa se mantiene abierta")
+    WA_CONNECT_TIMEOUT: float = Field(5.0, description="Segundos máximos para establecer la conexión con la Graph API")
+    WA_READ_TIMEOUT: float = Field(15.0, description="Segundos máximos de espera de la respuesta de la Graph API")
+    WA_WRITE_TIMEOUT: float = Field(15.0, description="Segundos máximos para enviar el cuerpo de la solicitud")
+    WA_POOL_TIMEOUT: float = Field(5.0, description="Segundos máximos de espera por una conexión libre del pool")
+    WEBHOOK_DECODER: str = Field("pydantic", description="Decodificador del cuerpo del webhook: pydantic, orjson, ujson o msgspec")
+    # Cola de procesamiento en segundo plano
+    WEBHOOK_ASYNC_MODE: bool = Field(False, description="Responder 200 al webhook de inmediato y procesar los mensajes en una cola")
+    QUEUE_MAXSIZE: int = Field(1000, description="Capacidad máxima de la cola de mensajes entrantes")
+    QUEUE_WORKERS: int = Field(4, description="Cantidad de workers que consumen la cola")
+    QUEUE_DRAIN_TIMEOUT: float = Field(10.0, description="Segundos máximos para vaciar la cola al apagar el servidor")
+    # Control de admisión de solicitudes entrantes
+    ADMISSION_ENABLED: bool = Field(True, description="Rechazar rápido (429/503 con Retry-After) las solicitudes que superan la capacidad")
+    ADMISSION_PATHS: str = Field("/webhook", description="Rutas controladas, separadas por comas")
+    ADMISSION_MAX_CONCURRENCY: int = Field(256, description="Solicitudes controladas en curso por worker antes de responder 503 (0 sin límite)")
+    ADMISSION_QUEUE_THRESHOLD: float = Field(0.9, description="Fracción de QUEUE_MAXSIZE a partir de la cual se responde 503 (modo asíncrono)")
+    ADMISSION_IP_RATE: float = Field(0.0, description="Solicitudes por segundo permitidas por IP de origen (0 sin límite)")
+    ADMISSION_IP_BURST: float = Field(100.0, description="Ráfaga máxima de solicitudes por IP de origen")
+    ADMISSION_MAX_SOURCES: int = Field(10_000, description="Cantidad máxima de IPs de origen recordadas")
+    ADMISSION_TRUST_FORWARDED: bool = Field(False, description="Tomar la IP de origen de X-Forwarded-For (detrás de ngrok u otro proxy)")
+    ADMISSION_RETRY_AFTER: float = Field(1.0, description="Segundos sugeridos en Retry-After cuando el servidor está saturado")
+    # Journal persistente de mensajes entrantes
+    JOURNAL_ENABLED: bool = Field(False, description="Registrar en disco los mensajes entrantes antes de confirmarlos a Meta")
+    JOURNAL_PATH: str = Field("data/journal.db", description="Ruta del archivo SQLite del journal")
+    JOURNAL_FLUSH_INTERVAL: float = Field(0.005, description="Segundos de espera para agrupar escrituras en un mismo commit")
+    JOURNAL_BATCH_SIZE: int = Field(256, description="Mensajes que fuerzan el commit sin esperar la ventana")
+    JOURNAL_COMPACT_INTERVAL: float = Field(60.0, description="Segundos entre compactaciones del journal")
+    JOURNAL_MAX_REPLAYS: int = Field(5, description="Reprocesos máximos de un mensaje antes de descartarlo")
+    # Deduplicación de mensajes reintentados por Meta
+    DEDUP_ENABLED: bool = Field(True, description="Descartar mensajes con un id ya recibido")
+    DEDUP_MAX_ENTRIES: int = Field(100_000, description="Cantidad máxima de ids recordados en memoria")
+    DEDUP_TTL: float = Field(86400.0, description="Segundos durante los que un id se considera duplicado")
+    DEDUP_DB_PATH: Optional[str] = Field(None, description="Archivo SQLite para que la caché sobreviva reinicios (opcional)")
+    # Agrupamiento de envíos salientes por destinatario
+    BATCH_ENABLED: bool = Field(False, description="Fusionar los envíos al mismo destinatario dentro de una ventana")
+    BATCH_WINDOW: float = Field(0.05, description="Segundos de espera por más mensajes del mismo destinatario")
+    BATCH_MAX_DELAY: float = Field(0.25, description="Demora máxima en segundos de un mensaje dentro de un lote")
+    BATCH_MAX_CONCURRENCY: int = Field(16, description="Envíos simultáneos máximos a distintos destinatarios")
+    # Limitador de tasa de envíos salientes
+    RATE_LIMIT_ENABLED: bool = Field(True, description="Limitar la tasa de envíos hacia la Graph API")
+    RATE_LIMIT_GLOBAL_RATE: float = Field(80.0, description="Mensajes por segundo permitidos para el número emisor")
+    RATE_LIMIT_GLOBAL_BURST: float = Field(80.0, description="Ráfaga máxima global de mensajes")
+    RATE_LIMIT_RECIPIENT_RATE: float = Field(0.2, description="Mensajes por segundo permitidos hacia un mismo destinatario")
+    RATE_LIMIT_RECIPIENT_BURST: float = Field(10.0, description="Ráfaga máxima de mensajes hacia un mismo destinatario")
+    RATE_LIMIT_MAX_REQUEUE: int = Field(5, description="Veces que se reencola un envío rechazado por límite de tasa")
+    # Reintentos y circuit breaker de envíos salientes
+    RETRY_MAX_ATTEMPTS: int = Field(3, description="Intentos máximos de un envío ante errores transitorios")
+    RETRY_BASE_DELAY: float = Field(0.2, description="Espera base en segundos del backoff exponencial")
+    RETRY_MAX_DELAY: float = Field(5.0, description="Espera máxima en segundos entre reintentos")
+    RETRY_STATUS_CODES: str = Field("500,502,503,504", description="Códigos HTTP reintentables, separados por comas")
+    CB_ENABLED: bool = Field(True, description="Activar el circuit breaker de la Graph API")
+    CB_FAILURE_THRESHOLD: int = Field(5, description="Fallos consecutivos que abren el circuito")
+    CB_RECOVERY_TIMEOUT: float = Field(30.0, description="Segundos que el circuito permanece abierto antes de probar")
+    CB_HALF_OPEN_MAX_CALLS: int = Field(1, description="Llamadas de prueba simultáneas en estado semiabierto")
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
-# Probar la configuración al iniciar
-try:
-    settings = Settings()
-except ValidationError as e:
-    raise ValueError(f"Error al cargar las variables de entorno: {e}")
-
-# Ejemplo de acceso
+# Ejemplo de acceso. La instancia de la aplicación se obtiene con config_settings.get_settings(): construirla
+# aquí, al importar el módulo, exigiría el .env completo a cualquier módulo que solo necesite la clase
 if __name__ == "__main__":
+    try:
+        settings = Settings()
+    except ValidationError as e:
+        raise ValueError(f"Error al cargar las variables de entorno: {e}")
     print(f"VERIFY_TOKEN: {settings.VERIFY_TOKEN}")
     print(f"ACCESS_TOKEN: {settings.ACCESS_TOKEN}")
     print(f"META_API_VER: {settings.META_API_VER}")
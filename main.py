@@ -1,9 +1,9 @@
 '''
 start_ngrok_tunnel.py
-Este script:
-1. Testea un tunel ngrok. 
-2.Si no esta funcionando intenta crearlo.
-3. Luego arranca el servidor FastAPI.
+Este script arranca el servidor FastAPI con la gestión del túnel ngrok activada (NGROK_ENABLED):
+1. El servidor arranca de inmediato, sin esperar al túnel.
+2. En segundo plano verifica el túnel y, si no está funcionando, intenta crearlo (utils/ngrok_utils.TunnelMonitor).
+3. El estado del túnel se consulta en GET /health.
 '''
 import logging
 import sys
@@ -27,22 +27,13 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 def start_ng_fa():
     """
     Punto de entrada principal del script.
-    Verifica y maneja el estado de un túnel ngrok.
+    Arranca el servidor; el túnel ngrok se verifica y se crea en segundo plano, sin demorar el arranque.
     """
+    # Los workers heredan el entorno: así saben que deben gestionar el túnel
+    os.environ.setdefault("NGROK_ENABLED", "true")
     try:
-        from utils.ngrok_utils import test_ngrok_tunnel, get_ngrok_tunnel
         from services.fa_services import start_fastapi
 
-        result = test_ngrok_tunnel()
-        logging.info(result)
-
-        tunnel = get_ngrok_tunnel()
-        logging.info(tunnel)
-            
-    except Exception as e:
-        logging.error(f"Error inesperado en ejecución principal start_ng_fa -> ngrok_tunnel: {e}")
-    
-    try:
         # Llama a la función de arranque del server
         start_fastapi()
     except Exception as e:
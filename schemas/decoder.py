@@ -0,0 +1,179 @@
+"""
+    This module decodes the raw body of the webhook into the typed models of schemas/webhook.py.
+    FastAPI, by default, parses the JSON into Python dicts and then validates (and copies) them with pydantic.
+    Here the raw bytes are decoded in a single step, choosing one of these decoders (WEBHOOK_DECODER):
+    + pydantic: WebhookPayload.model_validate_json (JSON parsed and validated in Rust, no intermediate dicts).
+    + orjson / ujson: fast JSON parser + WebhookPayload.model_validate.
+    + msgspec: typed msgspec Structs with the same attribute names as the pydantic models (fastest, optional).
+    The benchmark tests/bench/bench_webhook_decode.py compares them on realistic payloads.
+"""
+from typing import List, Optional
+from pydantic import ValidationError
+from fastapi.exceptions import RequestValidationError
+from schemas.webhook import WebhookPayload, MessagePayload, Message
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if msgspec is not None:
+    class _Struct(msgspec.Struct, forbid_unknown_fields=False):
+        pass
+
+    class MsgMetadata(_Struct):
+        display_phone_number: Optional[str] = None
+        phone_number_id: Optional[str] = None
+
+    class MsgProfile(_Struct):
+        name: Optional[str] = None
+
+    class MsgContact(_Struct):
+        wa_id: str
+        profile: Optional[MsgProfile] = None
+
+    class MsgText(_Struct):
+        body: str = ""
+
+    class MsgMedia(_Struct):
+        id: str
+        mime_type: Optional[str] = None
+        sha256: Optional[str] = None
+        caption: Optional[str] = None
+        filename: Optional[str] = None
+
+    class MsgMessage(_Struct, rename={"from_": "from"}):
+        from_: str
+        id: Optional[str] = None
+        timestamp: Optional[str] = None
+        type: str = "text"
+        text: Optional[MsgText] = None
+        image: Optional[MsgMedia] = None
+        audio: Optional[MsgMedia] = None
+        video: Optional[MsgMedia] = None
+        document: Optional[MsgMedia] = None
+        sticker: Optional[MsgMedia] = None
+
+    class MsgStatusError(_Struct):
+        code: int
+        title: Optional[str] = None
+
+    class MsgStatus(_Struct):
+        id: str
+        status: str
+        timestamp: Optional[str] = None
+        recipient_id: Optional[str] = None
+        errors: List[MsgStatusError] = []
+
+    class MsgMessageValue(_Struct):
+        messaging_product: Optional[str] = None
+        metadata: Optional[MsgMetadata] = None
+        contacts: List[MsgContact] = []
+        messages: List[MsgMessage] = []
+
+    class MsgValue(MsgMessageValue):
+        statuses: List[MsgStatus] = []
+
+    class MsgMessageChange(_Struct):
+        value: MsgMessageValue
+        field: Optional[str] = None
+
+    class MsgChange(MsgMessageChange):
+        value: MsgValue
+
+    class MsgMessageEntry(_Struct):
+        changes: List[MsgMessageChange]
+        id: Optional[str] = None
+
+    class MsgEntry(MsgMessageEntry):
+        changes: List[MsgChange]
+
+    class MsgMessagePayload(_Struct):
+        entry: List[MsgMessageEntry]
+        object: Optional[str] = None
+
+    class MsgWebhookPayload(MsgMessagePayload):
+        entry: List[MsgEntry]
+
+    _msgspec_decoders = {True: msgspec.json.Decoder(MsgWebhookPayload), False: msgspec.json.Decoder(MsgMessagePayload)}
+
+DECODERS = ("pydantic", "orjson", "ujson", "msgspec")
+
+def available_decoders() -> list:
+    """
+    Devuelve los decodificadores utilizables con las librerías instaladas.
+    """
+    installed = {"pydantic": True, "orjson": orjson is not None, "ujson": ujson is not None, "msgspec": msgspec is not None}
+    return [name for name in DECODERS if installed[name]]
+
+def _invalid(errors: list, body: bytes) -> RequestValidationError:
+    return RequestValidationError(errors, body=body.decode("utf-8", errors="replace"))
+
+def decode_payload(raw: bytes, decoder: str = "pydantic", statuses: bool = True):
+    """
+    Decodifica y valida el cuerpo crudo del webhook.
+
+    Args:
+        raw (bytes): Cuerpo de la solicitud tal como llegó.
+        decoder (str): Uno de DECODERS. Si la librería no está instalada se usa "pydantic".
+        statuses (bool): Si es False los estados de entrega no se validan ni se construyen
+            (`change.value` no tiene el atributo `statuses`).
+
+    Returns:
+        WebhookPayload | MsgWebhookPayload: Payload tipado (ambos exponen los mismos atributos).
+
+    Raises:
+        RequestValidationError: Si el cuerpo no es JSON válido o no respeta el esquema (respuesta 422).
+    """
+    try:
+        if decoder == "msgspec" and msgspec is not None:
+            try:
+                return _msgspec_decoders[statuses].decode(raw)
+            except msgspec.ValidationError as e:
+                raise _invalid([{"type": "value_error", "loc": ("body",), "msg": str(e)}], raw)
+            except msgspec.DecodeError as e:
+                raise _invalid([{"type": "json_invalid", "loc": ("body",), "msg": str(e)}], raw)
+        model = WebhookPayload if statuses else MessagePayload
+        if decoder == "orjson" and orjson is not None:
+            return model.model_validate(orjson.loads(raw))
+        if decoder == "ujson" and ujson is not None:
+            return model.model_validate(ujson.loads(raw))
+        return model.model_validate_json(raw)
+    except ValidationError as e:
+        raise _invalid(e.errors(include_url=False, include_context=False), raw)
+    except ValueError as e:
+        # orjson.JSONDecodeError y ujson.JSONDecodeError heredan de ValueError
+        raise _invalid([{"type": "json_invalid", "loc": ("body",), "msg": str(e)}], raw)
+
+def message_to_dict(message) -> dict:
+    """
+    Convierte un mensaje (pydantic o msgspec) a dict con los nombres de campo de Meta ("from"), sin los
+    campos en None: el resultado es el mismo con cualquier decodificador.
+    """
+    if isinstance(message, Message):
+        return message.model_dump(by_alias=True, exclude_none=True)
+    return _without_none(msgspec.to_builtins(message))
+
+def _without_none(value):
+    if isinstance(value, dict):
+        return {key: _without_none(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        return [_without_none(item) for item in value]
+    return value
+
+def message_from_dict(data: dict) -> Message:
+    """
+    Reconstruye un mensaje tipado a partir de su dict (por ejemplo, al reprocesar el journal).
+    """
+    return Message.model_validate(data)
+
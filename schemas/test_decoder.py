@@ -0,0 +1,98 @@
+import json
+import pytest
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel
+from schemas import webhook
+from schemas.decoder import available_decoders, decode_payload, message_from_dict, message_to_dict, msgspec, _without_none
+'''
+Pruebas de paridad de los decodificadores del webhook (WEBHOOK_DECODER): los Structs de msgspec son una
+copia de los modelos de pydantic, por lo que cada decodificador instalado debe producir el mismo resultado
+con las mismas notificaciones y rechazar las mismas notificaciones inválidas.
+'''
+METADATA = {"display_phone_number": "15550001111", "phone_number_id": "123456789012345"}
+
+def notification(value: dict, **extra) -> bytes:
+    value = {"messaging_product": "whatsapp", "metadata": METADATA, **value}
+    payload = {"object": "whatsapp_business_account", "entry": [{"id": "1", "changes": [{"field": "messages", "value": value}]}]}
+    payload.update(extra)
+    return json.dumps(payload).encode()
+
+VALID = {
+    "text": notification({
+        "contacts": [{"wa_id": "5491122334455", "profile": {"name": "Ana"}}],
+        "messages": [{"from": "5491122334455", "id": "wamid.1", "timestamp": "1700000000", "type": "text", "text": {"body": "hola"}}],
+    }),
+    "media": notification({"messages": [
+        {"from": "549", "id": "wamid.2", "type": "image", "image": {"id": "m1", "mime_type": "image/jpeg", "sha256": "ab", "caption": "foto"}},
+        {"from": "549", "id": "wamid.3", "type": "document", "document": {"id": "m2", "filename": "a.pdf"}},
+        {"from": "549", "id": "wamid.4", "type": "sticker", "sticker": {"id": "m3"}},
+    ]}),
+    "defaults": notification({"messages": [{"from": "549"}, {"from": "549", "text": {}}]}),
+    "statuses": notification({"statuses": [
+        {"id": "wamid.5", "status": "delivered", "timestamp": "1700000000", "recipient_id": "549"},
+        {"id": "wamid.6", "status": "failed", "errors": [{"code": 131026, "title": "Message undeliverable"}]},
+    ]}),
+    "unknown fields": notification(
+        {"messages": [{"from": "549", "id": "wamid.7", "type": "reaction", "reaction": {"emoji": "+1"}, "context": {"id": "x"}}]},
+        extra_field=True,
+    ),
+    "empty": b'{"entry": []}',
+}
+
+INVALID = {
+    "not json": b'{"entry": [',
+    "missing from": notification({"messages": [{"id": "wamid.1"}]}),
+    "number as text": notification({"messages": [{"from": 549, "id": "wamid.1"}]}),
+    "missing entry": b'{"object": "whatsapp_business_account"}',
+    "status without id": notification({"statuses": [{"status": "sent"}]}),
+}
+
+def as_dict(value) -> dict:
+    """
+    Payload decodificado (pydantic o msgspec) como dict, con el mismo criterio que message_to_dict.
+    """
+    if isinstance(value, BaseModel):
+        return value.model_dump(by_alias=True, exclude_none=True)
+    return _without_none(msgspec.to_builtins(value))
+
+def messages(payload) -> list:
+    return [message for entry in payload.entry for change in entry.changes for message in change.value.messages]
+
+@pytest.mark.parametrize("name", VALID)
+@pytest.mark.parametrize("statuses", [True, False])
+def test_decoders_agree(name, statuses):
+    expected = decode_payload(VALID[name], "pydantic", statuses=statuses)
+    for decoder in available_decoders():
+        payload = decode_payload(VALID[name], decoder, statuses=statuses)
+        assert as_dict(payload) == as_dict(expected), decoder
+        assert [message_to_dict(message) for message in messages(payload)] == \
+            [message_to_dict(message) for message in messages(expected)], decoder
+
+@pytest.mark.parametrize("name", INVALID)
+def test_decoders_reject_the_same_bodies(name):
+    for decoder in available_decoders():
+        with pytest.raises(RequestValidationError):
+            decode_payload(INVALID[name], decoder)
+
+def test_statuses_are_skipped_without_validation():
+    body = notification({"statuses": [{"status": "sent"}]})
+    for decoder in available_decoders():
+        assert not hasattr(decode_payload(body, decoder, statuses=False).entry[0].changes[0].value, "statuses")
+
+def test_message_dict_round_trip():
+    for decoder in available_decoders():
+        for message in messages(decode_payload(VALID["media"], decoder)):
+            assert message_to_dict(message_from_dict(message_to_dict(message))) == message_to_dict(message)
+
+@pytest.mark.skipif(msgspec is None, reason="msgspec no está instalado")
+def test_structs_have_the_fields_of_the_models():
+    from schemas import decoder
+    for name in ("Metadata", "Profile", "Contact", "Text", "Media", "Message", "StatusError", "Status",
+                 "MessageValue", "Value", "MessageChange", "Change", "MessageEntry", "Entry", "MessagePayload"):
+        model = getattr(webhook, name)
+        struct = getattr(decoder, "Msg" + name)
+        model_fields = {field.alias or key for key, field in model.model_fields.items()}
+        struct_fields = {field.encode_name for field in msgspec.structs.fields(struct)}
+        assert struct_fields == model_fields, name
+    assert {field.encode_name for field in msgspec.structs.fields(decoder.MsgWebhookPayload)} == \
+        set(webhook.WebhookPayload.model_fields)
@@ -14,18 +14,92 @@
 │   ├── __init__.py        # Inicializa el paquete de configuración
 │   └── settings.py        # Manejo de configuración de la aplicación
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 
-class Message(BaseModel):
-    from_: str
-    text: Optional[dict]
+class WebhookModel(BaseModel):
+    """
+    Base de los modelos del webhook: tipos estrictos e ignora los campos desconocidos
+    (Meta agrega campos nuevos con frecuencia y no deben romper la validación).
+    """
+    model_config = ConfigDict(extra="ignore", strict=True, populate_by_name=True)
 
-class Change(BaseModel):
-    value: dict
+class Metadata(WebhookModel):
+    display_phone_number: Optional[str] = None
+    phone_number_id: Optional[str] = None
 
-class Entry(BaseModel):
+class Profile(WebhookModel):
+    name: Optional[str] = None
+
+class Contact(WebhookModel):
+    wa_id: str
+    profile: Optional[Profile] = None
+
+class Text(WebhookModel):
+    body: str = ""
+
+class Media(WebhookModel):
+    id: str
+    mime_type: Optional[str] = None
+    sha256: Optional[str] = None
+    caption: Optional[str] = None
+    filename: Optional[str] = None
+
+class Message(WebhookModel):
+    from_: str = Field(alias="from")
+    id: Optional[str] = None
+    timestamp: Optional[str] = None
+    type: str = "text"
+    text: Optional[Text] = None
+    image: Optional[Media] = None
+    audio: Optional[Media] = None
+    video: Optional[Media] = None
+    document: Optional[Media] = None
+    sticker: Optional[Media] = None
+
+class StatusError(WebhookModel):
+    code: int
+    title: Optional[str] = None
+
+class Status(WebhookModel):
+    id: str
+    status: str
+    timestamp: Optional[str] = None
+    recipient_id: Optional[str] = None
+    errors: List[StatusError] = []
+
+class MessageValue(WebhookModel):
+    """
+    Contenido de un cambio sin los estados de entrega: los `statuses` del JSON se saltean sin validarse.
+    """
+    messaging_product: Optional[str] = None
+    metadata: Optional[Metadata] = None
+    contacts: List[Contact] = []
+    messages: List[Message] = []
+
+class Value(MessageValue):
+    statuses: List[Status] = []
+
+class MessageChange(WebhookModel):
+    field: Optional[str] = None
+    value: MessageValue
+
+class Change(MessageChange):
+    value: Value
+
+class MessageEntry(WebhookModel):
+    id: Optional[str] = None
+    changes: List[MessageChange]
+
+class Entry(MessageEntry):
     changes: List[Change]
 
-class WebhookPayload(BaseModel):
+class MessagePayload(WebhookModel):
+    """
+    Payload del webhook sin los estados de entrega (cuando nadie los registra, ver services/delivery_tracker.py).
+    """
+    object: Optional[str] = None
+    entry: List[MessageEntry]
+
+class WebhookPayload(MessagePayload):
     entry: List[Entry]
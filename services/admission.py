@@ -0,0 +1,162 @@
+"""
+Este módulo implementa el control de admisión de las solicitudes entrantes (ADMISSION_*).
+Cuando el tráfico supera la capacidad del servidor, atender todo hace que la latencia crezca para todos;
+es preferible rechazar rápido lo que sobra y mantener acotada la latencia de lo que se admite.
+
+Antes de leer el cuerpo de la solicitud, el middleware comprueba en este orden:
+1. Tasa por origen: un token bucket por IP (ADMISSION_IP_RATE / ADMISSION_IP_BURST). Si se agota, 429.
+   Los buckets se guardan en una LRU acotada (ADMISSION_MAX_SOURCES) para que muchas IPs no agoten la memoria.
+2. Solicitudes en curso: si ya hay ADMISSION_MAX_CONCURRENCY en proceso, 503.
+3. Profundidad de la cola (modo asíncrono): si supera ADMISSION_QUEUE_THRESHOLD de QUEUE_MAXSIZE, 503.
+Todas las respuestas de rechazo llevan Retry-After; Meta reintenta más tarde las notificaciones rechazadas.
+
+Solo se controlan las rutas de ADMISSION_PATHS (por defecto /webhook): las de monitoreo siguen respondiendo
+aunque el servidor esté saturado.
+"""
+import json
+import logging
+import math
+from collections import OrderedDict
+from services.exceptions import WebhookException, InboundRateLimitException, ServerOverloadedException
+from services.metrics import REGISTRY
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_REJECTED = REGISTRY.counter("http_admission_rejected_total", "Solicitudes rechazadas por el control de admisión", ("reason",))
+ADMISSION_IN_FLIGHT = REGISTRY.gauge("http_admission_in_flight", "Solicitudes controladas en curso")
+
+class AdmissionController:
+    """
+    Agrupa los límites de admisión con la configuración de ADMISSION_*.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.paths = frozenset()
+        self.max_concurrency = 0
+        self.queue_limit = 0
+        self.ip_rate = 0.0
+        self.ip_burst = 0.0
+        self.max_sources = 10_000
+        self.trust_forwarded = False
+        self.retry_after = 1.0
+        self.queue_depth = None
+        self.in_flight = 0
+        self._buckets: OrderedDict = OrderedDict()
+        self.admitted = 0
+        self.rejected = 0
+
+    def start(self, settings, queue_depth=None):
+        """
+        Aplica la configuración. `queue_depth` es una función que devuelve la profundidad de la cola
+        de mensajes (None en modo síncrono).
+        """
+        self.enabled = settings.ADMISSION_ENABLED
+        self.paths = frozenset(path.strip() for path in settings.ADMISSION_PATHS.split(",") if path.strip())
+        self.max_concurrency = settings.ADMISSION_MAX_CONCURRENCY
+        self.queue_limit = int(settings.QUEUE_MAXSIZE * settings.ADMISSION_QUEUE_THRESHOLD) if queue_depth is not None else 0
+        self.queue_depth = queue_depth
+        self.ip_rate = settings.ADMISSION_IP_RATE
+        self.ip_burst = max(settings.ADMISSION_IP_BURST, 1.0)
+        self.max_sources = settings.ADMISSION_MAX_SOURCES
+        self.trust_forwarded = settings.ADMISSION_TRUST_FORWARDED
+        self.retry_after = settings.ADMISSION_RETRY_AFTER
+        self._buckets.clear()
+        ADMISSION_IN_FLIGHT.callback = lambda: self.in_flight
+        if self.enabled:
+            logger.info(f"Control de admisión activo en {', '.join(sorted(self.paths))}: concurrencia {self.max_concurrency or 'sin límite'}, "
+                        f"cola {self.queue_limit or 'sin límite'}, {self.ip_rate or 'sin límite de'} solicitudes/s por IP.")
+
+    def source(self, scope) -> str:
+        """
+        IP de origen de la solicitud. Detrás de un proxy (ngrok) se usa la primera de X-Forwarded-For
+        si ADMISSION_TRUST_FORWARDED está activo.
+        """
+        if self.trust_forwarded:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-forwarded-for":
+                    return value.split(b",", 1)[0].strip().decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _bucket(self, source: str) -> TokenBucket:
+        buckets = self._buckets
+        bucket = buckets.get(source)
+        if bucket is None:
+            bucket = buckets[source] = TokenBucket(self.ip_rate, self.ip_burst)
+            if len(buckets) > self.max_sources:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(source)
+        return bucket
+
+    def check(self, scope) -> WebhookException:
+        """
+        Devuelve la excepción de rechazo de la solicitud, o None si se admite. O(1).
+        """
+        if self.ip_rate > 0:
+            source = self.source(scope)
+            bucket = self._bucket(source)
+            if not bucket.try_take():
+                ADMISSION_REJECTED.inc("rate_limit")
+                return InboundRateLimitException(source, max(math.ceil((1.0 - bucket.tokens) / self.ip_rate), 1))
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            ADMISSION_REJECTED.inc("concurrency")
+            return ServerOverloadedException("solicitudes en curso", self.retry_after)
+        if self.queue_limit and self.queue_depth() >= self.queue_limit:
+            ADMISSION_REJECTED.inc("queue_depth")
+            return ServerOverloadedException("cola de mensajes", self.retry_after)
+        return None
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return None
+        return {"in_flight": self.in_flight, "admitted": self.admitted, "rejected": self.rejected, "sources": len(self._buckets)}
+
+    def close(self):
+        self.enabled = False
+        self.queue_depth = None
+        self._buckets.clear()
+        ADMISSION_IN_FLIGHT.callback = None
+
+ADMISSION = AdmissionController()
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI que aplica el control de admisión antes de leer el cuerpo de la solicitud.
+    Los rechazos se responden directamente, con el mismo formato que el manejador de WebhookException.
+    """
+    def __init__(self, app, controller: AdmissionController = ADMISSION):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        if scope["type"] != "http" or not controller.enabled or scope["path"] not in controller.paths:
+            await self.app(scope, receive, send)
+            return
+        rejection = controller.check(scope)
+        if rejection is not None:
+            controller.rejected += 1
+            await self._reject(send, rejection)
+            return
+        controller.admitted += 1
+        controller.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.in_flight -= 1
+
+    @staticmethod
+    async def _reject(send, exc: WebhookException):
+        body = json.dumps({"error": "Webhook Error", "details": exc.detail, "extra_data": exc.extra_data}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": exc.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(math.ceil(exc.extra_data["retry_after"])).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
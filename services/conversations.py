@@ -0,0 +1,301 @@
+"""
+Este módulo mantiene el estado de cada conversación (por wa_id del remitente), para poder implementar
+flujos de varios pasos: en qué paso está el usuario, datos recolectados, cantidad de mensajes, etc.
+
+1. Los registros viven en memoria en una LRU (OrderedDict): consultar o actualizar una conversación es O(1)
+   y nunca toca el disco. Cada registro usa __slots__ para ocupar lo mínimo posible.
+2. Se descartan las conversaciones inactivas por más de CONVERSATION_TTL segundos y, si se supera la
+   cantidad máxima o el tope de memoria estimado, las menos recientes.
+3. Opcionalmente se respaldan en SQLite (CONVERSATION_DB_PATH) con escritura diferida (write-behind):
+   los cambios se acumulan y se escriben en lote en segundo plano; al arrancar se cargan las vigentes.
+
+Con varios workers (COORDINATOR_ENABLED) el almacén no se habilita: cada worker tendría su propia memoria
+y los mensajes de un mismo remitente, repartidos entre workers, verían estados distintos (y el último en
+escribir pisaría a los demás en SQLite). Los flujos de varios pasos requieren SERVER_WORKERS=1.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from config_setup.settings import Settings
+from utils.sqlite_utils import SqliteExecutor
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    wa_id         TEXT PRIMARY KEY,
+    step          TEXT,
+    data          TEXT NOT NULL,
+    message_count INTEGER NOT NULL,
+    last_message  TEXT,
+    updated_at    REAL NOT NULL,
+    expires_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_expiry ON conversations (expires_at);
+"""
+
+# Tamaño estimado de un registro vacío (objeto con __slots__, clave y nodo de la LRU), en bytes
+_RECORD_OVERHEAD = 240
+
+class ConversationState:
+    """
+    Estado de una conversación.
+
+    Attributes:
+        wa_id (str): Id de WhatsApp del remitente.
+        step (str): Paso actual del flujo (None si no hay un flujo en curso).
+        data (dict): Datos recolectados en el flujo (deben ser serializables a JSON).
+        message_count (int): Mensajes recibidos en la conversación.
+        last_message (str): Id del último mensaje recibido.
+        updated_at (float): Última actividad (time.time()).
+    """
+    __slots__ = ("wa_id", "step", "data", "message_count", "last_message", "updated_at", "size")
+
+    def __init__(self, wa_id: str, step: str = None, data: dict = None, message_count: int = 0,
+                 last_message: str = None, updated_at: float = 0.0):
+        self.wa_id = wa_id
+        self.step = step
+        self.data = data if data is not None else {}
+        self.message_count = message_count
+        self.last_message = last_message
+        self.updated_at = updated_at
+        self.size = _RECORD_OVERHEAD
+
+    def to_row(self, ttl: float) -> tuple:
+        return (self.wa_id, self.step, json.dumps(self.data, ensure_ascii=False), self.message_count,
+                self.last_message, self.updated_at, self.updated_at + ttl)
+
+    def __repr__(self) -> str:
+        return f"ConversationState(wa_id={self.wa_id!r}, step={self.step!r}, message_count={self.message_count})"
+
+class ConversationStore:
+    """
+    Almacén LRU con TTL de estados de conversación.
+
+    Args:
+        max_entries (int): Cantidad máxima de conversaciones en memoria.
+        ttl (float): Segundos de inactividad tras los que una conversación se descarta.
+        max_bytes (int): Tope estimado de memoria de los registros (0 sin tope).
+        db_path (str): Ruta del archivo SQLite de respaldo, o None para usar solo memoria.
+        flush_interval (float): Segundos entre escrituras en disco de los cambios.
+    """
+    def __init__(self, max_entries: int = 50_000, ttl: float = 86400.0, max_bytes: int = 0,
+                 db_path: str = None, flush_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._db = SqliteExecutor(db_path, name="conversations") if db_path else None
+        self._dirty: dict = {}
+        self._task: asyncio.Task = None
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+    async def open(self):
+        """
+        Carga desde disco las conversaciones vigentes y lanza la escritura en segundo plano.
+        No hace nada si el almacén es solo en memoria.
+        """
+        if self._db is None:
+            return
+        now = time.time()
+
+        def _load(conn):
+            conn.executescript(_SCHEMA)
+            conn.execute("DELETE FROM conversations WHERE expires_at <= ?", (now,))
+            return conn.execute(
+                "SELECT wa_id, step, data, message_count, last_message, updated_at FROM conversations "
+                "ORDER BY updated_at DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+
+        rows = await self._db.run(_load)
+        # De la más antigua a la más reciente, para respetar el orden LRU
+        for wa_id, step, data, message_count, last_message, updated_at in reversed(rows):
+            state = ConversationState(wa_id, step, json.loads(data), message_count, last_message, updated_at)
+            state.size = _RECORD_OVERHEAD + len(data)
+            self._entries[wa_id] = state
+            self._bytes += state.size
+        self._evict(now)
+        self._task = asyncio.create_task(self._flusher(), name="conversations-flusher")
+        logger.info(f"Conversaciones cargadas desde {self.db_path}: {len(self._entries)} vigentes.")
+
+    def get(self, wa_id: str) -> ConversationState:
+        """
+        Devuelve el estado de la conversación, o None si no existe o venció. O(1), sin acceso a disco.
+        """
+        state = self._entries.get(wa_id)
+        if state is None:
+            self.misses += 1
+            return None
+        if state.updated_at + self.ttl <= time.time():
+            self._remove(wa_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(wa_id)
+        self.hits += 1
+        return state
+
+    def get_or_create(self, wa_id: str) -> ConversationState:
+        """
+        Devuelve el estado de la conversación, creándolo si no existe.
+        """
+        state = self.get(wa_id)
+        if state is None:
+            state = ConversationState(wa_id, updated_at=time.time())
+            self._entries[wa_id] = state
+            self._bytes += state.size
+            self._evict(state.updated_at)
+        return state
+
+    def record_message(self, wa_id: str, message_id: str = None) -> ConversationState:
+        """
+        Registra un mensaje entrante en la conversación del remitente y devuelve su estado.
+        """
+        state = self.get_or_create(wa_id)
+        state.message_count += 1
+        state.last_message = message_id
+        self.save(state)
+        return state
+
+    def save(self, state: ConversationState):
+        """
+        Marca la conversación como modificada: actualiza su actividad y la encola para escribirse en disco.
+        Llamar después de cambiar step o data.
+        """
+        state.updated_at = time.time()
+        if self._db is not None:
+            self._dirty[state.wa_id] = state
+        if self.max_bytes:
+            size = _RECORD_OVERHEAD + (len(json.dumps(state.data, ensure_ascii=False)) if state.data else 2)
+            self._bytes += size - state.size
+            state.size = size
+            self._evict(state.updated_at)
+
+    def end(self, wa_id: str):
+        """
+        Termina la conversación (borra su estado).
+        """
+        if self._remove(wa_id) and self._db is not None:
+            self._dirty[wa_id] = None
+
+    def _remove(self, wa_id: str) -> bool:
+        state = self._entries.pop(wa_id, None)
+        if state is None:
+            return False
+        self._bytes -= state.size
+        return True
+
+    def _evict(self, now: float):
+        """
+        Descarta las conversaciones menos recientes si se supera la capacidad o el tope de memoria,
+        y las vencidas del extremo LRU.
+        """
+        entries = self._entries
+        while entries:
+            oldest = next(iter(entries.values()))
+            over_capacity = len(entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes)
+            if over_capacity or oldest.updated_at + self.ttl <= now:
+                entries.popitem(last=False)
+                self._bytes -= oldest.size
+                self.evictions += 1
+            else:
+                break
+
+    async def _flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Error al persistir las conversaciones: {e}")
+
+    async def _flush(self):
+        dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        # Se serializa en el event loop: los registros pueden seguir cambiando mientras se escribe
+        rows = [state.to_row(self.ttl) for state in dirty.values() if state is not None]
+        deleted = [(wa_id,) for wa_id, state in dirty.items() if state is None]
+
+        def _write(conn):
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO conversations VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.executemany("DELETE FROM conversations WHERE wa_id = ?", deleted)
+                conn.execute("DELETE FROM conversations WHERE expires_at <= ?", (time.time(),))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        await self._db.run(_write)
+        self.writes += len(rows) + len(deleted)
+
+    def stats(self) -> dict:
+        """
+        Devuelve las métricas del almacén.
+        """
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "estimated_bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "pending_writes": len(self._dirty),
+            "writes": self.writes,
+        }
+
+    async def close(self):
+        """
+        Persiste los cambios pendientes y cierra la base.
+        """
+        if self._db is None:
+            return
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self._flush()
+        self._db.close()
+
+_conversation_store: ConversationStore = None
+
+async def start_conversation_store(settings: Settings):
+    """
+    Crea y abre el almacén de conversaciones si está habilitado (CONVERSATION_ENABLED) y el servidor
+    corre con un solo worker.
+    """
+    global _conversation_store
+    if settings.CONVERSATION_ENABLED and settings.COORDINATOR_ENABLED:
+        logger.warning("CONVERSATION_ENABLED se ignora con varios workers: el estado de las conversaciones es por "
+                       "proceso. Use SERVER_WORKERS=1 para flujos de varios pasos.")
+        return
+    if settings.CONVERSATION_ENABLED and _conversation_store is None:
+        _conversation_store = ConversationStore(
+            max_entries=settings.CONVERSATION_MAX_ENTRIES,
+            ttl=settings.CONVERSATION_TTL,
+            max_bytes=settings.CONVERSATION_MAX_BYTES,
+            db_path=settings.CONVERSATION_DB_PATH,
+            flush_interval=settings.CONVERSATION_FLUSH_INTERVAL,
+        )
+        await _conversation_store.open()
+
+async def close_conversation_store():
+    global _conversation_store
+    if _conversation_store is not None:
+        await _conversation_store.close()
+        _conversation_store = None
+
+def get_conversation_store() -> ConversationStore:
+    """
+    Devuelve el almacén de conversaciones, o None si está deshabilitado.
+    """
+    return _conversation_store
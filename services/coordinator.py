@@ -0,0 +1,264 @@
+"""
+Este módulo implementa el backend de coordinación entre workers cuando el servidor corre con
+varios procesos (SERVER_WORKERS > 1). Cada worker de uvicorn es un proceso independiente, por lo
+que el estado en memoria (caché de deduplicación, token buckets del limitador de tasa) dejaría de
+ser correcto si cada uno tuviera el suyo.
+
+start_fastapi lanza un proceso coordinador que mantiene ese estado y lo expone por un socket
+local (127.0.0.1) con un protocolo de texto de una línea por operación:
+    D <id>                                  -> "1" si el id ya se vio (duplicado), "0" si es nuevo
+    F <id>                                  -> "OK" (olvida el id)
+    A <to> <grate> <gburst> <rrate> <rburst> -> segundos a esperar antes de enviar a <to>
+    P <segundos>                            -> "OK" (pausa global de envíos)
+    R <to> <segundos>                       -> "OK" (pausa de los envíos a <to>)
+    L <nombre>                              -> "1" si el worker obtiene (o ya tenía) el lock, "0" si lo tiene otro
+    S                                       -> métricas en JSON
+Cada worker mantiene una única conexión persistente (CoordinatorClient). Los locks pertenecen a la
+conexión que los obtuvo y se liberan cuando se cierra: si el worker que reprocesa el journal o mantiene
+el túnel de ngrok muere, el worker que lo reemplace puede volver a tomarlos.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from services.dedup import DedupCache
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+class CoordinatorServer:
+    """
+    Servidor de coordinación: mantiene la caché de deduplicación y los token buckets compartidos.
+
+    Args:
+        dedup (DedupCache): Caché de deduplicación compartida.
+        max_buckets (int): Cantidad máxima de buckets por destinatario (LRU).
+    """
+    def __init__(self, dedup: DedupCache, max_buckets: int = 10_000):
+        self.dedup = dedup
+        self.max_buckets = max_buckets
+        self._global: TokenBucket = None
+        self._buckets: OrderedDict = OrderedDict()
+        self._paused_until = 0.0
+        self._locks: dict = {}
+        self.requests = 0
+
+    def _bucket(self, key: str, rate: float, burst: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.rate, bucket.capacity = rate, burst
+        return bucket
+
+    def handle(self, line: str, client: object = None) -> str:
+        """
+        Ejecuta una operación del protocolo y devuelve la respuesta (sin salto de línea).
+
+        Args:
+            line (str): Operación recibida.
+            client (object): Identifica la conexión que la envió (dueña de los locks que obtenga).
+        """
+        self.requests += 1
+        op, _, args = line.partition(" ")
+        if op == "D":
+            return "1" if self.dedup.check_and_add(args) else "0"
+        if op == "F":
+            self.dedup.discard(args)
+            return "OK"
+        if op == "A":
+            to, grate, gburst, rrate, rburst = args.split(" ")
+            if self._global is None:
+                self._global = TokenBucket(float(grate), float(gburst))
+            self._global.rate, self._global.capacity = float(grate), float(gburst)
+            delay = max(
+                0.0,
+                self._paused_until - time.monotonic(),
+                self._global.reserve(),
+                self._bucket(to, float(rrate), float(rburst)).reserve(),
+            )
+            return f"{delay:.6f}"
+        if op == "P":
+            self._paused_until = max(self._paused_until, time.monotonic() + float(args))
+            return "OK"
+        if op == "R":
+            to, seconds = args.split(" ")
+            # Si el bucket ya no existe (LRU), el destinatario no tiene envíos recientes que frenar
+            bucket = self._buckets.get(to)
+            if bucket is not None:
+                bucket.drain(float(seconds))
+            return "OK"
+        if op == "L":
+            owner = self._locks.setdefault(args, client)
+            return "1" if owner is client else "0"
+        if op == "S":
+            return json.dumps({"requests": self.requests, "buckets": len(self._buckets), "locks": sorted(self._locks),
+                               "dedup": self.dedup.stats()})
+        return "ERR"
+
+    def release_locks(self, client: object):
+        """
+        Libera los locks de una conexión que se cerró.
+        """
+        for name in [name for name, owner in self._locks.items() if owner is client]:
+            del self._locks[name]
+            logger.warning(f"Coordinador: se libera el lock '{name}' de un worker desconectado.")
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = object()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = self.handle(line.decode().rstrip("\n"), client)
+                except Exception as e:
+                    logger.error(f"Coordinador: operación inválida {line!r}: {e}")
+                    response = "ERR"
+                writer.write(response.encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.release_locks(client)
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        """
+        Abre el socket local y atiende a los workers indefinidamente.
+        """
+        await self.dedup.open()
+        server = await asyncio.start_server(self._serve_client, host, port)
+        logger.info(f"Coordinador de workers escuchando en {host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.dedup.close()
+
+def run_coordinator(host: str, port: int, dedup_options: dict):
+    """
+    Punto de entrada del proceso coordinador (multiprocessing.Process).
+
+    Args:
+        host (str): Dirección local donde escuchar.
+        port (int): Puerto local donde escuchar.
+        dedup_options (dict): Argumentos para DedupCache (max_entries, ttl, db_path).
+    """
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    server = CoordinatorServer(DedupCache(**dedup_options))
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+class CoordinatorClient:
+    """
+    Cliente del coordinador usado por cada worker. Mantiene una conexión persistente y
+    serializa las operaciones (cada una es una línea de ida y una de vuelta).
+
+    Args:
+        host (str): Dirección del coordinador.
+        port (int): Puerto del coordinador.
+    """
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: asyncio.StreamReader = None
+        self._writer: asyncio.StreamWriter = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self, timeout: float = 10.0):
+        """
+        Conecta con el coordinador, reintentando mientras el proceso termina de arrancar.
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                logger.info(f"Worker conectado al coordinador en {self.host}:{self.port}")
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+
+    async def request(self, line: str) -> str:
+        """
+        Envía una operación y devuelve la respuesta.
+        """
+        async with self._lock:
+            if self._writer is None:
+                await self.connect()
+            try:
+                self._writer.write(line.encode() + b"\n")
+                await self._writer.drain()
+                response = await self._reader.readline()
+            except BaseException:
+                # Una cancelación entre el envío y la lectura dejaría la respuesta sin leer en la conexión,
+                # y la siguiente operación recibiría la respuesta de esta: se descarta la conexión
+                self._writer.close()
+                self._writer = None
+                raise
+            if not response:
+                self._writer = None
+                raise ConnectionError("El coordinador cerró la conexión")
+            return response.decode().rstrip("\n")
+
+    async def acquire_lock(self, name: str) -> bool:
+        """
+        Devuelve True si este worker obtiene el lock `name` (por ejemplo, el reproceso del journal), que
+        conserva mientras siga conectado al coordinador.
+        """
+        return await self.request(f"L {name}") == "1"
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+class RemoteDedup:
+    """
+    Caché de deduplicación compartida entre workers, respaldada por el coordinador.
+    Expone la misma interfaz asíncrona que DedupCache.
+    """
+    def __init__(self, client: CoordinatorClient):
+        self.client = client
+        self.hits = 0
+        self.misses = 0
+
+    async def open(self):
+        pass
+
+    async def is_duplicate(self, message_id: str) -> bool:
+        if not message_id:
+            return False
+        duplicate = await self.client.request(f"D {message_id.replace(chr(10), ' ')}") == "1"
+        if duplicate:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return duplicate
+
+    async def forget(self, message_id: str):
+        if message_id:
+            await self.client.request(f"F {message_id.replace(chr(10), ' ')}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": "coordinator",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    async def close(self):
+        pass
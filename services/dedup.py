@@ -0,0 +1,181 @@
+"""
+Este módulo implementa una caché de deduplicación de mensajes entrantes por su id de WhatsApp.
+Meta reintenta las entregas del webhook; gracias a esta caché cada mensaje se procesa una sola vez.
+
+La caché vive en memoria (LRU acotada con expiración por TTL). Opcionalmente se respalda en un
+archivo SQLite para sobrevivir a reinicios: las altas se escriben en segundo plano (write-behind)
+y al arrancar se cargan las que siguen vigentes, de modo que la consulta nunca toca el disco.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from utils.sqlite_utils import SqliteExecutor
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_messages (
+    message_id TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS seen_messages_expiry ON seen_messages (expires_at);
+"""
+
+class DedupCache:
+    """
+    Caché LRU con TTL de ids de mensajes ya recibidos.
+
+    Args:
+        max_entries (int): Cantidad máxima de ids en memoria (se descartan los más antiguos).
+        ttl (float): Segundos durante los que un id se considera duplicado.
+        db_path (str): Ruta del archivo SQLite de respaldo, o None para usar solo memoria.
+        flush_interval (float): Segundos entre escrituras en disco de los ids nuevos.
+    """
+    def __init__(self, max_entries: int = 100_000, ttl: float = 86400.0, db_path: str = None,
+                 flush_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._entries: OrderedDict = OrderedDict()
+        self._db = SqliteExecutor(db_path, name="dedup") if db_path else None
+        self._pending: list = []
+        self._task: asyncio.Task = None
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def open(self):
+        """
+        Carga desde disco los ids vigentes y lanza la escritura en segundo plano.
+        No hace nada si la caché es solo en memoria.
+        """
+        if self._db is None:
+            return
+        now = time.time()
+
+        def _load(conn):
+            conn.executescript(_SCHEMA)
+            conn.execute("DELETE FROM seen_messages WHERE expires_at <= ?", (now,))
+            return conn.execute(
+                "SELECT message_id, expires_at FROM seen_messages ORDER BY expires_at DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+
+        rows = await self._db.run(_load)
+        # Las filas vienen de más nueva a más antigua; se insertan al revés para respetar el orden LRU.
+        for message_id, expires_at in reversed(rows):
+            self._entries[message_id] = expires_at
+        self._task = asyncio.create_task(self._flusher(), name="dedup-flusher")
+        logger.info(f"Caché de deduplicación cargada desde {self.db_path}: {len(rows)} ids vigentes.")
+
+    def check_and_add(self, message_id: str) -> bool:
+        """
+        Indica si el mensaje ya fue recibido y, si no, lo registra.
+
+        Args:
+            message_id (str): Id del mensaje de WhatsApp (wamid...).
+
+        Returns:
+            bool: True si es un duplicado y debe descartarse. Los mensajes sin id nunca se consideran duplicados.
+        """
+        if not message_id:
+            return False
+        now = time.time()
+        expires_at = self._entries.get(message_id)
+        if expires_at is not None and expires_at > now:
+            self._entries.move_to_end(message_id)
+            self.hits += 1
+            return True
+        self.misses += 1
+        expires_at = now + self.ttl
+        self._entries[message_id] = expires_at
+        self._entries.move_to_end(message_id)
+        if self._db is not None:
+            self._pending.append((message_id, expires_at))
+        self._evict(now)
+        return False
+
+    def discard(self, message_id: str):
+        """
+        Olvida un id para que el próximo reintento de Meta se procese (por ejemplo, si el procesamiento falló).
+        """
+        if self._entries.pop(message_id, None) is not None and self._db is not None:
+            self._pending.append((message_id, 0.0))
+
+    async def is_duplicate(self, message_id: str) -> bool:
+        """
+        Versión asíncrona de check_and_add (misma interfaz que el backend compartido entre workers).
+        """
+        return self.check_and_add(message_id)
+
+    async def forget(self, message_id: str):
+        """
+        Versión asíncrona de discard (misma interfaz que el backend compartido entre workers).
+        """
+        self.discard(message_id)
+
+    def _evict(self, now: float):
+        """
+        Descarta los ids más antiguos si se supera la capacidad, y los vencidos del extremo LRU.
+        """
+        entries = self._entries
+        while entries:
+            oldest_id, oldest_expiry = next(iter(entries.items()))
+            if len(entries) > self.max_entries or oldest_expiry <= now:
+                entries.popitem(last=False)
+                self.evictions += 1
+            else:
+                break
+
+    async def _flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Error al persistir la caché de deduplicación: {e}")
+
+    async def _flush(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        def _write(conn):
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO seen_messages (message_id, expires_at) VALUES (?, ?)", pending)
+                conn.execute("DELETE FROM seen_messages WHERE expires_at <= ?", (time.time(),))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        await self._db.run(_write)
+
+    def stats(self) -> dict:
+        """
+        Devuelve las métricas de la caché (hits = duplicados descartados).
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+    async def close(self):
+        """
+        Persiste los ids pendientes y cierra la base.
+        """
+        if self._db is None:
+            return
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self._flush()
+        self._db.close()
@@ -0,0 +1,321 @@
+"""
+Este módulo registra los estados de entrega (sent, delivered, read, failed) que Meta envía en `statuses`.
+La mayor parte del tráfico del webhook son estados, por lo que su camino es mucho más barato que el de
+un mensaje:
+
+1. Si el seguimiento está deshabilitado (DELIVERY_TRACKING_ENABLED), el webhook se decodifica sin los
+   estados (schemas/webhook.py, MessagePayload): ni siquiera se validan.
+2. Si está habilitado, el webhook solo agrega los estados a una lista pendiente (sin deduplicación,
+   journal ni cola). Una tarea en segundo plano los agrega en lote cada DELIVERY_FLUSH_INTERVAL segundos
+   (o al juntar DELIVERY_BATCH_SIZE): por cada id de mensaje se guarda el estado más avanzado, la cantidad
+   de notificaciones de cada tipo y el último error.
+3. Los registros viven en una LRU acotada en memoria; opcionalmente se respaldan en SQLite
+   (DELIVERY_DB_PATH), escribiendo en el mismo lote (una sola transacción) solo los registros que
+   cambiaron. Los registros sin novedades por más de DELIVERY_RETENTION segundos se borran de la base.
+
+Con varios workers, Meta reparte los estados de un mismo mensaje entre ellos. Por eso cada lote escribe
+en SQLite lo que aportó (cantidades a sumar y estado más avanzado del lote) y la base combina los aportes
+de todos los workers; con DELIVERY_DB_PATH la consulta lee de la base el registro combinado. Sin base,
+cada worker solo conoce los estados que recibió él.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from config_setup.settings import Settings
+from services.metrics import REGISTRY
+from utils.sqlite_utils import SqliteExecutor
+
+logger = logging.getLogger(__name__)
+
+# Orden de avance de los estados: Meta puede enviarlos desordenados y se conserva el más avanzado
+STATUS_RANK = {"sent": 1, "delivered": 2, "read": 3, "failed": 4}
+
+STATUSES_RECEIVED = REGISTRY.counter("wa_statuses_received_total", "Estados de entrega recibidos por tipo", ("status",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    message_id   TEXT PRIMARY KEY,
+    recipient_id TEXT,
+    status       TEXT NOT NULL,
+    sent         INTEGER NOT NULL,
+    delivered    INTEGER NOT NULL,
+    read         INTEGER NOT NULL,
+    failed       INTEGER NOT NULL,
+    error_code   INTEGER,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deliveries_updated_at ON deliveries (updated_at);
+"""
+
+# Rango de un estado en SQL (mismo orden que STATUS_RANK)
+_RANK_SQL = "CASE {} " + " ".join(f"WHEN '{name}' THEN {rank}" for name, rank in STATUS_RANK.items()) + " ELSE 0 END"
+
+# Suma el aporte de un lote al registro guardado (quizás escrito por otro worker) sin pisarlo
+_UPSERT = f"""
+INSERT INTO deliveries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (message_id) DO UPDATE SET
+    recipient_id = coalesce(excluded.recipient_id, recipient_id),
+    status       = CASE WHEN {_RANK_SQL.format("excluded.status")} > {_RANK_SQL.format("status")}
+                        THEN excluded.status ELSE status END,
+    sent         = sent + excluded.sent,
+    delivered    = delivered + excluded.delivered,
+    read         = read + excluded.read,
+    failed       = failed + excluded.failed,
+    error_code   = coalesce(excluded.error_code, error_code),
+    updated_at   = max(updated_at, excluded.updated_at)
+"""
+
+class DeliveryRecord:
+    """
+    Estado de entrega agregado de un mensaje enviado.
+
+    Attributes:
+        message_id (str): Id del mensaje (wamid...).
+        recipient_id (str): Destinatario.
+        status (str): Estado más avanzado recibido.
+        counts (dict): Notificaciones recibidas por estado.
+        error_code (int): Código del último error informado (None si no hubo).
+        updated_at (float): Última notificación (time.time()).
+    """
+    __slots__ = ("message_id", "recipient_id", "status", "counts", "error_code", "updated_at")
+
+    def __init__(self, message_id: str, recipient_id: str = None):
+        self.message_id = message_id
+        self.recipient_id = recipient_id
+        self.status = None
+        self.counts = dict.fromkeys(STATUS_RANK, 0)
+        self.error_code = None
+        self.updated_at = 0.0
+
+    def apply(self, name: str, error_code: int, now: float):
+        """
+        Suma una notificación con estado `name` (una clave de STATUS_RANK).
+        """
+        self.counts[name] += 1
+        if self.status is None or STATUS_RANK[name] > STATUS_RANK[self.status]:
+            self.status = name
+        if error_code is not None:
+            self.error_code = error_code
+        self.updated_at = now
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "DeliveryRecord":
+        message_id, recipient_id, status, sent, delivered, read, failed, error_code, updated_at = row
+        record = cls(message_id, recipient_id)
+        record.status = status
+        record.counts.update(sent=sent, delivered=delivered, read=read, failed=failed)
+        record.error_code = error_code
+        record.updated_at = updated_at
+        return record
+
+    def to_dict(self) -> dict:
+        return {
+            "message_id": self.message_id,
+            "recipient_id": self.recipient_id,
+            "status": self.status,
+            "counts": dict(self.counts),
+            "error_code": self.error_code,
+            "updated_at": self.updated_at,
+        }
+
+    def to_row(self) -> tuple:
+        counts = self.counts
+        return (self.message_id, self.recipient_id, self.status, counts["sent"], counts["delivered"],
+                counts["read"], counts["failed"], self.error_code, self.updated_at)
+
+class DeliveryTracker:
+    """
+    Agregador de estados de entrega por id de mensaje.
+
+    Args:
+        max_entries (int): Cantidad máxima de mensajes seguidos en memoria (se descartan los más antiguos).
+        flush_interval (float): Segundos entre agregaciones de los estados pendientes.
+        batch_size (int): Estados pendientes que adelantan la agregación.
+        max_pending (int): Tope de estados pendientes; los que lo superan se descartan (y se cuentan).
+        db_path (str): Ruta del archivo SQLite de respaldo, o None para usar solo memoria.
+        retention (float): Segundos sin novedades tras los que un registro se borra de la base (0 los conserva).
+    """
+    def __init__(self, max_entries: int = 100_000, flush_interval: float = 1.0, batch_size: int = 1000,
+                 max_pending: int = 100_000, db_path: str = None, retention: float = 0.0):
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.db_path = db_path
+        self.retention = retention
+        self._last_purge = 0.0
+        self._records: OrderedDict = OrderedDict()
+        self._pending: list = []
+        self._wakeup: asyncio.Event = None
+        self._task: asyncio.Task = None
+        self._db = SqliteExecutor(db_path, name="deliveries") if db_path else None
+        # Métricas
+        self.received = 0
+        self.dropped = 0
+        self.batches = 0
+        self.evictions = 0
+
+    async def open(self):
+        if self._db is not None:
+            await self._db.run(lambda conn: conn.executescript(_SCHEMA))
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flusher(), name="delivery-tracker")
+
+    def record_many(self, statuses: list):
+        """
+        Encola estados de entrega (Status de pydantic o msgspec) para agregarlos en el próximo lote.
+        Es O(1) por estado: la agregación ocurre en segundo plano.
+        """
+        if not statuses:
+            return
+        free = self.max_pending - len(self._pending)
+        if len(statuses) > free:
+            self.dropped += len(statuses) - max(free, 0)
+            statuses = statuses[:max(free, 0)]
+        self._pending.extend(statuses)
+        self.received += len(statuses)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def get(self, message_id: str) -> DeliveryRecord:
+        """
+        Devuelve el estado agregado de un mensaje, o None si no se conoce. Con base de datos devuelve el
+        registro combinado de todos los workers; si el mensaje todavía no se escribió, el de este worker.
+        """
+        if self._db is not None:
+            row = await self._db.run(
+                lambda conn: conn.execute("SELECT * FROM deliveries WHERE message_id = ?", (message_id,)).fetchone()
+            )
+            if row is not None:
+                return DeliveryRecord.from_row(row)
+        return self._records.get(message_id)
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Error al registrar los estados de entrega: {e}")
+
+    def _aggregate(self, statuses: list) -> dict:
+        """
+        Agrega un lote de estados en los registros en memoria y devuelve el aporte del lote por mensaje
+        (registros con solo las notificaciones del lote), que es lo que se suma en la base.
+        """
+        records = self._records
+        changed = {}
+        per_status = {}
+        now = time.time()
+        for status in statuses:
+            name = status.status
+            rank = STATUS_RANK.get(name)
+            if rank is None:
+                # Estados que Meta agregue en el futuro: solo se cuentan
+                per_status["other"] = per_status.get("other", 0) + 1
+                continue
+            record = records.get(status.id)
+            if record is None:
+                record = records[status.id] = DeliveryRecord(status.id, status.recipient_id)
+            else:
+                records.move_to_end(status.id)
+            delta = changed.get(status.id)
+            if delta is None:
+                delta = changed[status.id] = DeliveryRecord(status.id, status.recipient_id)
+            error_code = status.errors[-1].code if status.errors else None
+            record.apply(name, error_code, now)
+            delta.apply(name, error_code, now)
+            per_status[name] = per_status.get(name, 0) + 1
+        while len(records) > self.max_entries:
+            records.popitem(last=False)
+            self.evictions += 1
+        for name, amount in per_status.items():
+            STATUSES_RECEIVED.inc(name, amount=amount)
+        return changed
+
+    async def _flush(self):
+        statuses, self._pending = self._pending, []
+        rows = []
+        if statuses:
+            changed = self._aggregate(statuses)
+            self.batches += 1
+            rows = [record.to_row() for record in changed.values()]
+        if self._db is None:
+            return
+        now = time.time()
+        # La limpieza por antigüedad corre a lo sumo una vez por minuto
+        purge_before = None
+        if self.retention and now - self._last_purge >= 60.0:
+            purge_before = now - self.retention
+            self._last_purge = now
+        if not rows and purge_before is None:
+            return
+
+        def _write(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(_UPSERT, rows)
+                if purge_before is not None:
+                    conn.execute("DELETE FROM deliveries WHERE updated_at < ?", (purge_before,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        await self._db.run(_write)
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._records),
+            "pending": len(self._pending),
+            "received": self.received,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "evictions": self.evictions,
+        }
+
+    async def close(self):
+        """
+        Agrega los estados pendientes y cierra la base.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._flush()
+        if self._db is not None:
+            self._db.close()
+
+_delivery_tracker: DeliveryTracker = None
+
+async def start_delivery_tracker(settings: Settings):
+    """
+    Crea y abre el registro de estados de entrega si está habilitado (DELIVERY_TRACKING_ENABLED).
+    """
+    global _delivery_tracker
+    if settings.DELIVERY_TRACKING_ENABLED and _delivery_tracker is None:
+        _delivery_tracker = DeliveryTracker(
+            max_entries=settings.DELIVERY_MAX_ENTRIES,
+            flush_interval=settings.DELIVERY_FLUSH_INTERVAL,
+            batch_size=settings.DELIVERY_BATCH_SIZE,
+            db_path=settings.DELIVERY_DB_PATH,
+            retention=settings.DELIVERY_RETENTION,
+        )
+        await _delivery_tracker.open()
+
+async def close_delivery_tracker():
+    global _delivery_tracker
+    if _delivery_tracker is not None:
+        await _delivery_tracker.close()
+        _delivery_tracker = None
+
+def get_delivery_tracker() -> DeliveryTracker:
+    """
+    Devuelve el registro de estados de entrega, o None si está deshabilitado.
+    """
+    return _delivery_tracker
@@ -0,0 +1,264 @@
+"""
+Este módulo implementa el modo de diagnóstico del servidor (DIAG_ENABLED), pensado para staging:
+
+1. Detector de bloqueos del event loop: una tarea del loop registra un "latido" periódico y un hilo
+   vigía comprueba que siga llegando. Si el loop no late durante más de DIAG_STALL_THRESHOLD segundos,
+   el vigía captura la pila del hilo del loop en ese momento (es decir, el código que lo está bloqueando,
+   por ejemplo un requests.post dentro de una ruta async) y la registra.
+2. Profiler por muestreo por solicitud: activado con una cabecera (DIAG_PROFILE_HEADER) o para una
+   fracción de las solicitudes (DIAG_PROFILE_RATE). Mientras la solicitud está en curso, un hilo toma
+   muestras de la pila del hilo del loop y al terminar las escribe en formato "collapsed stacks"
+   (una línea "marco;marco;marco cantidad" por pila), compatible con flamegraph.pl y speedscope.
+   Como el loop es compartido, las muestras incluyen lo que ejecuten otras solicitudes concurrentes.
+
+Ambos se exponen como middleware ASGI (DiagnosticsMiddleware) y no tienen costo si el modo está desactivado.
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STALLS = REGISTRY.counter("event_loop_stalls_total", "Bloqueos del event loop por encima del umbral de diagnóstico")
+
+def collapse_stack(frame) -> str:
+    """
+    Convierte una pila en una línea "collapsed": marcos desde la raíz separados por ';'.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class StallDetector:
+    """
+    Detecta bloqueos del event loop y captura la pila que los causa.
+
+    Args:
+        threshold (float): Segundos sin latido a partir de los cuales se considera un bloqueo.
+        max_reports (int): Bloqueos recientes que se conservan para /stats.
+    """
+    def __init__(self, threshold: float = 0.1, max_reports: int = 20):
+        self.threshold = threshold
+        self.check_interval = max(threshold / 4, 0.005)
+        self.reports: deque = deque(maxlen=max_reports)
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+        self._task: asyncio.Task = None
+        self._thread: threading.Thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="diag-heartbeat")
+        self._thread = threading.Thread(target=self._watch, name="diag-stall-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Detector de bloqueos del event loop activo (umbral {self.threshold * 1000:.0f} ms).")
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.check_interval)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.check_interval):
+            beat = self._beat
+            blocked = time.monotonic() - beat
+            if blocked < self.threshold or beat == reported_beat:
+                continue
+            # Primer aviso de este bloqueo: la pila actual del hilo del loop es la del código que lo bloquea
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame, limit=30)) if frame is not None else ""
+            self.stalls += 1
+            self.reports.append({"at": time.time(), "blocked_for": round(blocked, 4), "stack": collapse_stack(frame)})
+            self._loop.call_soon_threadsafe(STALLS.inc)
+            logger.warning("Event loop bloqueado durante más de %.0f ms. Pila del hilo del loop:\n%s", blocked * 1000, stack)
+
+    def stats(self) -> dict:
+        return {
+            "threshold": self.threshold,
+            "stalls": self.stalls,
+            "recent": list(self.reports),
+        }
+
+    async def close(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+class SamplingProfiler:
+    """
+    Toma muestras de la pila del hilo del event loop mientras haya solicitudes perfiladas en curso.
+
+    Args:
+        interval (float): Segundos entre muestras.
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._profiles: dict = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._loop_thread_id = None
+        self._thread: threading.Thread = None
+        self._stop = False
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._stop = False
+        self._thread = threading.Thread(target=self._sample, name="diag-profiler", daemon=True)
+        self._thread.start()
+
+    def begin(self, key) -> Counter:
+        """
+        Comienza a acumular muestras para `key` y devuelve el contador de pilas.
+        """
+        samples = Counter()
+        with self._lock:
+            self._profiles[key] = samples
+            self._active.set()
+        return samples
+
+    def end(self, key) -> Counter:
+        with self._lock:
+            samples = self._profiles.pop(key, Counter())
+            if not self._profiles:
+                self._active.clear()
+        return samples
+
+    def _sample(self):
+        while not self._stop:
+            if not self._active.wait(timeout=0.5):
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                stack = collapse_stack(frame)
+                with self._lock:
+                    for samples in self._profiles.values():
+                        samples[stack] += 1
+            time.sleep(self.interval)
+
+    def close(self):
+        self._stop = True
+        self._active.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+def write_collapsed(path: str, samples: Counter):
+    """
+    Escribe las muestras en formato collapsed stacks (entrada de flamegraph.pl / speedscope).
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+class Diagnostics:
+    """
+    Agrupa el detector de bloqueos y el profiler con la configuración de DIAG_*.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.detector: StallDetector = None
+        self.profiler: SamplingProfiler = None
+        self.header = b"x-profile"
+        self.rate = 0.0
+        self.output_dir = "profiles"
+        self.profiles_written = 0
+
+    def start(self, settings):
+        self.enabled = settings.DIAG_ENABLED
+        if not self.enabled:
+            return
+        self.header = settings.DIAG_PROFILE_HEADER.lower().encode("latin-1")
+        self.rate = settings.DIAG_PROFILE_RATE
+        self.output_dir = settings.DIAG_PROFILE_DIR
+        self.detector = StallDetector(settings.DIAG_STALL_THRESHOLD)
+        self.detector.start()
+        self.profiler = SamplingProfiler(settings.DIAG_PROFILE_INTERVAL)
+        self.profiler.start()
+        logger.warning("Modo de diagnóstico activo: no recomendado en producción.")
+
+    def should_profile(self, scope) -> bool:
+        if self.rate > 0 and random.random() < self.rate:
+            return True
+        for name, value in scope.get("headers", ()):
+            if name == self.header:
+                return value not in (b"", b"0", b"false")
+        return False
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return None
+        return {"stalls": self.detector.stats(), "profiles_written": self.profiles_written, "profile_dir": self.output_dir}
+
+    async def close(self):
+        if self.detector is not None:
+            await self.detector.close()
+            self.detector = None
+        if self.profiler is not None:
+            self.profiler.close()
+            self.profiler = None
+        self.enabled = False
+
+DIAGNOSTICS = Diagnostics()
+
+class DiagnosticsMiddleware:
+    """
+    Middleware ASGI que perfila las solicitudes seleccionadas y escribe un archivo .folded por cada una
+    en DIAG_PROFILE_DIR. El nombre del archivo se devuelve en la cabecera de respuesta X-Profile-File.
+    """
+    def __init__(self, app, diagnostics: Diagnostics = DIAGNOSTICS):
+        self.app = app
+        self.diagnostics = diagnostics
+
+    async def __call__(self, scope, receive, send):
+        diagnostics = self.diagnostics
+        if scope["type"] != "http" or not diagnostics.enabled or not diagnostics.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        key = object()
+        started = time.time()
+        filename = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}-{scope['method']}" \
+                   f"{scope['path'].replace('/', '_')}-{id(key):x}.folded"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-file", filename.encode("latin-1"))]
+            await send(message)
+
+        diagnostics.profiler.begin(key)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            samples = diagnostics.profiler.end(key)
+            if samples:
+                path = os.path.join(diagnostics.output_dir, filename)
+                try:
+                    await asyncio.to_thread(write_collapsed, path, samples)
+                    diagnostics.profiles_written += 1
+                    logger.info("Perfil de %s %s escrito en %s (%s muestras, %.1f ms).", scope["method"], scope["path"],
+                                path, sum(samples.values()), (time.time() - started) * 1000)
+                except OSError as e:
+                    logger.error(f"No se pudo escribir el perfil {path}: {e}")
@@ -0,0 +1,81 @@
+'''
+event_query.py
+Consulta de los eventos de mensajes exportados por services/event_sink.py (EVENTS_DIR).
+
+Ejecutar desde la raíz del proyecto:
+    python -m services.event_query [--dir data/events] [--since 2024-05-01] [--until 2024-05-02]
+                                   [--wa-id 5491122334455] [--direction in|out] [--type text]
+                                   [--limit 50] [--json] [--count] [--group-by direction|type|wa_id|status|day|hour]
+'''
+import argparse
+import calendar
+import json
+import sys
+import time
+from collections import Counter
+from services.event_sink import read_events
+
+_DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+def parse_time(value: str) -> float:
+    """
+    Interpreta una fecha UTC ("2024-05-01", "2024-05-01 13:00"...) o un timestamp en segundos.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for date_format in _DATE_FORMATS:
+        try:
+            return calendar.timegm(time.strptime(value, date_format))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Fecha inválida: '{value}' (formato AAAA-MM-DD [HH:MM[:SS]] o timestamp)")
+
+def group_key(event: dict, group_by: str) -> str:
+    if group_by == "day":
+        return time.strftime("%Y-%m-%d", time.gmtime(event["ts"]))
+    if group_by == "hour":
+        return time.strftime("%Y-%m-%d %H:00", time.gmtime(event["ts"]))
+    return str(event[group_by])
+
+def format_event(event: dict) -> str:
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(event["ts"]))
+    text = (event["text"] or "").replace("\n", " ")
+    return f"{stamp}  {event['direction']:<3} {event['wa_id'] or '-':<15} {event['type']:<11} {event['status'] or '-':<6} {text}"
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Consulta de los eventos de mensajes exportados")
+    parser.add_argument("--dir", default="data/events", help="Directorio de los archivos (EVENTS_DIR)")
+    parser.add_argument("--since", type=parse_time, help="Desde (UTC, incluida)")
+    parser.add_argument("--until", type=parse_time, help="Hasta (UTC, excluida)")
+    parser.add_argument("--wa-id", help="Remitente o destinatario")
+    parser.add_argument("--direction", choices=("in", "out"), help="Recibidos (in) o enviados (out)")
+    parser.add_argument("--type", help="Tipo de mensaje (text, image, template...)")
+    parser.add_argument("--limit", type=int, default=0, help="Cantidad máxima de eventos a mostrar (0 sin límite)")
+    parser.add_argument("--json", action="store_true", help="Imprimir los eventos como JSON por línea")
+    parser.add_argument("--count", action="store_true", help="Solo contar los eventos")
+    parser.add_argument("--group-by", choices=("direction", "type", "wa_id", "status", "day", "hour"),
+                        help="Contar los eventos agrupados por este campo")
+    args = parser.parse_args(argv)
+
+    events = read_events(args.dir, since=args.since, until=args.until, wa_id=args.wa_id,
+                         direction=args.direction, type=args.type)
+    if args.group_by:
+        counts = Counter(group_key(event, args.group_by) for event in events)
+        for key, amount in sorted(counts.items()):
+            print(f"{key:<20} {amount:>10}")
+        return 0
+    if args.count:
+        print(sum(1 for _ in events))
+        return 0
+    shown = 0
+    for event in events:
+        print(json.dumps(event, ensure_ascii=False) if args.json else format_event(event))
+        shown += 1
+        if args.limit and shown >= args.limit:
+            break
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
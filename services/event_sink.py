@@ -0,0 +1,413 @@
+"""
+Este módulo exporta los eventos de mensajes (services/message_events.py) a archivos para analizarlos
+fuera del servidor (ver services/event_query.py).
+
+1. Registrar un evento solo lo agrega a una lista pendiente en el event loop (O(1)); la lista está
+   acotada (EVENTS_MAX_PENDING) y los eventos que la superan se descartan y se cuentan.
+2. Una tarea en segundo plano escribe los pendientes en lote cada EVENTS_FLUSH_INTERVAL segundos
+   (o al juntar EVENTS_BATCH_SIZE). La serialización, la compresión y la escritura corren en un hilo,
+   fuera del event loop.
+3. Los archivos rotan por tamaño (EVENTS_ROTATE_BYTES) o antigüedad (EVENTS_ROTATE_INTERVAL) y se
+   conservan los últimos EVENTS_MAX_FILES. Formatos (EVENTS_FORMAT):
+   + parquet / arrow: columnares con compresión zstd, requieren pyarrow. Cada lote es un row group
+     (parquet) o un record batch (arrow). El archivo en curso se escribe como .part y se renombra al
+     rotar, porque recién entonces es legible.
+   + jsonl: JSON por línea comprimido con gzip, sin dependencias. Cada lote es un miembro gzip
+     completo, por lo que el archivo en curso se puede leer en todo momento.
+   "auto" usa parquet si pyarrow está instalado y jsonl si no.
+
+Con varios workers cada uno escribe sus propios archivos (el pid forma parte del nombre) y aplica
+EVENTS_MAX_FILES solo a los suyos y a los de procesos que ya no existen: nunca borra el archivo en curso
+de otro worker.
+"""
+import asyncio
+import calendar
+import glob
+import gzip
+import json
+import logging
+import os
+import time
+from config_setup.settings import Settings
+from services.message_events import EVENT_FIELDS, add_event_listener, remove_event_listener
+from services.metrics import REGISTRY
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EVENTS_EXPORTED = REGISTRY.counter("wa_events_exported_total", "Eventos de mensajes exportados a archivos", ("result",))
+
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow", "jsonl": ".jsonl.gz"}
+
+def resolve_format(name: str) -> str:
+    """
+    Devuelve el formato a usar: "auto" elige parquet si pyarrow está instalado y jsonl si no;
+    un formato columnar sin pyarrow también cae a jsonl.
+
+    Raises:
+        ValueError: Si el formato no existe.
+    """
+    if name != "auto" and name not in EXTENSIONS:
+        raise ValueError(f"Formato de eventos inválido: '{name}' (válidos: auto, {', '.join(EXTENSIONS)})")
+    if name in ("auto", "parquet", "arrow") and pyarrow is None:
+        if name != "auto":
+            logger.warning(f"EVENTS_FORMAT={name} requiere el paquete 'pyarrow', que no está instalado. Se usará jsonl.")
+        return "jsonl"
+    return "parquet" if name == "auto" else name
+
+def _file_pid(path: str, extension: str) -> int:
+    """
+    Pid del proceso que escribió un archivo (events-AAAAMMDD-HHMMSS-<pid>-<secuencia><extensión>), o None.
+    """
+    parts = os.path.basename(path)[:-len(extension)].split("-")
+    try:
+        return int(parts[3])
+    except (IndexError, ValueError):
+        return None
+
+def _process_alive(pid: int) -> bool:
+    """
+    Indica si el proceso existe. Fuera de POSIX no hay una forma segura de comprobarlo (os.kill terminaría
+    el proceso) y se lo supone vivo.
+    """
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _arrow_schema():
+    return pyarrow.schema([
+        ("ts", pyarrow.float64()),
+        ("direction", pyarrow.string()),
+        ("wa_id", pyarrow.string()),
+        ("message_id", pyarrow.string()),
+        ("type", pyarrow.string()),
+        ("text", pyarrow.string()),
+        ("status", pyarrow.string()),
+    ])
+
+class RotatingWriter:
+    """
+    Escritor de lotes de eventos en archivos rotativos. Sus métodos son bloqueantes: se llaman desde un hilo.
+
+    Args:
+        directory (str): Directorio de los archivos.
+        format (str): "parquet", "arrow" o "jsonl" (ver resolve_format).
+        rotate_bytes (int): Tamaño a partir del cual se abre un archivo nuevo.
+        rotate_interval (float): Segundos a partir de los cuales se abre un archivo nuevo.
+        max_files (int): Archivos terminados a conservar, además del que está en curso (se borran los más
+            antiguos de este proceso y de procesos que ya no existen); 0 los conserva todos.
+    """
+    def __init__(self, directory: str, format: str, rotate_bytes: int = 64 * 1024 ** 2,
+                 rotate_interval: float = 3600.0, max_files: int = 0):
+        self.directory = directory
+        self.format = format
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval = rotate_interval
+        self.max_files = max_files
+        self.extension = EXTENSIONS[format]
+        self._path: str = None
+        self._opened_at = 0.0
+        self._sequence = 0
+        self._sink = None
+        self._writer = None
+        self._schema = _arrow_schema() if format != "jsonl" else None
+        # Métricas
+        self.files = 0
+        self.bytes_written = 0
+
+    def write(self, rows: list):
+        """
+        Escribe un lote de filas (tuplas en el orden de EVENT_FIELDS), rotando el archivo si corresponde.
+        """
+        if self._path is None or time.time() - self._opened_at >= self.rotate_interval or self._size() >= self.rotate_bytes:
+            self.rotate()
+        before = self._size()
+        if self.format == "jsonl":
+            lines = "".join(json.dumps(dict(zip(EVENT_FIELDS, row)), ensure_ascii=False) + "\n" for row in rows)
+            with open(self._path, "ab") as f:
+                f.write(gzip.compress(lines.encode("utf-8"), compresslevel=6))
+        else:
+            columns = list(zip(*rows))
+            batch = pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+                schema=self._schema,
+            )
+            self._writer.write_batch(batch)
+            self._sink.flush()
+        self.bytes_written += self._size() - before
+
+    def _size(self) -> int:
+        if self._path is None:
+            return 0
+        if self._sink is not None:
+            return self._sink.tell()
+        try:
+            return os.path.getsize(self._path)
+        except OSError:
+            return 0
+
+    def rotate(self):
+        """
+        Cierra el archivo en curso y abre uno nuevo.
+        """
+        self.close()
+        self._sequence += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        self._path = os.path.join(self.directory, f"events-{stamp}-{os.getpid()}-{self._sequence:04d}{self.extension}")
+        self._opened_at = time.time()
+        self.files += 1
+        if self.format != "jsonl":
+            self._sink = pyarrow.OSFile(self._path + ".part", "wb")
+            if self.format == "parquet":
+                self._writer = pyarrow.parquet.ParquetWriter(self._sink, self._schema, compression="zstd")
+            else:
+                options = pyarrow.ipc.IpcWriteOptions(compression="zstd")
+                self._writer = pyarrow.ipc.new_file(self._sink, self._schema, options=options)
+        self._prune()
+
+    def _prune(self):
+        pid = os.getpid()
+        # Un worker que terminó a mitad de un archivo deja su .part incompleto (sin pie, ilegible)
+        part_extension = self.extension + ".part"
+        for path in glob.glob(os.path.join(self.directory, "events-*" + part_extension)):
+            owner = _file_pid(path, part_extension)
+            if owner is not None and owner != pid and not _process_alive(owner):
+                self._remove(path)
+        if not self.max_files:
+            return
+        # Los archivos de otros workers vivos (incluido el que tienen en curso) los administra cada uno
+        paths = []
+        for path in glob.glob(os.path.join(self.directory, "events-*" + self.extension)):
+            owner = _file_pid(path, self.extension)
+            if path != self._path and owner is not None and (owner == pid or not _process_alive(owner)):
+                paths.append(path)
+        # Los nombres empiezan con la fecha de apertura: el orden alfabético es el cronológico
+        paths.sort(key=os.path.basename)
+        for path in paths[:max(len(paths) - self.max_files, 0)]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"No se pudo borrar el archivo de eventos {path}: {e}")
+
+    def close(self):
+        """
+        Cierra el archivo en curso; los columnares se renombran a su nombre final.
+        """
+        if self._path is None:
+            return
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            os.replace(self._path + ".part", self._path)
+            self._writer = self._sink = None
+        self._path = None
+
+class EventSink:
+    """
+    Exportador de eventos de mensajes con escritura en lote fuera del event loop.
+
+    Args:
+        writer (RotatingWriter): Escritor de archivos.
+        flush_interval (float): Segundos entre escrituras de los eventos pendientes.
+        batch_size (int): Eventos pendientes que adelantan la escritura.
+        max_pending (int): Tope de eventos pendientes; los que lo superan se descartan (y se cuentan).
+    """
+    def __init__(self, writer: RotatingWriter, flush_interval: float = 5.0, batch_size: int = 5000,
+                 max_pending: int = 100_000):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: list = []
+        self._wakeup: asyncio.Event = None
+        self._closing = False
+        self._task: asyncio.Task = None
+        # Métricas
+        self.received = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+
+    async def open(self):
+        await asyncio.to_thread(os.makedirs, self.writer.directory, exist_ok=True)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flusher(), name="event-sink")
+        add_event_listener(self.add)
+
+    def add(self, event):
+        """
+        Encola un evento (MessageEvent) para escribirlo en el próximo lote. O(1).
+        """
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            EVENTS_EXPORTED.inc("dropped")
+            return
+        self._pending.append(event.to_row())
+        self.received += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flusher(self):
+        # Una sola tarea escribe: el escritor nunca se usa desde dos hilos a la vez
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush()
+
+    async def _flush(self):
+        rows, self._pending = self._pending, []
+        if not rows:
+            return
+        try:
+            await asyncio.to_thread(self.writer.write, rows)
+        except Exception as e:
+            self.errors += 1
+            EVENTS_EXPORTED.inc("error", amount=len(rows))
+            logger.error(f"Error al exportar {len(rows)} eventos de mensajes: {e}")
+            return
+        self.written += len(rows)
+        self.batches += 1
+        EVENTS_EXPORTED.inc("written", amount=len(rows))
+
+    def stats(self) -> dict:
+        return {
+            "format": self.writer.format,
+            "pending": len(self._pending),
+            "received": self.received,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+            "files": self.writer.files,
+            "bytes_written": self.writer.bytes_written,
+        }
+
+    async def close(self):
+        """
+        Deja de recibir eventos, escribe los pendientes y cierra el archivo en curso.
+        """
+        remove_event_listener(self.add)
+        if self._task is not None:
+            # No se cancela: una escritura en curso en el hilo debe terminar antes de cerrar el archivo
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self._flush()
+        await asyncio.to_thread(self.writer.close)
+
+def _read_file(path: str) -> list:
+    """
+    Lee un archivo de eventos y devuelve sus filas como dicts.
+    """
+    if path.endswith(".jsonl.gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if pyarrow is None:
+        raise RuntimeError(f"Leer {path} requiere el paquete 'pyarrow'")
+    if path.endswith(".parquet"):
+        return pyarrow.parquet.read_table(path).to_pylist()
+    with pyarrow.OSFile(path, "rb") as source:
+        return pyarrow.ipc.open_file(source).read_all().to_pylist()
+
+def event_files(directory: str) -> list:
+    """
+    Archivos de eventos del directorio, del más antiguo al más reciente (sin los .part en curso).
+    """
+    paths = []
+    for extension in EXTENSIONS.values():
+        paths.extend(glob.glob(os.path.join(directory, "events-*" + extension)))
+    return sorted(paths, key=os.path.basename)
+
+def read_events(directory: str, since: float = None, until: float = None, wa_id: str = None,
+                direction: str = None, type: str = None):
+    """
+    Recorre los eventos exportados en orden cronológico, aplicando los filtros indicados.
+
+    Args:
+        directory (str): Directorio de los archivos (EVENTS_DIR).
+        since / until (float): Rango de tiempo (time.time()); None sin límite.
+        wa_id (str): Solo los eventos de este remitente o destinatario.
+        direction (str): "in" o "out".
+        type (str): Tipo de mensaje.
+
+    Yields:
+        dict: Evento con las claves de EVENT_FIELDS.
+    """
+    for path in event_files(directory):
+        # Un archivo solo contiene eventos posteriores a su apertura (fecha en el nombre)
+        if until is not None and _opened_at(path) > until:
+            break
+        for event in _read_file(path):
+            ts = event["ts"]
+            if (since is not None and ts < since) or (until is not None and ts >= until):
+                continue
+            if (wa_id is not None and event["wa_id"] != wa_id) or (direction is not None and event["direction"] != direction):
+                continue
+            if type is not None and event["type"] != type:
+                continue
+            yield event
+
+def _opened_at(path: str) -> float:
+    stamp = os.path.basename(path)[len("events-"):len("events-YYYYmmdd-HHMMSS")]
+    try:
+        return calendar.timegm(time.strptime(stamp, "%Y%m%d-%H%M%S"))
+    except ValueError:
+        return 0.0
+
+_event_sink: EventSink = None
+
+async def start_event_sink(settings: Settings):
+    """
+    Crea y abre el exportador de eventos si está habilitado (EVENTS_ENABLED).
+    """
+    global _event_sink
+    if settings.EVENTS_ENABLED and _event_sink is None:
+        format = resolve_format(settings.EVENTS_FORMAT)
+        writer = RotatingWriter(
+            settings.EVENTS_DIR,
+            format,
+            rotate_bytes=settings.EVENTS_ROTATE_BYTES,
+            rotate_interval=settings.EVENTS_ROTATE_INTERVAL,
+            max_files=settings.EVENTS_MAX_FILES,
+        )
+        _event_sink = EventSink(
+            writer,
+            flush_interval=settings.EVENTS_FLUSH_INTERVAL,
+            batch_size=settings.EVENTS_BATCH_SIZE,
+            max_pending=settings.EVENTS_MAX_PENDING,
+        )
+        await _event_sink.open()
+        logger.info(f"Exportación de eventos de mensajes en {settings.EVENTS_DIR} (formato {format}).")
+
+async def close_event_sink():
+    global _event_sink
+    if _event_sink is not None:
+        await _event_sink.close()
+        _event_sink = None
+
+def get_event_sink() -> EventSink:
+    """
+    Devuelve el exportador de eventos, o None si está deshabilitado.
+    """
+    return _event_sink
@@ -42,4 +42,64 @@ class InvalidModeException(WebhookException):
         detail = f"Modo de verificación no válido: {provided_mode}. Solo se acepta 'subscribe'."
         extra_data = {"provided_mode": provided_mode}
         super().__init__(status_code=403, detail=detail, extra_data=extra_data)
-        
\ No newline at end of file
+
+class QueueFullException(WebhookException):
+    """
+    Excepción para cuando la cola de mensajes está llena y no se puede aceptar más trabajo.
+    Se responde 503 para que Meta reintente la entrega más tarde.
+    """
+    def __init__(self, queue_size: int):
+        detail = f"La cola de mensajes está llena ({queue_size} elementos). Reintente más tarde."
+        extra_data = {"queue_size": queue_size}
+        super().__init__(status_code=503, detail=detail, extra_data=extra_data)
+
+class CircuitOpenException(WebhookException):
+    """
+    Excepción para cuando el circuit breaker de la Graph API está abierto.
+    Se falla rápido (503) en lugar de esperar a un endpoint degradado.
+    """
+    def __init__(self, retry_in: float):
+        detail = f"La Graph API de Meta no está disponible (circuito abierto). Reintente en {retry_in:.1f} segundos."
+        extra_data = {"retry_in": round(retry_in, 3)}
+        super().__init__(status_code=503, detail=detail, extra_data=extra_data)
+
+class MediaTransferException(WebhookException):
+    """
+    Excepción para cuando no se puede descargar o subir un archivo multimedia de la Graph API
+    (error HTTP, respuesta inesperada o archivo mayor que MEDIA_MAX_FILE_BYTES).
+    """
+    def __init__(self, media: str, reason: str):
+        detail = f"No se pudo transferir el archivo multimedia {media}: {reason}"
+        extra_data = {"media": media, "reason": reason}
+        super().__init__(status_code=502, detail=detail, extra_data=extra_data)
+
+class InvalidSignatureException(WebhookException):
+    """
+    Excepción para notificaciones cuya firma X-Hub-Signature-256 falta o no coincide con APP_SECRET.
+    Se rechazan antes de decodificar el cuerpo, de modo que una solicitud falsificada no cuesta
+    validación ni envíos.
+    """
+    def __init__(self, reason: str):
+        detail = f"Firma del webhook inválida: {reason}."
+        extra_data = {"reason": reason}
+        super().__init__(status_code=401, detail=detail, extra_data=extra_data)
+
+class InboundRateLimitException(WebhookException):
+    """
+    Excepción para cuando un origen (IP) supera su tasa de solicitudes permitida.
+    Se responde 429 con Retry-After.
+    """
+    def __init__(self, source: str, retry_after: float):
+        detail = f"Demasiadas solicitudes desde {source}. Reintente en {retry_after:.0f} segundos."
+        extra_data = {"source": source, "retry_after": retry_after}
+        super().__init__(status_code=429, detail=detail, extra_data=extra_data)
+
+class ServerOverloadedException(WebhookException):
+    """
+    Excepción para cuando el servidor está saturado (demasiadas solicitudes en curso o cola casi llena).
+    Se responde 503 con Retry-After de inmediato, para que la latencia de las solicitudes admitidas no se degrade.
+    """
+    def __init__(self, reason: str, retry_after: float):
+        detail = f"Servidor saturado ({reason}). Reintente en {retry_after:.0f} segundos."
+        extra_data = {"reason": reason, "retry_after": retry_after}
+        super().__init__(status_code=503, detail=detail, extra_data=extra_data)
@@ -8,11 +8,13 @@ from fastapi.exceptions import RequestValidationError
 from starlette.requests import Request
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
 from services.exceptions import WebhookException
+from services.metrics import EXCEPTIONS
 
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """
     Maneja errores de validación de FastAPI.
     """
+    EXCEPTIONS.inc("validation_exception_handler", type(exc).__name__)
     return JSONResponse(
         status_code=HTTP_422_UNPROCESSABLE_ENTITY,
         content={
@@ -43,6 +45,7 @@ async def webhook_exception_handler(request: Request, exc: WebhookException):
     Returns:
         JSONResponse: Respuesta con código de estado y contenido detallado de la excepción.
     """
+    EXCEPTIONS.inc("webhook_exception_handler", type(exc).__name__)
     # Verifica si `extra_data` existe y es un diccionario
     extra_data = exc.extra_data if isinstance(exc.extra_data, dict) else {}
 
@@ -57,6 +60,7 @@ async def webhook_exception_handler(request: Request, exc: WebhookException):
     )
 
 async def generic_exception_handler(request: Request, exc: Exception):
+    EXCEPTIONS.inc("generic_exception_handler", type(exc).__name__)
     debug_mode = True  # Cambia esto a False en producción
     extra_data = {"message": str(exc)}
     if debug_mode:
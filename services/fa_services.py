@@ -14,15 +14,48 @@ Documentación Meta:
 https://developers.facebook.com/docs/whatsapp/api/webhooks/inbound#verify-webhook
 """
 
-from fastapi import FastAPI, Request                    # FastAPI class to handle the API requests and exceptios
+import asyncio                                          # asyncio to run background tasks (journal replay)
+import hmac                                             # hmac module to compare the search token in constant time
+import os                                               # os module to read the CPU count and pass settings to the workers
+import time                                             # time module to bound the journal replay to the worker start time
+from contextlib import asynccontextmanager              # asynccontextmanager to define the app lifespan (startup / shutdown)
+from datetime import datetime, timezone                 # datetime to parse the date range of the message search
+from typing import Literal, Optional                    # typing for the optional query parameters of /search
+from fastapi import FastAPI, Request, Depends, HTTPException, Query  # FastAPI class to handle the API requests and exceptios
 from fastapi.responses import PlainTextResponse         # PlainTextResponse class to handle the responses of the API
+from fastapi.responses import Response                  # Response class to serve the Prometheus metrics
+from fastapi.responses import JSONResponse              # JSONResponse class to report an unhealthy state with 503
 import logging                                          # logging module to handle the logging of the application
 from config_setup.settings import Settings              # Import the Settings class from the settings module
 from config_setup.config_settings import get_settings   # Import the get_settings dependenciy for FastAPI use.
+from config_setup.config_settings import reload_settings, subscribe_settings, unsubscribe_settings, settings_env_file, settings_version
+from services.message_handler import process_entry, enqueue_messages, DEFAULT_REPLY  # Business logic applied to each incoming message
+from services.reply_rules import start_reply_engine, close_reply_engine, get_reply_engine  # Auto-reply rules
+from services.conversations import start_conversation_store, close_conversation_store, get_conversation_store  # Per-sender state
+from services.phone_numbers import start_phone_normalizer, close_phone_normalizer, get_phone_normalizer  # Recipient number format
+from services.delivery_tracker import start_delivery_tracker, close_delivery_tracker, get_delivery_tracker  # Delivery statuses
+from services.media import start_media_store, close_media_store, get_media_store  # Media downloads/uploads with disk cache
+from services.event_sink import start_event_sink, close_event_sink, get_event_sink  # Message events export
+from services.search_index import start_search_index, close_search_index, get_search_index  # Full-text search of the message history
+from services.journal import MessageJournal             # Durable journal of incoming messages (at-least-once processing)
+from services.dedup import DedupCache                   # Deduplication cache of incoming message ids (Meta retries)
+from services.coordinator import CoordinatorClient, RemoteDedup  # Shared state between uvicorn workers
+from services.wa_client import start_wa_client, close_wa_client  # Shared async HTTP client for the Graph API
+from services.wa_batcher import start_batcher, close_batcher, get_batcher    # Per-recipient batching of outbound sends
+from services.rate_limiter import start_rate_limiter, close_rate_limiter, get_rate_limiter  # Outbound rate limiting
+from services.retry import start_circuit_breaker, close_circuit_breaker, get_circuit_breaker  # Circuit breaker of the Graph API
 from services.wa_services import send_message_via_wa    # Import the send_message_via_wa function to send messages via WhatsApp
-from schemas.webhook import WebhookPayload              # Import the WebhookPayload class to handle the payload of the webhook
+from services.wa_queue import MessageQueue              # Background queue to process messages after the webhook ack
+from schemas.decoder import decode_payload, message_to_dict, message_from_dict  # Fast-path decoding of the raw webhook body
+from services.signature import verify_signature, SIGNATURE_HEADER  # HMAC check of the raw webhook body
 from services.exceptions import MissingParametersException, InvalidTokenException, InvalidModeException, WebhookException
 from services.exceptions_handler import validation_exception_handler, webhook_exception_handler, generic_exception_handler
+from utils.logging_utils import setup_logging, stop_logging  # Queue-based, lazily formatted JSON logging
+from utils.file_watcher import FileWatcher              # Watches the .env file to hot-reload the settings
+from utils.ngrok_utils import TunnelMonitor             # Background ngrok tunnel readiness, reported by /health
+from services.metrics import REGISTRY, MetricsMiddleware, MESSAGES_RECEIVED, MESSAGES_DUPLICATED, QUEUE_DEPTH, message_type_label  # Prometheus metrics
+from services.diagnostics import DIAGNOSTICS, DiagnosticsMiddleware  # Event-loop stall detector and per-request profiler
+from services.admission import ADMISSION, AdmissionMiddleware  # Load shedding and per-IP limits at the webhook edge
 
 
 # Configuración de logging
@@ -30,8 +63,164 @@ from services.exceptions_handler import validation_exception_handler, webhook_ex
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida de la aplicación: abre los recursos compartidos al arrancar y los libera al apagar.
+    """
+    settings = get_settings()
+    setup_logging(settings.LOG_LEVEL, json_output=settings.LOG_JSON, sample_rate=settings.LOG_SAMPLE_RATE)
+    if not settings.APP_SECRET:
+        logger.warning("APP_SECRET no está definido: no se verifica la firma de las notificaciones del webhook.")
+    started_at = time.time()
+    app.state.decoder = settings.WEBHOOK_DECODER
+    REGISTRY.start(settings.METRICS_MULTIPROC_DIR, flush_interval=settings.METRICS_FLUSH_INTERVAL,
+                   loop_lag_interval=settings.METRICS_LOOP_LAG_INTERVAL)
+    DIAGNOSTICS.start(settings)
+    await start_wa_client(settings)
+    start_phone_normalizer(settings)
+    # Con varios workers, la deduplicación y los límites de tasa se comparten a través del coordinador
+    app.state.coordinator = None
+    if settings.COORDINATOR_ENABLED:
+        app.state.coordinator = CoordinatorClient(settings.COORDINATOR_HOST, settings.COORDINATOR_PORT)
+        await app.state.coordinator.connect()
+    # El túnel de ngrok se espera en segundo plano, en paralelo con el resto del arranque
+    app.state.tunnel = None
+    if settings.NGROK_ENABLED:
+        # Con varios workers todos lo vigilan (para /health) pero solo uno lo lanza si falta
+        start_tunnel = app.state.coordinator is None or await app.state.coordinator.acquire_lock("ngrok-tunnel")
+        app.state.tunnel = TunnelMonitor(
+            settings.NGROK_API_URL,
+            timeout=settings.NGROK_TIMEOUT,
+            probe_initial=settings.NGROK_PROBE_INITIAL,
+            probe_max=settings.NGROK_PROBE_MAX,
+            health_interval=settings.NGROK_HEALTH_INTERVAL,
+            start_tunnel=start_tunnel,
+        )
+        app.state.tunnel.start()
+    start_rate_limiter(settings, coordinator=app.state.coordinator)
+    start_circuit_breaker(settings)
+    start_batcher(settings, send_message_via_wa)
+    await start_reply_engine(settings, DEFAULT_REPLY)
+    await start_conversation_store(settings)
+    await start_delivery_tracker(settings)
+    await start_media_store(settings)
+    await start_event_sink(settings)
+    await start_search_index(settings)
+    if settings.SEARCH_ENABLED and not settings.SEARCH_TOKEN:
+        logger.warning("SEARCH_TOKEN no está definido: /search expone el historial de mensajes sin autenticación.")
+    app.state.dedup = None
+    if settings.DEDUP_ENABLED:
+        if app.state.coordinator is not None:
+            app.state.dedup = RemoteDedup(app.state.coordinator)
+        else:
+            app.state.dedup = DedupCache(max_entries=settings.DEDUP_MAX_ENTRIES, ttl=settings.DEDUP_TTL, db_path=settings.DEDUP_DB_PATH)
+        await app.state.dedup.open()
+    app.state.journal = None
+    if settings.JOURNAL_ENABLED:
+        app.state.journal = MessageJournal(
+            settings.JOURNAL_PATH,
+            flush_interval=settings.JOURNAL_FLUSH_INTERVAL,
+            batch_size=settings.JOURNAL_BATCH_SIZE,
+            compact_interval=settings.JOURNAL_COMPACT_INTERVAL,
+            max_replays=settings.JOURNAL_MAX_REPLAYS,
+        )
+        await app.state.journal.open()
+    app.state.message_queue = None
+    if settings.WEBHOOK_ASYNC_MODE:
+        journal = app.state.journal
+        app.state.message_queue = MessageQueue(
+            lambda item: process_entry(journal, *item), maxsize=settings.QUEUE_MAXSIZE, workers=settings.QUEUE_WORKERS
+        )
+        app.state.message_queue.start()
+        QUEUE_DEPTH.callback = app.state.message_queue.depth
+    queue = app.state.message_queue
+    ADMISSION.start(settings, queue_depth=queue.depth if queue is not None else None)
+    replay_task = None
+    if app.state.journal is not None:
+        # Con varios workers solo uno reprocesa el journal
+        if app.state.coordinator is None or await app.state.coordinator.acquire_lock("journal-replay"):
+            replay_task = asyncio.create_task(replay_journal(app, before=started_at), name="journal-replay")
+    # Recarga en caliente del .env (por ejemplo, ACCESS_TOKEN rotado): cada worker vigila el archivo
+    settings_watcher = None
+    if settings.SETTINGS_RELOAD_INTERVAL > 0:
+        settings_watcher = FileWatcher(settings_env_file(), reload_settings, interval=settings.SETTINGS_RELOAD_INTERVAL)
+        settings_watcher.start()
+    subscribe_settings(warn_restart_required)
+    try:
+        yield
+    finally:
+        unsubscribe_settings(warn_restart_required)
+        if settings_watcher is not None:
+            await settings_watcher.close()
+        if replay_task is not None:
+            replay_task.cancel()
+        if app.state.message_queue is not None:
+            await app.state.message_queue.drain(timeout=settings.QUEUE_DRAIN_TIMEOUT)
+        if app.state.journal is not None:
+            await app.state.journal.close()
+        if app.state.dedup is not None:
+            await app.state.dedup.close()
+        await close_batcher()
+        await close_reply_engine()
+        await close_conversation_store()
+        await close_delivery_tracker()
+        await close_media_store()
+        await close_event_sink()
+        await close_search_index()
+        close_phone_normalizer()
+        close_rate_limiter()
+        close_circuit_breaker()
+        if app.state.tunnel is not None:
+            await app.state.tunnel.close()
+        if app.state.coordinator is not None:
+            await app.state.coordinator.close()
+        await close_wa_client()
+        QUEUE_DEPTH.callback = None
+        ADMISSION.close()
+        await DIAGNOSTICS.close()
+        await REGISTRY.close()
+        stop_logging()
+
+# Variables que se leen solo al arrancar (cliente HTTP, colas, servidor): cambiarlas requiere reiniciar
+_STARTUP_ONLY_PREFIXES = ("META_URL", "WA_", "SERVER_", "COORDINATOR_", "QUEUE_", "JOURNAL_", "DEDUP_", "BATCH_", "RATE_LIMIT_", "CB_", "LOG_", "WEBHOOK_", "CONVERSATION_", "DELIVERY_", "MEDIA_", "ADMISSION_", "EVENTS_", "SEARCH_", "NGROK_")
+
+def warn_restart_required(old_settings: Settings, new_settings: Settings):
+    """
+    Avisa si la recarga del .env modificó variables que solo se aplican al reiniciar.
+    """
+    if old_settings is None:
+        return
+    changed = [
+        name for name in Settings.model_fields
+        if name.startswith(_STARTUP_ONLY_PREFIXES) and getattr(old_settings, name) != getattr(new_settings, name)
+    ]
+    if changed:
+        logger.warning(f"Las variables {', '.join(changed)} cambiaron pero se aplicarán al reiniciar el servidor.")
+
+async def replay_journal(app: FastAPI, before: float = None):
+    """
+    Reprocesa los mensajes del journal que no llegaron a confirmarse antes del último apagado.
+    Se ejecuta en segundo plano para no demorar el arranque del servidor.
+    """
+    journal = app.state.journal
+    pending = await journal.pending(before=before)
+    if not pending:
+        return
+    logger.info(f"Journal: reprocesando {len(pending)} mensajes sin confirmar.")
+    queue = app.state.message_queue
+    for entry_id, data in pending:
+        message = message_from_dict(data)
+        if queue is not None:
+            await queue.put_wait((entry_id, message))
+        else:
+            try:
+                await process_entry(journal, entry_id, message)
+            except Exception as e:
+                logger.error(f"Error al reprocesar el mensaje {entry_id} del journal: {e}")
+
 # Define la aplicación FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.title = "ngrok FastAPI con Webhook"
 app.version = "1.0"
 
@@ -41,6 +230,12 @@ app.add_exception_handler(InvalidTokenException, validation_exception_handler)
 app.add_exception_handler(InvalidModeException, validation_exception_handler)
 app.add_exception_handler(WebhookException, webhook_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
+
+# Middlewares ASGI puros (sin BaseHTTPMiddleware): perfilado opcional (DIAG_ENABLED), control de admisión
+# y latencia por ruta (el más externo, para medir también los rechazos)
+app.add_middleware(DiagnosticsMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
     
 @app.get("/", tags=["Home"])   # Tag and Decorator for the root path
 def read_root():
@@ -50,7 +245,7 @@ def read_root():
     return {"title": app.title, "version": app.version, "message": "Server is running"}
 
 @app.get("/webhook", tags=["Webhook"])
-async def verify_webhook(request: Request, settings: Settings = get_settings()):
+async def verify_webhook(request: Request, settings: Settings = Depends(get_settings)):
     """
         Validación del webhook: (Meta) necesita asegurarse de que este server es del propietario del servidor que manejará las notificaciones. 
         Más información en: https://developers.facebook.com/docs/whatsapp/api/webhooks/inbound#verify-webhook
@@ -76,28 +271,222 @@ async def verify_webhook(request: Request, settings: Settings = get_settings()):
     return PlainTextResponse(content=challenge, status_code=200)
     
 @app.post("/webhook")
-async def handle_messages(payload: WebhookPayload):
+async def handle_messages(request: Request):
     """
     Maneja las notificaciones entrantes.
+    Si APP_SECRET está definido, primero se verifica la firma X-Hub-Signature-256 sobre el cuerpo crudo
+    (services/signature.py): una notificación falsificada se rechaza con 401 sin decodificarse.
+    El cuerpo crudo se decodifica y valida en un solo paso con el decodificador configurado
+    (WEBHOOK_DECODER, ver schemas/decoder.py); un cuerpo inválido responde 422.
+    Los estados de entrega solo se decodifican si se registran, y se encolan para agregarlos en lote.
+    En modo asíncrono (WEBHOOK_ASYNC_MODE) solo encola los mensajes y responde de inmediato;
+    en caso contrario procesa cada mensaje antes de responder.
     """
+    # El cuerpo se lee una sola vez: la firma se verifica y se decodifica sobre el mismo buffer
+    raw = await request.body()
+    app_secret = get_settings().APP_SECRET
+    if app_secret:
+        verify_signature(raw, request.headers.get(SIGNATURE_HEADER), app_secret)
+    tracker = get_delivery_tracker()
+    payload = decode_payload(raw, request.app.state.decoder, statuses=tracker is not None)
+    if tracker is not None:
+        tracker.record_many([status for entry in payload.entry for change in entry.changes for status in change.value.statuses])
+    queue = request.app.state.message_queue
+    journal = request.app.state.journal
+    dedup = request.app.state.dedup
     # Accede a los datos validados del payload
-    for entry in payload.entry:
-        for change in entry.changes:
-            messages = change.value.get("messages", [])
+    messages = [message for entry in payload.entry for change in entry.changes for message in change.value.messages]
+    if not messages:
+        return {"status": "processed"}
+    for message in messages:
+        MESSAGES_RECEIVED.inc(message_type_label(message.type))
+    # Descarta los reintentos de Meta antes de cualquier trabajo de envío
+    if dedup is not None:
+        received = len(messages)
+        messages = [message for message in messages if not await dedup.is_duplicate(message.id)]
+        if received > len(messages):
+            MESSAGES_DUPLICATED.inc(amount=received - len(messages))
+    if queue is not None:
+        await enqueue_messages(queue, journal, dedup, messages)
+        return {"status": "queued"}
+    try:
+        # Registra los mensajes en disco antes de confirmar la recepción a Meta
+        if journal is not None:
+            entry_ids = await journal.append_many([message_to_dict(message) for message in messages])
+        else:
+            entry_ids = [None] * len(messages)
+        # Los mensajes se procesan en paralelo para que los envíos al mismo destinatario puedan agruparse
+        await asyncio.gather(*(process_entry(journal, entry_id, message) for entry_id, message in zip(entry_ids, messages)))
+    except Exception:
+        # Meta reintentará la entrega: los ids se olvidan para que el reintento no se descarte como duplicado
+        if dedup is not None:
             for message in messages:
-                from_number = message.get("from")
-                text_body = message.get("text", {}).get("body", "")
-                logger.info(f"Mensaje recibido de {from_number}: {text_body}")
-                send_message_via_wa(from_number, "Hola, ¿en qué puedo ayudarte?")
+                await dedup.forget(message.id)
+        raise
     return {"status": "processed"}
 
+@app.get("/stats", tags=["Monitor"])
+def read_stats(request: Request):
+    """
+    Métricas internas del servidor (cola, journal, deduplicación, agrupamiento, limitador, circuit breaker,
+    reglas de respuesta, conversaciones, números, estados de entrega, medios, exportación de eventos, búsqueda, versión de la configuración, admisión y diagnóstico).
+    """
+    breaker = get_circuit_breaker()
+    batcher = get_batcher()
+    limiter = get_rate_limiter()
+    reply_engine = get_reply_engine()
+    conversations = get_conversation_store()
+    tracker = get_delivery_tracker()
+    media_store = get_media_store()
+    event_sink = get_event_sink()
+    search_index = get_search_index()
+    queue = request.app.state.message_queue
+    journal = request.app.state.journal
+    dedup = request.app.state.dedup
+    return {
+        "queue": queue.stats() if queue is not None else None,
+        "journal": journal.stats() if journal is not None else None,
+        "dedup": dedup.stats() if dedup is not None else None,
+        "batcher": batcher.stats() if batcher is not None else None,
+        "rate_limiter": limiter.stats() if limiter is not None else None,
+        "circuit_breaker": breaker.stats() if breaker is not None else None,
+        "reply_rules": reply_engine.stats() if reply_engine is not None else None,
+        "conversations": conversations.stats() if conversations is not None else None,
+        "phone_numbers": get_phone_normalizer().stats(),
+        "deliveries": tracker.stats() if tracker is not None else None,
+        "media": media_store.stats() if media_store is not None else None,
+        "events": event_sink.stats() if event_sink is not None else None,
+        "search": search_index.stats() if search_index is not None else None,
+        "settings_version": settings_version(),
+        "admission": ADMISSION.stats(),
+        "diagnostics": DIAGNOSTICS.stats(),
+    }
+
+@app.get("/deliveries/{message_id}", tags=["Monitor"])
+async def read_delivery(message_id: str):
+    """
+    Estado de entrega agregado de un mensaje enviado (estado más avanzado y notificaciones por estado).
+    """
+    tracker = get_delivery_tracker()
+    record = await tracker.get(message_id) if tracker is not None else None
+    if record is None:
+        raise HTTPException(status_code=404, detail="Mensaje sin estados de entrega registrados")
+    return record.to_dict()
+
+@app.get("/health", tags=["Monitor"])
+def read_health(request: Request):
+    """
+    Estado del servidor y del túnel de ngrok (si NGROK_ENABLED). Responde 503 si el túnel está caído:
+    el servidor funciona, pero Meta no puede entregarle notificaciones.
+    """
+    tunnel = request.app.state.tunnel
+    tunnel_stats = tunnel.stats() if tunnel is not None else None
+    if tunnel_stats is not None and tunnel_stats["status"] == "down":
+        return JSONResponse(status_code=503, content={"status": "degraded", "tunnel": tunnel_stats})
+    return {"status": "ok", "tunnel": tunnel_stats}
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    """
+    Convierte una fecha de la consulta a timestamp; las fechas sin zona horaria se toman como UTC.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+@app.get("/search", tags=["Search"])
+async def search_messages(
+    request: Request,
+    q: Optional[str] = Query(None, description="Palabras a buscar en el texto (todas deben aparecer; 'prec*' busca por prefijo)"),
+    wa_id: Optional[str] = Query(None, description="Remitente o destinatario"),
+    since: Optional[datetime] = Query(None, description="Desde (ISO 8601 o timestamp; sin zona horaria se toma UTC)"),
+    until: Optional[datetime] = Query(None, description="Hasta, excluida"),
+    direction: Optional[Literal["in", "out"]] = Query(None, description="Mensajes recibidos (in) o enviados (out)"),
+    limit: int = Query(20, ge=1, le=100, description="Resultados por página"),
+    cursor: Optional[int] = Query(None, description="next_cursor de la página anterior"),
+):
+    """
+    Busca en el historial de mensajes recibidos y enviados (services/search_index.py), del más reciente al
+    más antiguo. Para la página siguiente se repite la consulta con cursor=next_cursor.
+    Si SEARCH_TOKEN está definido se requiere el encabezado `Authorization: Bearer <SEARCH_TOKEN>`.
+    """
+    index = get_search_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Índice de búsqueda deshabilitado (SEARCH_ENABLED)")
+    token = get_settings().SEARCH_TOKEN
+    if token and not hmac.compare_digest(request.headers.get("authorization", "").encode(), f"Bearer {token}".encode()):
+        raise HTTPException(status_code=401, detail="Token de búsqueda inválido")
+    return await index.search(q, wa_id=wa_id, since=_timestamp(since), until=_timestamp(until),
+                              direction=direction, limit=limit, cursor=cursor)
+
+@app.get("/metrics", tags=["Monitor"])
+async def read_metrics():
+    """
+    Métricas en el formato de texto de Prometheus (latencias por ruta, mensajes, envíos, excepciones,
+    lag del event loop y profundidad de la cola). Con varios workers incluye las de todos.
+    Es asíncrono a propósito: se ejecuta en el hilo del event loop, el mismo que actualiza los colectores.
+    """
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 #..........................................................................
 def start_fastapi():
     """
-    Inicia el servidor FastAPI.
+    Inicia el servidor FastAPI con la configuración de Settings (SERVER_*).
+    Con más de un worker lanza además el proceso coordinador, que mantiene el estado compartido
+    (deduplicación y límites de tasa) para que siga siendo correcto entre procesos.
+    En modo multi-worker, enviar SIGHUP al proceso principal reinicia los workers de forma ordenada.
     """
+    import glob
     import uvicorn
-    uvicorn.run("services.fa_services:app", host="0.0.0.0", port=5000, log_level="info")
+    import multiprocessing
+    import tempfile
+    from services.coordinator import run_coordinator
+
+    settings = get_settings()
+    workers = settings.SERVER_WORKERS or os.cpu_count() or 1
+    if settings.SERVER_RELOAD and workers > 1:
+        logger.warning("SERVER_RELOAD activo: la recarga automática solo admite un worker.")
+        workers = 1
+
+    coordinator = None
+    if workers > 1:
+        coordinator = multiprocessing.Process(
+            target=run_coordinator,
+            args=(settings.COORDINATOR_HOST, settings.COORDINATOR_PORT, {
+                "max_entries": settings.DEDUP_MAX_ENTRIES,
+                "ttl": settings.DEDUP_TTL,
+                "db_path": settings.DEDUP_DB_PATH,
+            }),
+            name="wa-coordinator",
+            daemon=True,
+        )
+        coordinator.start()
+        # Los workers heredan el entorno: así saben que deben usar el coordinador
+        os.environ["COORDINATOR_ENABLED"] = "true"
+        # ... y dónde volcar sus métricas para que /metrics las sume
+        metrics_dir = settings.METRICS_MULTIPROC_DIR or tempfile.mkdtemp(prefix="wa-metrics-")
+        for name in glob.glob(os.path.join(metrics_dir, "worker-*.json")):
+            os.remove(name)
+        os.environ["METRICS_MULTIPROC_DIR"] = metrics_dir
+
+    logger.info(f"Iniciando servidor en {settings.SERVER_HOST}:{settings.SERVER_PORT} con {workers} worker(s).")
+    try:
+        uvicorn.run(
+            "services.fa_services:app",
+            host=settings.SERVER_HOST,
+            port=settings.SERVER_PORT,
+            workers=workers,
+            loop=settings.SERVER_LOOP,
+            http=settings.SERVER_HTTP,
+            reload=settings.SERVER_RELOAD,
+            timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+            log_level=settings.SERVER_LOG_LEVEL,
+        )
+    finally:
+        if coordinator is not None:
+            coordinator.terminate()
+            coordinator.join(timeout=5)
 
 #..........................................................................
 # Para ejecutar la aplicación, ejecute el script start_ngrok_tunnel.py
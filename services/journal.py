@@ -0,0 +1,226 @@
+"""
+Este módulo implementa un journal persistente (append-only) de los mensajes entrantes.
+Cada mensaje se registra en disco antes de responder a Meta, se marca como confirmado (ack)
+cuando termina su procesamiento y, si el proceso se reinicia, los mensajes sin confirmar se
+vuelven a procesar al arrancar (procesamiento "at-least-once").
+
+El almacenamiento es SQLite en modo WAL. Las escrituras se agrupan (group commit): todas las
+llamadas a append() que llegan dentro de la misma ventana se guardan en una sola transacción,
+de modo que el costo del fsync se reparte entre muchos mensajes.
+"""
+import asyncio
+import json
+import logging
+import time
+from utils.sqlite_utils import SqliteExecutor
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    received_at REAL    NOT NULL,
+    payload     TEXT    NOT NULL,
+    acked       INTEGER NOT NULL DEFAULT 0,
+    replays     INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS journal_pending ON journal (acked, id);
+"""
+
+class MessageJournal:
+    """
+    Journal de mensajes entrantes con escrituras agrupadas y compactación periódica.
+
+    Args:
+        path (str): Ruta del archivo SQLite.
+        flush_interval (float): Segundos que se espera para agrupar escrituras antes del commit.
+        batch_size (int): Cantidad de mensajes que fuerza el commit sin esperar la ventana.
+        compact_interval (float): Segundos entre compactaciones (borrado de mensajes confirmados).
+        max_replays (int): Veces que un mensaje se vuelve a procesar antes de descartarlo.
+    """
+    def __init__(self, path: str, flush_interval: float = 0.005, batch_size: int = 256,
+                 compact_interval: float = 60.0, max_replays: int = 5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.compact_interval = compact_interval
+        self.max_replays = max_replays
+        # synchronous=FULL: cada commit hace fsync; el agrupamiento reparte ese costo.
+        self._db = SqliteExecutor(path, synchronous="FULL", name="journal")
+        self._pending_writes: list = []
+        self._pending_acks: list = []
+        self._wakeup: asyncio.Event = None
+        self._tasks: list = []
+        # Métricas
+        self.appended = 0
+        self.acked = 0
+        self.commits = 0
+
+    async def open(self):
+        """
+        Crea el esquema y lanza las tareas de escritura y compactación.
+        """
+        await self._db.run(lambda conn: conn.executescript(_SCHEMA))
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._flusher(), name="journal-flusher"),
+            asyncio.create_task(self._compactor(), name="journal-compactor"),
+        ]
+        logger.info(f"Journal de mensajes abierto en {self.path}")
+
+    async def append_many(self, messages: list) -> list:
+        """
+        Registra mensajes en el journal y espera a que queden persistidos en disco.
+
+        Args:
+            messages (list): Mensajes (dict) a registrar.
+
+        Returns:
+            list: Identificadores asignados, en el mismo orden que los mensajes.
+        """
+        if not messages:
+            return []
+        loop = asyncio.get_running_loop()
+        futures = []
+        for message in messages:
+            future = loop.create_future()
+            self._pending_writes.append((json.dumps(message, ensure_ascii=False), future))
+            futures.append(future)
+        self._wakeup.set()
+        return list(await asyncio.gather(*futures))
+
+    def ack(self, entry_id: int):
+        """
+        Marca un mensaje como procesado. La confirmación se persiste con el siguiente commit.
+        """
+        self._pending_acks.append(entry_id)
+        self._wakeup.set()
+
+    async def pending(self, before: float = None) -> list:
+        """
+        Devuelve los mensajes registrados que no fueron confirmados, en orden de llegada.
+        Los que superaron max_replays se descartan (se marcan como confirmados y se registra el error).
+
+        Args:
+            before (float): Solo considera los mensajes recibidos antes de este instante (time.time()).
+                Con varios workers compartiendo el journal evita reprocesar mensajes que otro worker
+                acaba de registrar y todavía está procesando.
+
+        Returns:
+            list: Lista de tuplas (id, mensaje).
+        """
+        before = before if before is not None else time.time()
+
+        def _pending(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                dropped = conn.execute(
+                    "UPDATE journal SET acked = 1 WHERE acked = 0 AND replays >= ? AND received_at < ?", (self.max_replays, before)
+                ).rowcount
+                conn.execute("UPDATE journal SET replays = replays + 1 WHERE acked = 0 AND received_at < ?", (before,))
+                rows = conn.execute(
+                    "SELECT id, payload FROM journal WHERE acked = 0 AND received_at < ? ORDER BY id", (before,)
+                ).fetchall()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return dropped, rows
+
+        dropped, rows = await self._db.run(_pending)
+        if dropped:
+            logger.error(f"Journal: {dropped} mensajes descartados tras {self.max_replays} reintentos sin éxito.")
+        return [(entry_id, json.loads(payload)) for entry_id, payload in rows]
+
+    async def _flusher(self):
+        """
+        Agrupa escrituras y confirmaciones y las persiste en una sola transacción.
+        """
+        while True:
+            await self._wakeup.wait()
+            if len(self._pending_writes) < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            await self._flush()
+
+    async def _flush(self):
+        writes, self._pending_writes = self._pending_writes, []
+        acks, self._pending_acks = self._pending_acks, []
+        if not writes and not acks:
+            return
+        now = time.time()
+
+        def _commit(conn):
+            ids = []
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for payload, _ in writes:
+                    cursor = conn.execute("INSERT INTO journal (received_at, payload) VALUES (?, ?)", (now, payload))
+                    ids.append(cursor.lastrowid)
+                if acks:
+                    conn.executemany("UPDATE journal SET acked = 1 WHERE id = ?", [(entry_id,) for entry_id in acks])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return ids
+
+        try:
+            ids = await self._db.run(_commit)
+        except Exception as e:
+            logger.error(f"Error al escribir en el journal: {e}")
+            for _, future in writes:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.commits += 1
+        self.appended += len(writes)
+        self.acked += len(acks)
+        for (_, future), entry_id in zip(writes, ids):
+            if not future.done():
+                future.set_result(entry_id)
+
+    async def _compactor(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Error al compactar el journal: {e}")
+
+    async def compact(self):
+        """
+        Elimina los mensajes ya confirmados y trunca el archivo WAL.
+        """
+        def _compact(conn):
+            deleted = conn.execute("DELETE FROM journal WHERE acked = 1").rowcount
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return deleted
+
+        deleted = await self._db.run(_compact)
+        if deleted:
+            logger.info(f"Journal compactado: {deleted} mensajes confirmados eliminados.")
+
+    def stats(self) -> dict:
+        """
+        Devuelve las métricas del journal.
+        """
+        return {
+            "appended": self.appended,
+            "acked": self.acked,
+            "commits": self.commits,
+            "pending_writes": len(self._pending_writes),
+        }
+
+    async def close(self):
+        """
+        Persiste lo pendiente, compacta y cierra la base.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._flush()
+        await self.compact()
+        self._db.close()
+        logger.info("Journal de mensajes cerrado.")
@@ -0,0 +1,475 @@
+"""
+Este módulo descarga y sube archivos multimedia (imágenes, audios, videos, documentos y stickers) de la
+Graph API.
+
+1. Descargas: se consulta la URL del medio (GET /{version}/{media_id}) y el archivo se transfiere en
+   bloques de MEDIA_CHUNK_SIZE directo a disco, calculando su sha256 al vuelo: nunca se guarda completo
+   en memoria. Si Meta informa el sha256 y ese contenido ya está en caché, no se descarga de nuevo.
+2. Caché en disco direccionada por contenido: cada archivo se guarda como MEDIA_CACHE_DIR/ab/abcdef...
+   (su sha256), de modo que el mismo contenido recibido con distintos ids se guarda una sola vez. Si el
+   total supera MEDIA_CACHE_MAX_BYTES se borran los archivos usados hace más tiempo (LRU).
+3. Subidas: antes de subir un archivo se calcula su sha256; si ya se subió y el id sigue vigente
+   (MEDIA_UPLOAD_TTL, Meta conserva los medios 30 días) se reutiliza el id sin volver a subirlo.
+4. Las transferencias usan su propio cliente HTTP y un semáforo de MEDIA_MAX_CONCURRENCY: un archivo grande
+   no ocupa las conexiones ni el tiempo de los envíos de texto.
+
+El índice de la caché (archivos con su tamaño y último uso, ids de medios y subidas) es la base SQLite
+MEDIA_CACHE_DIR/index.db, compartida por todos los workers. Cada worker guarda en memoria solo una copia
+de lo que ya consultó, y antes de usarla comprueba que el archivo siga existiendo (otro worker pudo
+desalojarlo). Agregar un archivo a la caché, recalcular el tamaño total y borrar los menos usados ocurre
+en una sola transacción de escritura: dos workers nunca desalojan a la vez ni borran un archivo que el
+otro acaba de agregar. Las escrituras en disco de cada bloque son pequeñas y van a la caché de páginas
+del sistema operativo, por lo que no bloquean el event loop de forma apreciable.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+import httpx
+from config_setup.config_settings import get_settings
+from config_setup.settings import Settings
+from services.exceptions import MediaTransferException
+from services.metrics import REGISTRY
+from services.wa_messages import OutboundMessage, media_message
+from utils.sqlite_utils import SqliteExecutor
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TRANSFERS = REGISTRY.counter("wa_media_transfers_total", "Transferencias de archivos multimedia", ("direction", "result"))
+MEDIA_BYTES = REGISTRY.counter("wa_media_bytes_total", "Bytes de archivos multimedia transferidos", ("direction",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_files (
+    digest    TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    mime_type TEXT,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS media_ids (
+    media_id TEXT PRIMARY KEY,
+    digest   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    digest      TEXT PRIMARY KEY,
+    media_id    TEXT NOT NULL,
+    uploaded_at REAL NOT NULL
+);
+"""
+
+# Antigüedad (segundos sin escrituras) a partir de la cual un archivo de tmp/ se considera abandonado por
+# un worker que terminó a mitad de una descarga. Con varios workers no se borran los recientes: pueden ser
+# descargas en curso de otro worker
+_STALE_TMP_AGE = 3600.0
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Calcula el sha256 de un archivo leyéndolo por bloques.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class MediaFile:
+    """
+    Archivo multimedia en la caché local.
+
+    Attributes:
+        digest (str): sha256 del contenido (nombre del archivo en la caché).
+        path (str): Ruta del archivo.
+        size (int): Tamaño en bytes.
+        mime_type (str): Tipo MIME informado por Meta.
+    """
+    __slots__ = ("digest", "path", "size", "mime_type")
+
+    def __init__(self, digest: str, path: str, size: int, mime_type: str = None):
+        self.digest = digest
+        self.path = path
+        self.size = size
+        self.mime_type = mime_type
+
+    def __repr__(self) -> str:
+        return f"MediaFile(digest={self.digest[:12]!r}, size={self.size}, mime_type={self.mime_type!r})"
+
+class MediaStore:
+    """
+    Descargas y subidas de archivos multimedia con caché en disco.
+
+    Args:
+        cache_dir (str): Directorio de la caché.
+        max_bytes (int): Tamaño máximo de la caché en bytes.
+        max_concurrency (int): Transferencias simultáneas máximas.
+        chunk_size (int): Tamaño de los bloques de descarga en bytes.
+        max_file_bytes (int): Tamaño máximo de un archivo descargado.
+        timeout (float): Segundos máximos sin recibir datos durante una transferencia.
+        upload_ttl (float): Segundos durante los que se reutiliza el id de un archivo subido.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 ** 3, max_concurrency: int = 4,
+                 chunk_size: int = 64 * 1024, max_file_bytes: int = 100 * 1024 ** 2, timeout: float = 60.0,
+                 upload_ttl: float = 29 * 86400.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        self.upload_ttl = upload_ttl
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._client: httpx.AsyncClient = None
+        self._db = SqliteExecutor(os.path.join(cache_dir, "index.db"), name="media")
+        self._files: dict = {}                     # digest -> MediaFile (copia local del índice)
+        self._media_ids: dict = {}                 # media_id de Meta -> digest
+        self._uploads: dict = {}                   # digest -> (media_id, uploaded_at)
+        self._inflight: dict = {}                  # media_id -> asyncio.Task de la descarga en curso
+        self._background: set = set()
+        self._bytes = 0                            # tamaño total de la caché en la última escritura
+        # Métricas
+        self.hits = 0
+        self.downloads = 0
+        self.uploads = 0
+        self.reused_uploads = 0
+        self.evictions = 0
+
+    async def open(self):
+        """
+        Carga el índice de la caché (descartando entradas cuyo archivo ya no existe) y abre el cliente HTTP.
+        """
+        def _load(conn):
+            conn.executescript(_SCHEMA)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                files = conn.execute("SELECT digest, size, mime_type FROM media_files").fetchall()
+                present = [row for row in files if os.path.exists(self.path_for(row[0]))]
+                missing = [(row[0],) for row in files if not os.path.exists(self.path_for(row[0]))]
+                conn.executemany("DELETE FROM media_files WHERE digest = ?", missing)
+                conn.executemany("DELETE FROM media_ids WHERE digest = ?", missing)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            media_ids = conn.execute("SELECT media_id, digest FROM media_ids").fetchall()
+            uploads = conn.execute("SELECT digest, media_id, uploaded_at FROM uploads").fetchall()
+            return present, media_ids, uploads
+
+        os.makedirs(os.path.join(self.cache_dir, "tmp"), exist_ok=True)
+        await asyncio.to_thread(self._clean_tmp)
+        files, media_ids, uploads = await self._db.run(_load)
+        for digest, size, mime_type in files:
+            self._files[digest] = MediaFile(digest, self.path_for(digest), size, mime_type)
+        self._bytes = sum(media.size for media in self._files.values())
+        self._media_ids = {media_id: digest for media_id, digest in media_ids if digest in self._files}
+        self._uploads = {digest: (media_id, uploaded_at) for digest, media_id, uploaded_at in uploads}
+        limits = httpx.Limits(max_connections=self._max_concurrency, max_keepalive_connections=self._max_concurrency)
+        self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits, follow_redirects=True)
+        logger.info(f"Caché de medios abierta en {self.cache_dir}: {len(self._files)} archivos, {self._bytes} bytes.")
+
+    def _clean_tmp(self):
+        """
+        Borra los archivos de tmp/ abandonados (descargas interrumpidas por la caída de un worker).
+        """
+        directory = os.path.join(self.cache_dir, "tmp")
+        stale_before = time.time() - _STALE_TMP_AGE
+        removed = 0
+        for entry in os.scandir(directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < stale_before:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"Caché de medios: {removed} archivos temporales abandonados borrados.")
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    @staticmethod
+    def _graph_url(path: str) -> tuple:
+        """
+        Devuelve la URL absoluta de la Graph API y el encabezado de autorización vigentes.
+        """
+        settings = get_settings()
+        return f"{settings.META_URL.rstrip('/')}/{settings.META_API_VER}/{path}", {"Authorization": f"Bearer {settings.ACCESS_TOKEN}"}
+
+    def cached(self, media_id: str) -> MediaFile:
+        """
+        Devuelve el archivo de un id de medio si este worker ya lo conoce y sigue en la caché, o None.
+        """
+        digest = self._media_ids.get(media_id)
+        media = self._files.get(digest) if digest is not None else None
+        if media is not None and not os.path.exists(media.path):
+            # Otro worker lo desalojó de la caché compartida
+            self._forget(media.digest)
+            return None
+        return media
+
+    def _forget(self, digest: str):
+        self._files.pop(digest, None)
+        self._media_ids = {media_id: known for media_id, known in self._media_ids.items() if known != digest}
+
+    async def _lookup(self, media_id: str = None, digest: str = None) -> MediaFile:
+        """
+        Busca un archivo en el índice compartido por id de medio o por sha256 (lo pudo descargar otro worker).
+        """
+        def _select(conn):
+            if media_id is not None:
+                return conn.execute(
+                    "SELECT f.digest, f.size, f.mime_type FROM media_ids i JOIN media_files f ON f.digest = i.digest "
+                    "WHERE i.media_id = ?", (media_id,)
+                ).fetchone()
+            return conn.execute("SELECT digest, size, mime_type FROM media_files WHERE digest = ?", (digest,)).fetchone()
+
+        row = await self._db.run(_select)
+        if row is None or not os.path.exists(self.path_for(row[0])):
+            return None
+        media = self._files[row[0]] = MediaFile(row[0], self.path_for(row[0]), row[1], row[2])
+        if media_id is not None:
+            self._media_ids[media_id] = media.digest
+        return media
+
+    async def download(self, media_id: str) -> MediaFile:
+        """
+        Devuelve el archivo de un medio recibido, descargándolo si no está en la caché.
+        Varias llamadas simultáneas con el mismo id comparten una sola descarga.
+
+        Raises:
+            MediaTransferException: Si la Graph API responde con error o el archivo es demasiado grande.
+        """
+        media = self.cached(media_id)
+        if media is not None:
+            self.hits += 1
+            await self._touch(media)
+            return media
+        task = self._inflight.get(media_id)
+        if task is None:
+            task = self._inflight[media_id] = asyncio.create_task(self._download(media_id), name=f"media-{media_id}")
+            task.add_done_callback(lambda _: self._inflight.pop(media_id, None))
+        return await asyncio.shield(task)
+
+    def prefetch(self, media_id: str):
+        """
+        Descarga un medio en segundo plano (sin demorar el procesamiento del mensaje). Los errores se registran.
+        """
+        if self.cached(media_id) is not None or media_id in self._inflight:
+            return
+        task = asyncio.create_task(self.download(media_id), name=f"media-prefetch-{media_id}")
+        self._background.add(task)
+        task.add_done_callback(self._prefetch_done)
+
+    def _prefetch_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error al descargar un medio recibido: {task.exception()}")
+
+    async def _download(self, media_id: str) -> MediaFile:
+        media = await self._lookup(media_id=media_id)
+        if media is not None:
+            self.hits += 1
+            await self._touch(media)
+            return media
+        async with self._semaphore:
+            url, headers = self._graph_url(media_id)
+            try:
+                response = await self._client.get(url, headers=headers)
+                response.raise_for_status()
+                info = response.json()
+                # Si Meta informa el sha256 y ese contenido ya está en caché, no hace falta descargarlo
+                media = await self._lookup(digest=info["sha256"]) if info.get("sha256") else None
+                if media is None:
+                    media = await self._fetch(media_id, info["url"], headers, info.get("mime_type"))
+                    self.downloads += 1
+                else:
+                    self.hits += 1
+                    await self._touch(media)
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                MEDIA_TRANSFERS.inc("download", "error")
+                raise MediaTransferException(media_id, repr(e))
+            MEDIA_TRANSFERS.inc("download", "ok")
+        self._media_ids[media_id] = media.digest
+        await self._db.run(lambda conn: conn.execute("INSERT OR REPLACE INTO media_ids VALUES (?, ?)", (media_id, media.digest)))
+        return media
+
+    async def _fetch(self, media_id: str, url: str, headers: dict, mime_type: str) -> MediaFile:
+        """
+        Transfiere el archivo por bloques a un temporal y lo mueve a su lugar en la caché.
+        """
+        tmp_path = os.path.join(self.cache_dir, "tmp", uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with self._client.stream("GET", url, headers=headers) as response:
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        size += len(chunk)
+                        if size > self.max_file_bytes:
+                            MEDIA_TRANSFERS.inc("download", "too_large")
+                            raise MediaTransferException(media_id, f"supera {self.max_file_bytes} bytes")
+                        digest.update(chunk)
+                        f.write(chunk)
+            MEDIA_BYTES.inc("download", amount=size)
+            return await self._add(digest.hexdigest(), tmp_path, size, mime_type)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def _add(self, digest: str, tmp_path: str, size: int, mime_type: str) -> MediaFile:
+        """
+        Mueve un archivo descargado a la caché y desaloja los menos usados si se supera max_bytes.
+        Todo ocurre dentro de una transacción de escritura del índice compartido, que serializa estas
+        operaciones entre workers; los archivos se borran antes de confirmarla.
+        """
+        path = self.path_for(digest)
+        row = (digest, size, mime_type, time.time())
+
+        def _write(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # El mismo contenido pudo llegar antes con otro id, quizás a otro worker
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                conn.execute(
+                    "INSERT INTO media_files VALUES (?, ?, ?, ?) ON CONFLICT (digest) DO UPDATE SET last_used = excluded.last_used",
+                    row,
+                )
+                total = conn.execute("SELECT coalesce(sum(size), 0) FROM media_files").fetchone()[0]
+                evicted = []
+                if total > self.max_bytes:
+                    for candidate, candidate_size in conn.execute(
+                        "SELECT digest, size FROM media_files WHERE digest != ? ORDER BY last_used", (digest,)
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        evicted.append(candidate)
+                        total -= candidate_size
+                    conn.executemany("DELETE FROM media_files WHERE digest = ?", [(candidate,) for candidate in evicted])
+                    conn.executemany("DELETE FROM media_ids WHERE digest = ?", [(candidate,) for candidate in evicted])
+                    for candidate in evicted:
+                        try:
+                            os.remove(self.path_for(candidate))
+                        except FileNotFoundError:
+                            pass
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return total, evicted
+
+        self._bytes, evicted = await self._db.run(_write)
+        if evicted:
+            self.evictions += len(evicted)
+            for candidate in evicted:
+                self._forget(candidate)
+        media = self._files[digest] = MediaFile(digest, path, size, mime_type)
+        return media
+
+    async def _touch(self, media: MediaFile):
+        """
+        Actualiza el último uso del archivo en el índice compartido (orden del desalojo LRU).
+        """
+        row = (time.time(), media.digest)
+        await self._db.run(lambda conn: conn.execute("UPDATE media_files SET last_used = ? WHERE digest = ?", row))
+
+    async def upload(self, path: str, mime_type: str) -> str:
+        """
+        Sube un archivo a la Graph API y devuelve su id de medio. Si el mismo contenido ya se subió y su id
+        sigue vigente, devuelve ese id sin volver a subirlo.
+
+        Raises:
+            MediaTransferException: Si la Graph API responde con error.
+        """
+        digest = await asyncio.to_thread(file_digest, path)
+        uploaded = self._uploads.get(digest)
+        if uploaded is not None and uploaded[1] + self.upload_ttl > time.time():
+            self.reused_uploads += 1
+            return uploaded[0]
+        settings = get_settings()
+        url, headers = self._graph_url(f"{settings.PHONE_NUMBER_ID}/media")
+        async with self._semaphore:
+            try:
+                with open(path, "rb") as f:
+                    response = await self._client.post(
+                        url, headers=headers,
+                        data={"messaging_product": "whatsapp", "type": mime_type},
+                        files={"file": (os.path.basename(path), f, mime_type)},
+                    )
+                response.raise_for_status()
+                media_id = response.json()["id"]
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                MEDIA_TRANSFERS.inc("upload", "error")
+                raise MediaTransferException(path, repr(e))
+        MEDIA_TRANSFERS.inc("upload", "ok")
+        MEDIA_BYTES.inc("upload", amount=os.path.getsize(path))
+        self.uploads += 1
+        uploaded_at = time.time()
+        self._uploads[digest] = (media_id, uploaded_at)
+        await self._db.run(lambda conn: conn.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?)", (digest, media_id, uploaded_at)))
+        return media_id
+
+    async def message_for(self, path: str, media_type: str, mime_type: str, caption: str = None) -> OutboundMessage:
+        """
+        Arma un mensaje multimedia para enviar con wa_services.send_wa_message, subiendo el archivo si hace falta.
+        """
+        media_id = await self.upload(path, mime_type)
+        filename = os.path.basename(path) if media_type == "document" else None
+        return media_message(media_type, media_id=media_id, caption=caption, filename=filename)
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self._files),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "downloads": self.downloads,
+            "inflight": len(self._inflight),
+            "uploads": self.uploads,
+            "reused_uploads": self.reused_uploads,
+            "evictions": self.evictions,
+        }
+
+    async def close(self):
+        """
+        Cancela las descargas en segundo plano, cierra el cliente HTTP y la base del índice.
+        """
+        for task in list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._background, *self._inflight.values(), return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._db.close()
+
+_media_store: MediaStore = None
+
+async def start_media_store(settings: Settings):
+    """
+    Crea y abre la caché de medios si está habilitada (MEDIA_ENABLED).
+    """
+    global _media_store
+    if settings.MEDIA_ENABLED and _media_store is None:
+        _media_store = MediaStore(
+            settings.MEDIA_CACHE_DIR,
+            max_bytes=settings.MEDIA_CACHE_MAX_BYTES,
+            max_concurrency=settings.MEDIA_MAX_CONCURRENCY,
+            chunk_size=settings.MEDIA_CHUNK_SIZE,
+            max_file_bytes=settings.MEDIA_MAX_FILE_BYTES,
+            timeout=settings.MEDIA_TIMEOUT,
+            upload_ttl=settings.MEDIA_UPLOAD_TTL,
+        )
+        await _media_store.open()
+
+async def close_media_store():
+    global _media_store
+    if _media_store is not None:
+        await _media_store.close()
+        _media_store = None
+
+def get_media_store() -> MediaStore:
+    """
+    Devuelve la caché de medios, o None si está deshabilitada.
+    """
+    return _media_store
@@ -0,0 +1,81 @@
+"""
+Este módulo publica los eventos de mensajes (entrantes y salientes) a los consumidores registrados:
+la exportación a archivos (services/event_sink.py) y cualquier otro que se suscriba.
+
+Los mensajes entrantes se publican desde message_handler.process_message y los salientes desde
+wa_services.send_wa_message, con una sola llamada a record_event. Los consumidores se ejecutan en el
+event loop dentro de esa llamada, por lo que deben ser O(1) (encolar y volver); si no hay ninguno
+registrado, record_event no hace nada.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Orden de las columnas de un evento (archivos exportados y filas)
+EVENT_FIELDS = ("ts", "direction", "wa_id", "message_id", "type", "text", "status")
+
+class MessageEvent:
+    """
+    Evento de un mensaje recibido o enviado.
+
+    Attributes:
+        ts (float): Momento del evento (time.time()).
+        direction (str): "in" para los mensajes recibidos, "out" para los enviados.
+        wa_id (str): Remitente (entrantes) o destinatario (salientes).
+        message_id (str): Id del mensaje (wamid...); None si la Graph API no lo devolvió.
+        type (str): Tipo de mensaje ("text", "image", "template"...).
+        text (str): Texto del mensaje o epígrafe del medio (None si no tiene).
+        status (str): Resultado del envío ("200", "timeout"...) en los salientes; None en los entrantes.
+    """
+    __slots__ = EVENT_FIELDS
+
+    def __init__(self, ts: float, direction: str, wa_id: str, message_id: str = None, type: str = "text",
+                 text: str = None, status: str = None):
+        self.ts = ts
+        self.direction = direction
+        self.wa_id = wa_id
+        self.message_id = message_id
+        self.type = type
+        self.text = text
+        self.status = status
+
+    def to_row(self) -> tuple:
+        return (self.ts, self.direction, self.wa_id, self.message_id, self.type, self.text, self.status)
+
+    def __repr__(self) -> str:
+        return f"MessageEvent(direction={self.direction!r}, wa_id={self.wa_id!r}, type={self.type!r})"
+
+_listeners: list = []
+
+def add_event_listener(callback):
+    """
+    Registra un consumidor callback(event: MessageEvent), que se llama por cada evento publicado.
+    """
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+def remove_event_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+def has_event_listeners() -> bool:
+    """
+    Indica si hay consumidores: permite evitar el trabajo de armar un evento que nadie usa.
+    """
+    return bool(_listeners)
+
+def record_event(direction: str, wa_id: str, message_id: str = None, type: str = "text", text: str = None,
+                 status=None):
+    """
+    Publica un evento de mensaje a los consumidores registrados. Un consumidor que falla no afecta
+    al mensaje ni a los demás consumidores.
+    """
+    if not _listeners:
+        return
+    event = MessageEvent(time.time(), direction, wa_id, message_id, type, text, None if status is None else str(status))
+    for callback in _listeners:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error(f"Error al registrar el evento de mensaje: {e}")
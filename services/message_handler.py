@@ -0,0 +1,107 @@
+"""
+Este módulo contiene la lógica de negocio aplicada a cada mensaje entrante del webhook.
+Se usa tanto desde el endpoint POST /webhook (modo síncrono) como desde los workers de la cola (modo asíncrono).
+"""
+import logging
+from services.wa_services import send_message_via_wa
+from services.wa_batcher import get_batcher
+from services.reply_rules import get_reply_engine
+from services.conversations import get_conversation_store
+from services.media import get_media_store
+from services.wa_messages import MEDIA_TYPES
+from services.message_events import record_event
+from schemas.webhook import Message
+from schemas.decoder import message_to_dict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLY = "Hola, ¿en qué puedo ayudarte?"
+
+async def process_message(message: Message):
+    """
+    Procesa un mensaje entrante y responde al remitente con la respuesta que asignan las reglas
+    (services/reply_rules.py), o con DEFAULT_REPLY si ninguna coincide.
+    Los archivos multimedia recibidos se descargan a la caché local (services/media.py); su epígrafe,
+    si lo tienen, se usa como texto para las reglas.
+
+    Args:
+        message (Message): Mensaje tipado de change.value.messages.
+    """
+    from_number = message.from_
+    text_body = message.text.body if message.text is not None else ""
+    media = getattr(message, message.type, None) if message.type in MEDIA_TYPES else None
+    if media is not None:
+        text_body = media.caption or ""
+        # La descarga corre en segundo plano con concurrencia acotada: no demora la respuesta
+        media_store = get_media_store()
+        if media_store is not None:
+            media_store.prefetch(media.id)
+    logger.info("Mensaje recibido de %s", from_number, extra={"wa_id": from_number, "message_id": message.id, "type": message.type})
+    logger.debug("Texto del mensaje de %s: %s", from_number, text_body)
+    record_event("in", from_number, message.id, message.type, text_body or None)
+    # Estado de la conversación del remitente (en memoria, O(1)), disponible para flujos de varios pasos
+    store = get_conversation_store()
+    if store is not None:
+        conversation = store.record_message(from_number, message.id)
+        logger.debug("Conversación con %s: %s mensajes, paso %s", from_number, conversation.message_count, conversation.step)
+    engine = get_reply_engine()
+    reply = engine.reply_for(text_body) if engine is not None else DEFAULT_REPLY
+    await send_reply(from_number, reply)
+
+async def send_reply(to: str, text: str):
+    """
+    Envía una respuesta, agrupándola con otras al mismo destinatario si el agrupamiento está activo.
+    """
+    batcher = get_batcher()
+    if batcher is not None:
+        await batcher.send(to, text)
+    else:
+        await send_message_via_wa(to, text)
+
+async def process_entry(journal, entry_id: int, message: Message):
+    """
+    Procesa un mensaje registrado en el journal y lo confirma (ack) al terminar.
+    Si el procesamiento falla no se confirma, y el mensaje se reprocesa en el próximo arranque.
+
+    Args:
+        journal (MessageJournal): Journal de mensajes, o None si está deshabilitado.
+        entry_id (int): Identificador del mensaje en el journal (None si no se registró).
+        message (Message): Mensaje tipado de change.value.messages.
+    """
+    await process_message(message)
+    if journal is not None and entry_id is not None:
+        journal.ack(entry_id)
+
+async def enqueue_messages(queue, journal, dedup, messages: list):
+    """
+    Registra los mensajes en el journal y los encola para procesarlos en segundo plano.
+    Si la cola rechaza un mensaje (QueueFullException), Meta reintentará la notificación completa: los ids
+    de los mensajes no encolados se olvidan en la deduplicación, para que el reintento no los descarte, y
+    sus entradas del journal se confirman, para que no se reprocesen además en el próximo arranque.
+    Los mensajes ya encolados se conservan como vistos y el reintento los descarta.
+
+    Args:
+        queue (MessageQueue): Cola de mensajes.
+        journal (MessageJournal): Journal de mensajes, o None si está deshabilitado.
+        dedup (DedupCache): Caché de deduplicación, o None si está deshabilitada.
+        messages (list): Mensajes tipados de change.value.messages (ya filtrados por la deduplicación).
+    """
+    enqueued = 0
+    entry_ids = []
+    try:
+        # Registra los mensajes en disco antes de confirmar la recepción a Meta
+        if journal is not None:
+            entry_ids = await journal.append_many([message_to_dict(message) for message in messages])
+        else:
+            entry_ids = [None] * len(messages)
+        for entry_id, message in zip(entry_ids, messages):
+            queue.put((entry_id, message))
+            enqueued += 1
+    except BaseException:
+        if journal is not None:
+            for entry_id in entry_ids[enqueued:]:
+                journal.ack(entry_id)
+        if dedup is not None:
+            for message in messages[enqueued:]:
+                await dedup.forget(message.id)
+        raise
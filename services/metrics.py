@@ -0,0 +1,362 @@
+"""
+Este módulo implementa las métricas de la aplicación en el formato de texto de Prometheus (/metrics).
+
+Los colectores están pensados para el camino caliente:
+1. Cada worker de uvicorn tiene sus propios colectores y los actualiza desde un único hilo (el del
+   event loop), por lo que no se usan locks: incrementar un contador es una suma sobre un dict.
+2. Los histogramas tienen buckets fijos; observar un valor es una búsqueda binaria y un incremento.
+   Los acumulados que espera Prometheus se calculan solo al exportar.
+3. Los gauges que dependen del estado (profundidad de la cola, etc.) se leen con un callback al exportar,
+   no en cada cambio.
+4. Con varios workers (METRICS_MULTIPROC_DIR), cada worker vuelca periódicamente una instantánea a un
+   archivo propio y /metrics suma las de todos; así el resultado no depende de qué worker atiende la consulta.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Buckets por defecto (segundos), cubren desde respuestas locales hasta envíos lentos a la Graph API
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Tipos de mensaje que documenta Meta. El tipo viene en el cuerpo de la notificación: cualquier otro valor
+# se cuenta como "other" para que las series no crezcan sin límite ni un "|" rompa las claves de las etiquetas
+MESSAGE_TYPES = frozenset((
+    "text", "image", "audio", "video", "document", "sticker", "location", "contacts", "interactive",
+    "button", "reaction", "order", "system", "request_welcome", "unsupported", "unknown",
+))
+
+def message_type_label(type: str) -> str:
+    """
+    Valor de la etiqueta "type" de MESSAGES_RECEIVED para un tipo de mensaje recibido.
+    """
+    return type if type in MESSAGE_TYPES else "other"
+
+class Counter:
+    """
+    Contador monótono con etiquetas.
+    """
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict = {}
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def snapshot(self) -> dict:
+        return {"|".join(map(str, key)): value for key, value in self._values.items()}
+
+    @staticmethod
+    def merge(snapshots: list) -> dict:
+        merged = {}
+        for snapshot in snapshots:
+            for key, value in snapshot.items():
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def render(self, merged: dict) -> list:
+        return [f"{self.name}{_labels(self.labelnames, _split(key, self.labelnames))} {_format_value(value)}"
+                for key, value in sorted(merged.items())]
+
+class Gauge:
+    """
+    Valor instantáneo. Puede fijarse con set() o leerse de un callback al exportar.
+    Con varios workers se exporta uno por worker (etiqueta `pid`).
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values: dict = {}
+
+    def set(self, value: float, *labelvalues):
+        self._values[labelvalues] = value
+
+    def snapshot(self) -> dict:
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                value = None
+            return {"": value} if value is not None else {}
+        return {"|".join(map(str, key)): value for key, value in self._values.items()}
+
+    @staticmethod
+    def merge(snapshots: list) -> dict:
+        # Los gauges no se suman: cada worker conserva su valor
+        return {"pids": snapshots}
+
+    def render(self, merged: dict) -> list:
+        lines = []
+        for pid, snapshot in merged["pids"]:
+            extra = f'pid="{pid}"' if pid is not None else ""
+            for key, value in sorted(snapshot.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, _split(key, self.labelnames), extra)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """
+    Histograma con buckets fijos.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict = {}
+
+    def observe(self, value: float, *labelvalues):
+        data = self._values.get(labelvalues)
+        if data is None:
+            # [conteo por bucket (+Inf al final), suma, total]
+            data = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        data[0][bisect_left(self.buckets, value)] += 1
+        data[1] += value
+        data[2] += 1
+
+    def snapshot(self) -> dict:
+        return {"|".join(map(str, key)): [list(counts), total, count] for key, (counts, total, count) in self._values.items()}
+
+    @staticmethod
+    def merge(snapshots: list) -> dict:
+        merged = {}
+        for snapshot in snapshots:
+            for key, (counts, total, count) in snapshot.items():
+                current = merged.get(key)
+                if current is None:
+                    merged[key] = [list(counts), total, count]
+                else:
+                    current[0] = [a + b for a, b in zip(current[0], counts)]
+                    current[1] += total
+                    current[2] += count
+        return merged
+
+    def render(self, merged: dict) -> list:
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for key, (counts, total, count) in sorted(merged.items()):
+            values = _split(key, self.labelnames)
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {count}")
+        return lines
+
+def _split(key: str, labelnames: tuple) -> tuple:
+    return tuple(key.split("|")) if labelnames else ()
+
+class MetricsRegistry:
+    """
+    Conjunto de métricas de un worker, con exportación al formato de texto de Prometheus.
+    """
+    def __init__(self):
+        self._metrics: dict = {}
+        self.multiproc_dir = ""
+        self.flush_interval = 1.0
+        self._tasks: list = []
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._metrics.get(name) or self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = (), callback=None) -> Gauge:
+        gauge = self._metrics.get(name) or self.register(Gauge(name, documentation, labelnames))
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.get(name) or self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.multiproc_dir, f"worker-{pid}.json")
+
+    def dump(self):
+        """
+        Escribe la instantánea de este worker de forma atómica (archivo temporal + rename).
+        """
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"ts": time.time(), "metrics": self.snapshot()}, f)
+        os.replace(tmp_path, path)
+
+    def _collect(self) -> list:
+        """
+        Devuelve [(pid, instantánea)] de este worker y, si hay directorio compartido, de los demás.
+        """
+        own_pid = os.getpid()
+        snapshots = [(own_pid if self.multiproc_dir else None, self.snapshot(), True)]
+        if not self.multiproc_dir:
+            return snapshots
+        try:
+            names = os.listdir(self.multiproc_dir)
+        except OSError:
+            return snapshots
+        stale_after = time.time() - 3 * self.flush_interval
+        for name in names:
+            if not (name.startswith("worker-") and name.endswith(".json")) or name == f"worker-{own_pid}.json":
+                continue
+            try:
+                with open(os.path.join(self.multiproc_dir, name), encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pid = name[len("worker-"):-len(".json")]
+            snapshots.append((pid, data["metrics"], data["ts"] >= stale_after))
+        return snapshots
+
+    def render(self) -> str:
+        """
+        Exporta todas las métricas en el formato de texto de Prometheus (versión 0.0.4).
+        """
+        snapshots = self._collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            if isinstance(metric, Gauge):
+                # Los gauges de workers que ya no vuelcan su instantánea se descartan
+                merged = metric.merge([(pid, snap.get(name, {})) for pid, snap, alive in snapshots if alive])
+            else:
+                # Los contadores de workers terminados se conservan para que sigan siendo monótonos
+                merged = metric.merge([snap.get(name, {}) for _, snap, _ in snapshots])
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.render(merged))
+        return "\n".join(lines) + "\n"
+
+    async def _flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.dump()
+            except OSError as e:
+                logger.error(f"Error al volcar las métricas en {self.multiproc_dir}: {e}")
+
+    async def _loop_lag_monitor(self, interval: float):
+        """
+        Mide cuánto se demora el event loop en despertar una tarea respecto de lo pedido.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(loop.time() - started - interval, 0.0)
+            EVENT_LOOP_LAG.set(lag)
+            EVENT_LOOP_LAG_OBSERVED.observe(lag)
+
+    def start(self, multiproc_dir: str = "", flush_interval: float = 1.0, loop_lag_interval: float = 0.5):
+        """
+        Lanza las tareas de fondo (medición del lag del event loop y volcado de la instantánea).
+
+        Args:
+            multiproc_dir (str): Directorio compartido entre workers. Vacío: solo las métricas de este proceso.
+            flush_interval (float): Segundos entre volcados de la instantánea de este worker.
+            loop_lag_interval (float): Segundos entre mediciones del lag del event loop (0 desactiva).
+        """
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        if multiproc_dir:
+            os.makedirs(multiproc_dir, exist_ok=True)
+            self._tasks.append(asyncio.create_task(self._flusher(), name="metrics-flusher"))
+        if loop_lag_interval > 0:
+            self._tasks.append(asyncio.create_task(self._loop_lag_monitor(loop_lag_interval), name="metrics-loop-lag"))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.multiproc_dir:
+            try:
+                self.dump()
+            except OSError as e:
+                logger.error(f"Error al volcar las métricas en {self.multiproc_dir}: {e}")
+
+REGISTRY = MetricsRegistry()
+
+# Métricas de la aplicación
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latencia de las solicitudes HTTP por ruta", ("method", "route", "status"))
+MESSAGES_RECEIVED = REGISTRY.counter(
+    "webhook_messages_received_total", "Mensajes entrantes recibidos en el webhook", ("type",))
+MESSAGES_DUPLICATED = REGISTRY.counter(
+    "webhook_messages_duplicated_total", "Mensajes entrantes descartados por duplicados")
+SEND_DURATION = REGISTRY.histogram(
+    "wa_send_duration_seconds", "Latencia de los envíos a la Graph API (incluye reintentos)", ("status",))
+SEND_RESPONSES = REGISTRY.counter(
+    "wa_send_total", "Envíos a la Graph API por resultado (código HTTP o tipo de error)", ("status",))
+EXCEPTIONS = REGISTRY.counter(
+    "app_exceptions_total", "Excepciones convertidas en respuesta por cada manejador", ("handler", "exception"))
+EVENT_LOOP_LAG = REGISTRY.gauge(
+    "event_loop_lag_seconds", "Último retraso medido del event loop")
+EVENT_LOOP_LAG_OBSERVED = REGISTRY.histogram(
+    "event_loop_lag_observed_seconds", "Distribución del retraso del event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+QUEUE_DEPTH = REGISTRY.gauge(
+    "message_queue_depth", "Mensajes en espera en la cola de procesamiento")
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro que mide la latencia de cada solicitud HTTP.
+    La ruta se toma de la plantilla que resolvió el router (por ejemplo "/webhook"), no de la URL,
+    para que la cantidad de series no crezca con rutas desconocidas.
+    """
+    def __init__(self, app, registry: MetricsRegistry = REGISTRY):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, scope["method"], route_path, status_code)
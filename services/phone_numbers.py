@@ -0,0 +1,176 @@
+"""
+Este módulo normaliza el número de teléfono del remitente antes de responderle.
+
+El wa_id que llega en el webhook no siempre es el formato con el que hay que enviar el mensaje; el caso
+típico son los números de prueba de la API, que se registran sin el prefijo móvil del país: Argentina
+envía 549XXXXXXXXXX y se registra 54XXXXXXXXXX, México envía 521XXXXXXXXXX y se registra 52XXXXXXXXXX.
+
+1. Tabla de equivalencias: RECIPIENT_WAID_1 -> RECIPIENT_ITEM_1 y el archivo JSON PHONE_MAP_PATH
+   ({"wa_id": "número", ...}). Se carga una sola vez en un dict y tiene prioridad sobre las reglas.
+2. Reglas por país (PHONE_COUNTRY_RULES): reemplazan un prefijo por otro, opcionalmente solo si el número
+   tiene un largo dado. Se indexan por prefijo, de modo que aplicarlas cuesta lo mismo con una o con cien.
+3. Los resultados se memorizan en una caché LRU acotada (PHONE_CACHE_SIZE): cada número se calcula una vez.
+
+La tabla y las reglas se precalculan al cargar la configuración y se reconstruyen si una recarga del .env
+cambia RECIPIENT_* o PHONE_*; normalizar un número es O(1).
+"""
+import json
+import logging
+from collections import OrderedDict
+from config_setup.config_settings import get_settings, subscribe_settings, unsubscribe_settings
+from config_setup.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Variables de la configuración de las que depende el normalizador
+_SETTINGS_FIELDS = ("RECIPIENT_WAID_1", "RECIPIENT_ITEM_1", "PHONE_MAP_PATH", "PHONE_COUNTRY_RULES", "PHONE_CACHE_SIZE")
+
+def digits_only(number: str) -> str:
+    """
+    Quita todo lo que no sea dígito ("+54 9 11 ..." -> "54911...").
+    """
+    return number if number.isdigit() else "".join(c for c in number if c.isdigit())
+
+def parse_country_rules(value: str) -> dict:
+    """
+    Interpreta reglas con formato "prefijo:reemplazo[:largo],..." (por ejemplo "549:54:13,521:52:13").
+
+    Returns:
+        dict: {prefijo: (reemplazo, largo o None)}.
+    """
+    rules = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        parts = item.split(":")
+        if len(parts) not in (2, 3) or not parts[0].isdigit() or not (parts[1] == "" or parts[1].isdigit()):
+            raise ValueError(f"Regla de número inválida: '{item}' (formato prefijo:reemplazo[:largo])")
+        length = int(parts[2]) if len(parts) == 3 and parts[2] else None
+        rules[parts[0]] = (parts[1], length)
+    return rules
+
+def load_number_map(path: str) -> dict:
+    """
+    Lee el archivo JSON de equivalencias {"wa_id": "número"}.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} debe contener un objeto JSON {{\"wa_id\": \"número\"}}")
+    return {str(wa_id): str(number) for wa_id, number in data.items()}
+
+class PhoneNormalizer:
+    """
+    Normalizador de números con tabla precalculada, reglas por prefijo y caché LRU.
+
+    Args:
+        mapping (dict): Equivalencias explícitas {wa_id: número}; tienen prioridad sobre las reglas.
+        rules (dict): Reglas por país, como las devuelve parse_country_rules.
+        cache_size (int): Cantidad máxima de resultados memorizados.
+    """
+    def __init__(self, mapping: dict = None, rules: dict = None, cache_size: int = 10_000):
+        self.rules = rules or {}
+        # Largos de prefijo a probar, del más largo al más corto (la regla más específica gana)
+        self._prefix_lengths = sorted({len(prefix) for prefix in self.rules}, reverse=True)
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        # Las claves se guardan ya normalizadas a dígitos, así la consulta es una sola búsqueda
+        self.mapping = {
+            digits_only(wa_id): digits_only(number)
+            for wa_id, number in (mapping or {}).items() if wa_id and number
+        }
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.rewrites = 0
+
+    def _apply_rules(self, number: str) -> str:
+        rules = self.rules
+        for length in self._prefix_lengths:
+            rule = rules.get(number[:length])
+            if rule is not None:
+                replacement, expected = rule
+                if expected is None or len(number) == expected:
+                    return replacement + number[length:]
+        return number
+
+    def normalize(self, number: str) -> str:
+        """
+        Devuelve el número con el formato con el que hay que enviarle mensajes.
+        """
+        cache = self._cache
+        result = cache.get(number)
+        if result is not None:
+            cache.move_to_end(number)
+            self.hits += 1
+            return result
+        self.misses += 1
+        digits = digits_only(number)
+        result = self.mapping.get(digits)
+        if result is None:
+            result = self._apply_rules(digits)
+        if result != number:
+            self.rewrites += 1
+            logger.debug("Número %s normalizado a %s", number, result)
+        cache[number] = result
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "mapping": len(self.mapping),
+            "rules": len(self.rules),
+            "cache_size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rewrites": self.rewrites,
+        }
+
+def build_normalizer(settings: Settings) -> PhoneNormalizer:
+    """
+    Construye el normalizador a partir de la configuración (tabla, archivo de equivalencias y reglas).
+    """
+    mapping = {}
+    if settings.PHONE_MAP_PATH:
+        mapping.update(load_number_map(settings.PHONE_MAP_PATH))
+    if settings.RECIPIENT_WAID_1 and settings.RECIPIENT_ITEM_1:
+        mapping[settings.RECIPIENT_WAID_1] = settings.RECIPIENT_ITEM_1
+    normalizer = PhoneNormalizer(mapping, parse_country_rules(settings.PHONE_COUNTRY_RULES), settings.PHONE_CACHE_SIZE)
+    logger.info(f"Normalización de números: {len(normalizer.mapping)} equivalencias, {len(normalizer.rules)} reglas.")
+    return normalizer
+
+_normalizer: PhoneNormalizer = None
+
+def _rebuild_on_reload(old_settings: Settings, new_settings: Settings):
+    """
+    Reconstruye el normalizador si la recarga del .env cambió alguna de sus variables.
+    Si la nueva configuración es inválida se conserva el normalizador anterior.
+    """
+    global _normalizer
+    if old_settings is not None and all(getattr(old_settings, name) == getattr(new_settings, name) for name in _SETTINGS_FIELDS):
+        return
+    try:
+        _normalizer = build_normalizer(new_settings)
+    except (OSError, ValueError) as e:
+        logger.error(f"No se pudo reconstruir la normalización de números, se conserva la anterior: {e}")
+
+def start_phone_normalizer(settings: Settings):
+    """
+    Precalcula la tabla de números y se suscribe a las recargas de la configuración.
+    """
+    global _normalizer
+    _normalizer = build_normalizer(settings)
+    subscribe_settings(_rebuild_on_reload)
+
+def close_phone_normalizer():
+    global _normalizer
+    unsubscribe_settings(_rebuild_on_reload)
+    _normalizer = None
+
+def get_phone_normalizer() -> PhoneNormalizer:
+    """
+    Devuelve el normalizador vigente; si no se inició (scripts sueltos) lo construye con la configuración actual.
+    """
+    global _normalizer
+    if _normalizer is None:
+        _normalizer = build_normalizer(get_settings())
+    return _normalizer
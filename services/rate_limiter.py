@@ -0,0 +1,291 @@
+"""
+Este módulo implementa el limitador de tasa de los envíos salientes hacia la Graph API.
+Combina un token bucket global (throughput del número de WhatsApp Business) con un bucket por
+destinatario (límite por par emisor/receptor de Meta). Cuando no hay tokens el envío espera en
+lugar de fallar. Además lee los encabezados de uso que devuelve Meta y, ante un error de límite,
+reduce la tasa efectiva (AIMD) y pausa los envíos el tiempo indicado.
+Referencia: https://developers.facebook.com/docs/whatsapp/cloud-api/overview#throughput
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+import httpx
+from config_setup.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Códigos de error de Meta que indican límite de tasa alcanzado
+RATE_LIMIT_ERROR_CODES = {4, 80007, 130429}
+PAIR_RATE_LIMIT_ERROR_CODES = {131056}
+
+_rate_limiter = None
+
+class TokenBucket:
+    """
+    Token bucket clásico: se recargan `rate` tokens por segundo hasta `capacity`.
+
+    Args:
+        rate (float): Tokens por segundo.
+        capacity (float): Máximo de tokens acumulables (ráfaga permitida).
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Reserva tokens aunque no estén disponibles todavía (el saldo puede quedar negativo).
+
+        Returns:
+            float: Segundos a esperar antes de usar los tokens reservados (0 si hay saldo).
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= tokens
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def drain(self, seconds: float):
+        """
+        Vacía el bucket y deja una deuda de `seconds` segundos de recarga antes del próximo token.
+        """
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    def try_take(self, tokens: float = 1.0) -> bool:
+        """
+        Toma tokens solo si están disponibles ahora, sin reservar.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0):
+        """
+        Espera hasta disponer de los tokens pedidos.
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class RateLimiter:
+    """
+    Limitador de tasa global + por destinatario con ajuste adaptativo.
+
+    Args:
+        global_rate (float): Mensajes por segundo permitidos para el número emisor.
+        global_burst (float): Ráfaga máxima global.
+        recipient_rate (float): Mensajes por segundo permitidos hacia un mismo destinatario.
+        recipient_burst (float): Ráfaga máxima por destinatario.
+        max_recipients (int): Cantidad máxima de buckets por destinatario en memoria (LRU).
+        coordinator (CoordinatorClient): Si se indica, los buckets y la pausa se comparten entre workers
+            a través del coordinador; el factor adaptativo sigue siendo local de cada worker.
+    """
+    def __init__(self, global_rate: float = 80.0, global_burst: float = 80.0, recipient_rate: float = 0.2,
+                 recipient_burst: float = 10.0, max_recipients: int = 10_000, coordinator=None):
+        self.coordinator = coordinator
+        self.global_burst = global_burst
+        self.global_rate = global_rate
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.max_recipients = max_recipients
+        self._global = TokenBucket(global_rate, global_burst)
+        self._recipients: OrderedDict = OrderedDict()
+        self._paused_until = 0.0
+        self._factor = 1.0
+        # Métricas
+        self.acquired = 0
+        self.waited = 0
+        self.wait_time_total = 0.0
+        self.rate_limited = 0
+
+    def _recipient_bucket(self, to: str) -> TokenBucket:
+        bucket = self._recipients.get(to)
+        if bucket is None:
+            bucket = self._recipients[to] = TokenBucket(self.recipient_rate * self._factor, self.recipient_burst)
+            if len(self._recipients) > self.max_recipients:
+                self._recipients.popitem(last=False)
+        else:
+            self._recipients.move_to_end(to)
+        return bucket
+
+    async def acquire(self, to: str):
+        """
+        Espera el turno para enviar un mensaje a `to` (pausa adaptativa, bucket global y bucket del destinatario).
+        """
+        now = time.monotonic()
+        delay = max(0.0, self._paused_until - now)
+        if self.coordinator is not None:
+            remote_delay = await self.coordinator.request(
+                f"A {to.replace(' ', '')} {self._global.rate} {self.global_burst} "
+                f"{self.recipient_rate * self._factor} {self.recipient_burst}"
+            )
+            delay = max(delay, float(remote_delay))
+        else:
+            delay = max(delay, self._global.reserve(), self._recipient_bucket(to).reserve())
+        self.acquired += 1
+        if delay > 0:
+            self.waited += 1
+            self.wait_time_total += delay
+            await asyncio.sleep(delay)
+
+    def _set_factor(self, factor: float):
+        self._factor = min(1.0, max(0.05, factor))
+        self._global.rate = self.global_rate * self._factor
+
+    def pause(self, seconds: float):
+        """
+        Detiene todos los envíos durante `seconds` segundos.
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        if self.coordinator is not None:
+            task = asyncio.get_running_loop().create_task(self.coordinator.request(f"P {seconds}"))
+            task.add_done_callback(lambda t: t.exception())
+
+    def pause_recipient(self, to: str, seconds: float):
+        """
+        Detiene los envíos a `to` durante `seconds` segundos además de su espera actual (con varios workers,
+        en el bucket compartido del coordinador, que es el que consultan todos).
+        """
+        if self.coordinator is not None:
+            task = asyncio.get_running_loop().create_task(self.coordinator.request(f"R {to.replace(' ', '')} {seconds}"))
+            task.add_done_callback(lambda t: t.exception())
+        else:
+            self._recipient_bucket(to).drain(seconds)
+
+    def observe(self, to: str, response: httpx.Response) -> bool:
+        """
+        Ajusta el limitador a partir de la respuesta de la Graph API.
+
+        Args:
+            to (str): Destinatario del envío.
+            response (httpx.Response): Respuesta recibida.
+
+        Returns:
+            bool: True si la respuesta indica límite de tasa alcanzado (el envío debe reintentarse).
+        """
+        usage = self._usage_from_headers(response.headers)
+        if usage["pct"] >= 90:
+            self._set_factor(self._factor * 0.8)
+        if usage["regain_seconds"] > 0:
+            self.pause(usage["regain_seconds"])
+
+        error_code = None
+        if response.status_code in (400, 429):
+            try:
+                error_code = response.json().get("error", {}).get("code")
+            except ValueError:
+                error_code = None
+
+        if error_code in PAIR_RATE_LIMIT_ERROR_CODES:
+            # Límite por par emisor/receptor: solo se frena a ese destinatario
+            self.rate_limited += 1
+            self.pause_recipient(to, 1.0 / (self.recipient_rate * self._factor))
+            logger.warning("Límite por destinatario alcanzado para %s; se reencola el envío.", to)
+            return True
+
+        if response.status_code == 429 or error_code in RATE_LIMIT_ERROR_CODES:
+            self.rate_limited += 1
+            self._set_factor(self._factor * 0.5)
+            retry_after = self._retry_after(response.headers)
+            self.pause(retry_after if retry_after is not None else 1.0 / self._global.rate)
+            logger.warning("Límite de tasa de la Graph API alcanzado; tasa efectiva reducida a %.2f.", self._factor)
+            return True
+
+        if response.is_success and self._factor < 1.0 and usage["pct"] < 90:
+            # Recuperación aditiva
+            self._set_factor(self._factor + 0.01)
+        return False
+
+    @staticmethod
+    def _retry_after(headers) -> float:
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _usage_from_headers(headers) -> dict:
+        """
+        Extrae el porcentaje de uso y el tiempo de recuperación de X-App-Usage y X-Business-Use-Case-Usage.
+        """
+        pct = 0.0
+        regain_seconds = 0.0
+        raw = headers.get("x-app-usage")
+        if raw:
+            try:
+                pct = max(pct, *(float(v) for v in json.loads(raw).values()))
+            except (ValueError, TypeError, AttributeError):
+                pass
+        raw = headers.get("x-business-use-case-usage")
+        if raw:
+            try:
+                for entries in json.loads(raw).values():
+                    for entry in entries:
+                        pct = max(pct, float(entry.get("call_count", 0)), float(entry.get("total_time", 0)),
+                                  float(entry.get("total_cputime", 0)))
+                        regain_seconds = max(regain_seconds, float(entry.get("estimated_time_to_regain_access", 0)) * 60)
+            except (ValueError, TypeError, AttributeError):
+                pass
+        return {"pct": pct, "regain_seconds": regain_seconds}
+
+    def stats(self) -> dict:
+        """
+        Devuelve las métricas del limitador.
+        """
+        return {
+            "rate_factor": round(self._factor, 4),
+            "effective_global_rate": round(self._global.rate, 3),
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            "tracked_recipients": len(self._recipients),
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "wait_time_total": round(self.wait_time_total, 3),
+            "rate_limited": self.rate_limited,
+        }
+
+def start_rate_limiter(settings: Settings, coordinator=None) -> RateLimiter:
+    """
+    Crea el limitador compartido si RATE_LIMIT_ENABLED está activo. Se llama al arrancar la aplicación.
+    Con varios workers se pasa el CoordinatorClient para que los límites sean globales al servidor.
+    """
+    global _rate_limiter
+    if settings.RATE_LIMIT_ENABLED and _rate_limiter is None:
+        _rate_limiter = RateLimiter(
+            global_rate=settings.RATE_LIMIT_GLOBAL_RATE,
+            global_burst=settings.RATE_LIMIT_GLOBAL_BURST,
+            recipient_rate=settings.RATE_LIMIT_RECIPIENT_RATE,
+            recipient_burst=settings.RATE_LIMIT_RECIPIENT_BURST,
+            coordinator=coordinator,
+        )
+    return _rate_limiter
+
+def close_rate_limiter():
+    """
+    Descarta el limitador compartido.
+    """
+    global _rate_limiter
+    _rate_limiter = None
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Devuelve el limitador compartido, o None si está deshabilitado.
+    """
+    return _rate_limiter
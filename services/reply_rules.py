@@ -0,0 +1,322 @@
+"""
+Este módulo implementa el motor de respuestas automáticas: asigna a cada texto entrante una respuesta
+según reglas cargadas desde un archivo JSON (REPLY_RULES_PATH).
+
+Tipos de regla:
++ exact: el texto completo es igual al patrón.
++ prefix: el texto empieza con el patrón.
++ keyword: el patrón aparece en el texto como palabra (o frase) completa.
++ regex: expresión regular de Python buscada en el texto.
+
+Los textos y los patrones exact/prefix/keyword se comparan normalizados (minúsculas y sin acentos), de
+modo que "Envíos", "envios" y "ENVIOS" son equivalentes. Las regex también se aplican al texto normalizado.
+
+Las reglas se compilan una sola vez en un único matcher combinado, cuyo costo no crece con la cantidad de reglas:
+1. exact: un dict (una búsqueda).
+2. prefix: un trie que se recorre con los caracteres del texto (costo proporcional al prefijo más largo).
+3. keyword: un autómata Aho-Corasick (una sola pasada sobre el texto, sin importar cuántas palabras clave haya).
+4. regex: de cada expresión se extrae un literal obligatorio (por ejemplo "pedido" en r"pedido \d+") y todos
+   los literales se buscan con otro autómata Aho-Corasick; solo se evalúan las regex cuyo literal aparece en
+   el texto (el mismo prefiltro que usan RE2/Hyperscan). Las regex sin un literal de al menos 3 caracteres
+   se evalúan siempre, por lo que conviene que sean pocas.
+Si varias reglas coinciden gana la que aparece primero en el archivo.
+
+El archivo se vigila (utils/file_watcher.py) y al cambiar se compila un nuevo matcher fuera del event loop
+y se reemplaza el anterior de forma atómica; si el archivo nuevo es inválido se conserva el anterior.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import deque
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+from config_setup.settings import Settings
+from services.metrics import REGISTRY
+from utils.file_watcher import FileWatcher
+
+logger = logging.getLogger(__name__)
+
+RULE_TYPES = ("exact", "prefix", "keyword", "regex")
+
+# Largo mínimo del literal que se usa como prefiltro de una regex
+MIN_REGEX_LITERAL = 3
+
+RULE_MATCHES = REGISTRY.counter("reply_rule_matches_total", "Respuestas elegidas por tipo de regla", ("rule_type",))
+
+def normalize(text: str) -> str:
+    """
+    Pasa a minúsculas, quita los acentos y colapsa los espacios.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+class AhoCorasick:
+    """
+    Autómata Aho-Corasick: encuentra todas las apariciones de un conjunto de palabras en una sola pasada.
+    """
+    def __init__(self, words: list):
+        # Nodo 0 = raíz. goto[n]: transiciones, fail[n]: enlace de fallo, out[n]: (largo, valor) que terminan en n
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for word, value in words:
+            node = 0
+            for char in word:
+                child = self.goto[node].get(char)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][char] = child
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = child
+            self.out[node].append((len(word), value))
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                if node:
+                    fallback = self.fail[node]
+                    while fallback and char not in self.goto[fallback]:
+                        fallback = self.fail[fallback]
+                    self.fail[child] = self.goto[fallback].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def search(self, text: str):
+        """
+        Genera (fin, largo, valor) por cada aparición; `fin` es el índice del último carácter.
+        """
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, value in out[node]:
+                yield index, length, value
+
+class PrefixTrie:
+    """
+    Trie de prefijos: devuelve los valores de todos los patrones que son prefijo del texto.
+    """
+    def __init__(self, words: list):
+        self.root = {}
+        for word, value in words:
+            node = self.root
+            for char in word:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(value)
+
+    def search(self, text: str):
+        node = self.root
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                return
+            yield from node.get(None, ())
+
+def required_literal(pattern: str) -> str:
+    """
+    Devuelve la secuencia literal más larga que toda coincidencia de `pattern` debe contener
+    (solo se consideran los elementos de primer nivel), o "" si no hay una de al menos MIN_REGEX_LITERAL.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return ""
+    if parsed.state.flags & re.IGNORECASE:
+        return ""
+    best, current = "", []
+    for op, value in parsed:
+        if op is sre_parse.LITERAL:
+            current.append(chr(value))
+            continue
+        if len(current) > len(best):
+            best = "".join(current)
+        current = []
+    if len(current) > len(best):
+        best = "".join(current)
+    return best if len(best) >= MIN_REGEX_LITERAL else ""
+
+class ReplyMatcher:
+    """
+    Matcher combinado de un conjunto de reglas (inmutable: para cambiar las reglas se construye otro).
+
+    Args:
+        rules (list): Reglas (dict con type, pattern y reply), en orden de prioridad.
+        default_reply (str): Respuesta cuando ninguna regla coincide.
+    """
+    def __init__(self, rules: list, default_reply: str):
+        self.default_reply = default_reply
+        self.replies = []
+        self.types = []
+        exact, prefixes, keywords, regexes = {}, [], [], []
+        for index, rule in enumerate(rules):
+            rule_type = rule.get("type", "keyword")
+            if rule_type not in RULE_TYPES:
+                raise ValueError(f"Regla {index}: tipo desconocido '{rule_type}' (válidos: {', '.join(RULE_TYPES)})")
+            if not rule.get("pattern") or not isinstance(rule.get("reply"), str):
+                raise ValueError(f"Regla {index}: se requieren 'pattern' y 'reply'")
+            self.replies.append(rule["reply"])
+            self.types.append(rule_type)
+            if rule_type == "regex":
+                try:
+                    regexes.append((index, re.compile(rule["pattern"])))
+                except re.error as e:
+                    raise ValueError(f"Regla {index}: regex inválida: {e}")
+                continue
+            pattern = normalize(rule["pattern"])
+            if not pattern:
+                raise ValueError(f"Regla {index}: el patrón queda vacío al normalizarlo")
+            if rule_type == "exact":
+                exact.setdefault(pattern, index)
+            elif rule_type == "prefix":
+                prefixes.append((pattern, index))
+            else:
+                keywords.append((pattern, index))
+        self._exact = exact
+        self._prefixes = PrefixTrie(prefixes) if prefixes else None
+        self._keywords = AhoCorasick(keywords) if keywords else None
+        # Regex: las que tienen un literal obligatorio se prefiltran con Aho-Corasick, el resto se evalúa siempre
+        self._regexes = dict(regexes)
+        literals = []
+        self._unfiltered = []
+        for index, compiled in regexes:
+            literal = required_literal(compiled.pattern)
+            if literal:
+                literals.append((literal, index))
+            else:
+                self._unfiltered.append(index)
+        self._literals = AhoCorasick(literals) if literals else None
+        self.size = len(rules)
+
+    def match(self, text: str):
+        """
+        Devuelve el índice de la regla ganadora para `text`, o None.
+        """
+        normalized = normalize(text)
+        best = self._exact.get(normalized)
+        if self._prefixes is not None:
+            for index in self._prefixes.search(normalized):
+                if best is None or index < best:
+                    best = index
+        if self._keywords is not None:
+            last = len(normalized) - 1
+            for end, length, index in self._keywords.search(normalized):
+                if best is not None and index >= best:
+                    continue
+                start = end - length + 1
+                # Solo palabras completas: "hola" no coincide dentro de "holanda"
+                if (start == 0 or not normalized[start - 1].isalnum()) and (end == last or not normalized[end + 1].isalnum()):
+                    best = index
+        if self._regexes and (best is None or best > 0):
+            candidates = set(self._unfiltered)
+            if self._literals is not None:
+                candidates.update(index for _, _, index in self._literals.search(normalized))
+            for index in sorted(candidates):
+                if best is not None and index >= best:
+                    break
+                if self._regexes[index].search(normalized):
+                    best = index
+                    break
+        return best
+
+    def reply_for(self, text: str) -> str:
+        """
+        Devuelve la respuesta para `text` (la respuesta por defecto si ninguna regla coincide).
+        """
+        index = self.match(text) if text else None
+        if index is None:
+            RULE_MATCHES.inc("default")
+            return self.default_reply
+        RULE_MATCHES.inc(self.types[index])
+        return self.replies[index]
+
+def load_matcher(path: str, default_reply: str) -> ReplyMatcher:
+    """
+    Lee y compila el archivo de reglas. Formato:
+        {"default_reply": "...", "rules": [{"type": "keyword", "pattern": "envios", "reply": "..."}, ...]}
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return ReplyMatcher(data.get("rules", []), data.get("default_reply") or default_reply)
+
+class ReplyEngine:
+    """
+    Mantiene el matcher vigente y lo recompila cuando cambia el archivo de reglas.
+
+    Args:
+        path (str): Archivo JSON de reglas (si no existe se responde siempre con la respuesta por defecto).
+        default_reply (str): Respuesta por defecto si el archivo no define "default_reply".
+        reload_interval (float): Segundos entre revisiones del archivo (0 desactiva la recarga).
+    """
+    def __init__(self, path: str, default_reply: str, reload_interval: float = 2.0):
+        self.path = path
+        self.default_reply = default_reply
+        self.reload_interval = reload_interval
+        self.matcher = ReplyMatcher([], default_reply)
+        self.reloads = 0
+        self._watcher: FileWatcher = None
+
+    async def open(self):
+        await self.reload()
+        if self.reload_interval > 0:
+            self._watcher = FileWatcher(self.path, self.reload, interval=self.reload_interval)
+            self._watcher.start()
+
+    async def reload(self, *_):
+        """
+        Compila las reglas en un hilo aparte (miles de reglas no bloquean el event loop) y reemplaza el matcher.
+        """
+        if not os.path.exists(self.path):
+            logger.info(f"No se encontró {self.path}: se usará solo la respuesta por defecto.")
+            self.matcher = ReplyMatcher([], self.default_reply)
+            return
+        try:
+            matcher = await asyncio.to_thread(load_matcher, self.path, self.default_reply)
+        except (OSError, ValueError) as e:
+            logger.error(f"Reglas de respuesta inválidas en {self.path}, se conservan las anteriores: {e}")
+            return
+        self.matcher = matcher
+        self.reloads += 1
+        logger.info(f"Reglas de respuesta cargadas desde {self.path}: {matcher.size} reglas.")
+
+    def reply_for(self, text: str) -> str:
+        return self.matcher.reply_for(text)
+
+    def stats(self) -> dict:
+        return {"path": self.path, "rules": self.matcher.size, "reloads": self.reloads}
+
+    async def close(self):
+        if self._watcher is not None:
+            await self._watcher.close()
+            self._watcher = None
+
+_reply_engine: ReplyEngine = None
+
+async def start_reply_engine(settings: Settings, default_reply: str):
+    """
+    Carga las reglas de respuesta y empieza a vigilar el archivo.
+    """
+    global _reply_engine
+    if _reply_engine is None:
+        _reply_engine = ReplyEngine(settings.REPLY_RULES_PATH, default_reply, reload_interval=settings.REPLY_RULES_RELOAD_INTERVAL)
+        await _reply_engine.open()
+
+async def close_reply_engine():
+    global _reply_engine
+    if _reply_engine is not None:
+        await _reply_engine.close()
+        _reply_engine = None
+
+def get_reply_engine() -> ReplyEngine:
+    """
+    Devuelve el motor de respuestas, o None si no se inició.
+    """
+    return _reply_engine
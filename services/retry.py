@@ -0,0 +1,153 @@
+"""
+Este módulo contiene las políticas de resiliencia de los envíos salientes hacia la Graph API:
+1. Reintentos acotados con backoff exponencial y jitter ("full jitter") para errores transitorios.
+2. Un circuit breaker que, tras varios fallos seguidos, deja de llamar a la API durante un tiempo
+   y falla rápido, en lugar de acumular trabajos esperando a un endpoint degradado.
+"""
+import logging
+import random
+import time
+from functools import lru_cache
+import httpx
+from config_setup.settings import Settings
+from services.exceptions import CircuitOpenException
+
+logger = logging.getLogger(__name__)
+
+_circuit_breaker = None
+
+# Errores de transporte reintentables: los que garantizan que la solicitud no llegó a enviarse. Un
+# ReadTimeout o una conexión cortada a mitad de la respuesta pueden ocurrir con el mensaje ya aceptado
+# por Meta, y reintentarlos lo enviaría dos veces
+RETRYABLE_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+@lru_cache(maxsize=8)
+def parse_status_codes(value: str) -> frozenset:
+    """
+    Convierte una lista de códigos HTTP separados por comas ("500,502,503") en un conjunto de enteros.
+    """
+    return frozenset(int(code) for code in value.split(",") if code.strip())
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Calcula la espera antes del reintento número `attempt` (empezando en 0) con full jitter:
+    un valor aleatorio entre 0 y min(cap, base * 2^attempt).
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados (cerrado, abierto, semiabierto).
+
+    Args:
+        failure_threshold (int): Fallos consecutivos que abren el circuito.
+        recovery_timeout (float): Segundos que el circuito permanece abierto antes de probar de nuevo.
+        half_open_max_calls (int): Llamadas de prueba simultáneas permitidas en estado semiabierto.
+    """
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    # Valor numérico de cada estado para exportarlo como métrica
+    STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        # Métricas
+        self.opened_count = 0
+        self.rejected = 0
+
+    def allow(self):
+        """
+        Verifica si se puede llamar a la API.
+
+        Raises:
+            CircuitOpenException: Si el circuito está abierto (o semiabierto sin cupo de prueba).
+        """
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed < self.recovery_timeout:
+                self.rejected += 1
+                raise CircuitOpenException(retry_in=self.recovery_timeout - elapsed)
+            self.state = self.HALF_OPEN
+            self._half_open_calls = 0
+            logger.info("Circuit breaker de la Graph API semiabierto: se prueba una llamada.")
+        if self.state == self.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenException(retry_in=0.0)
+            self._half_open_calls += 1
+
+    def record_success(self):
+        """
+        Registra una llamada exitosa (cierra el circuito si estaba en prueba).
+        """
+        if self.state != self.CLOSED:
+            logger.info("Circuit breaker de la Graph API cerrado: el endpoint respondió correctamente.")
+        self.state = self.CLOSED
+        self._failures = 0
+        self._half_open_calls = 0
+
+    def record_neutral(self):
+        """
+        Libera el cupo de prueba de una llamada que terminó sin indicar la salud del endpoint
+        (rechazada por límite de tasa o cancelada), para que otra llamada pueda probar.
+        """
+        if self.state == self.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def record_failure(self):
+        """
+        Registra una llamada fallida (abre el circuito al superar el umbral o si falla la prueba).
+        """
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened_count += 1
+                logger.error(f"Circuit breaker de la Graph API abierto tras {self._failures} fallos consecutivos.")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._half_open_calls = 0
+
+    def stats(self) -> dict:
+        """
+        Devuelve el estado del circuito y sus métricas.
+        """
+        return {
+            "state": self.state,
+            "state_code": self.STATE_CODES[self.state],
+            "consecutive_failures": self._failures,
+            "opened_count": self.opened_count,
+            "rejected": self.rejected,
+        }
+
+def start_circuit_breaker(settings: Settings) -> CircuitBreaker:
+    """
+    Crea el circuit breaker compartido de la Graph API. Se llama al arrancar la aplicación.
+    """
+    global _circuit_breaker
+    if settings.CB_ENABLED and _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker(
+            failure_threshold=settings.CB_FAILURE_THRESHOLD,
+            recovery_timeout=settings.CB_RECOVERY_TIMEOUT,
+            half_open_max_calls=settings.CB_HALF_OPEN_MAX_CALLS,
+        )
+    return _circuit_breaker
+
+def close_circuit_breaker():
+    """
+    Descarta el circuit breaker compartido.
+    """
+    global _circuit_breaker
+    _circuit_breaker = None
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """
+    Devuelve el circuit breaker compartido, o None si está deshabilitado.
+    """
+    return _circuit_breaker
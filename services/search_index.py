@@ -0,0 +1,290 @@
+"""
+Este módulo indexa el historial de mensajes (recibidos y enviados) para buscarlo por texto, remitente y
+fecha desde GET /search.
+
+1. Se suscribe a los eventos de mensajes (services/message_events.py): registrar un mensaje solo lo
+   agrega a una lista pendiente acotada (SEARCH_MAX_PENDING), O(1) y sin tocar el disco.
+2. Una tarea en segundo plano escribe los pendientes en una sola transacción cada SEARCH_FLUSH_INTERVAL
+   segundos (o al juntar SEARCH_BATCH_SIZE). La tabla `messages` guarda los mensajes; `messages_fts` es un
+   índice FTS5 sobre su texto, mantenido por triggers, de modo que el índice crece de a un lote sin
+   reconstruirse. El tokenizador ignora mayúsculas y acentos.
+3. Las búsquedas usan una conexión de solo lectura propia (WAL): no esperan detrás de las escrituras.
+   Los resultados van del más reciente al más antiguo y se paginan por cursor (rowid del último
+   resultado), por lo que pedir la página 1000 cuesta lo mismo que la primera.
+4. Opcionalmente se borran los mensajes más antiguos que SEARCH_RETENTION segundos.
+
+Con varios workers todos escriben en la misma base; SQLite serializa las transacciones.
+"""
+import asyncio
+import logging
+import time
+from config_setup.settings import Settings
+from services.message_events import add_event_listener, remove_event_listener
+from utils.sqlite_utils import SqliteExecutor
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+PRAGMA busy_timeout = 5000;
+CREATE TABLE IF NOT EXISTS messages (
+    id         INTEGER PRIMARY KEY,
+    ts         REAL NOT NULL,
+    direction  TEXT NOT NULL,
+    wa_id      TEXT,
+    message_id TEXT,
+    type       TEXT,
+    text       TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_wa_id ON messages (wa_id);
+CREATE INDEX IF NOT EXISTS messages_ts ON messages (ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages WHEN new.text IS NOT NULL BEGIN
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages WHEN old.text IS NOT NULL BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+_COLUMNS = ("id", "ts", "direction", "wa_id", "message_id", "type", "text")
+
+# Margen (segundos) al traducir un rango de fechas a un rango de ids: los ids siguen el orden de
+# inserción, que puede diferir del orden de ts en lo que demora un lote o entre workers
+_CLOCK_SKEW = 60.0
+_MAX_ID = 2 ** 63 - 1
+
+def fts_query(text: str) -> str:
+    """
+    Convierte el texto de búsqueda en una consulta FTS5 segura: cada palabra se busca literal (entre
+    comillas) y todas deben aparecer; una palabra terminada en * busca por prefijo ("prec*").
+    Devuelve "" si no hay palabras.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', "")
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+class SearchIndex:
+    """
+    Índice de búsqueda de mensajes con escritura en lote.
+
+    Args:
+        db_path (str): Ruta del archivo SQLite.
+        flush_interval (float): Segundos entre escrituras de los mensajes pendientes.
+        batch_size (int): Mensajes pendientes que adelantan la escritura.
+        max_pending (int): Tope de mensajes pendientes; los que lo superan se descartan (y se cuentan).
+        retention (float): Segundos que se conservan los mensajes (0 los conserva todos).
+    """
+    def __init__(self, db_path: str, flush_interval: float = 1.0, batch_size: int = 1000,
+                 max_pending: int = 100_000, retention: float = 0.0):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retention = retention
+        self._db = SqliteExecutor(db_path, name="search-index")
+        self._reader = SqliteExecutor(db_path, name="search-read")
+        self._pending: list = []
+        self._wakeup: asyncio.Event = None
+        self._closing = False
+        self._task: asyncio.Task = None
+        self._last_purge = 0.0
+        # Métricas
+        self.received = 0
+        self.dropped = 0
+        self.indexed = 0
+        self.batches = 0
+        self.searches = 0
+
+    async def open(self):
+        await self._db.run(lambda conn: conn.executescript(_SCHEMA))
+        await self._reader.run(lambda conn: conn.execute("PRAGMA query_only = 1"))
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flusher(), name="search-index")
+        add_event_listener(self.add)
+
+    def add(self, event):
+        """
+        Encola un mensaje (MessageEvent) para indexarlo en el próximo lote. O(1).
+        """
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append((event.ts, event.direction, event.wa_id, event.message_id, event.type, event.text))
+        self.received += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flusher(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Error al indexar los mensajes: {e}")
+
+    async def _flush(self):
+        rows, self._pending = self._pending, []
+        now = time.time()
+        # La limpieza por antigüedad corre a lo sumo una vez por minuto
+        purge_before = None
+        if self.retention and now - self._last_purge >= 60.0:
+            purge_before = now - self.retention
+            self._last_purge = now
+        if not rows and purge_before is None:
+            return
+
+        def _write(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO messages (ts, direction, wa_id, message_id, type, text) VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                if purge_before is not None:
+                    conn.execute("DELETE FROM messages WHERE ts < ?", (purge_before,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        await self._db.run(_write)
+        if rows:
+            self.indexed += len(rows)
+            self.batches += 1
+
+    async def search(self, text: str = None, wa_id: str = None, since: float = None, until: float = None,
+                     direction: str = None, limit: int = 20, cursor: int = None) -> dict:
+        """
+        Busca mensajes, del más reciente al más antiguo.
+
+        Args:
+            text (str): Palabras que deben aparecer en el texto (ver fts_query); None o "" no filtra por texto.
+            wa_id (str): Remitente o destinatario.
+            since / until (float): Rango de tiempo (time.time()); None sin límite.
+            direction (str): "in" o "out".
+            limit (int): Resultados por página.
+            cursor (int): Valor next_cursor de la página anterior; None para la primera página.
+
+        Returns:
+            dict: {"results": [...], "next_cursor": int o None}. Con texto, cada resultado incluye un
+            "snippet" con las coincidencias entre [ ].
+        """
+        query = fts_query(text) if text else ""
+        # Con texto y sin remitente se recorre el índice FTS5, que ya devuelve las coincidencias ordenadas
+        # por rowid (sin ordenar todas antes de aplicar LIMIT). Con remitente se recorren sus mensajes
+        # (índice por wa_id, pocos) y se verifica la coincidencia de cada uno en el índice FTS5
+        by_text = bool(query) and wa_id is None
+        key = "messages_fts.rowid" if by_text else "m.id"
+        conditions, params = [], []
+        if query:
+            conditions.append("messages_fts MATCH ?")
+            params.append(query)
+        if cursor is not None:
+            conditions.append(f"{key} < ?")
+            params.append(cursor)
+        if wa_id is not None:
+            conditions.append("m.wa_id = ?")
+            params.append(wa_id)
+        if since is not None:
+            conditions.append("m.ts >= ?")
+            params.append(since)
+            # Acota también por id, para que el recorrido (por id) empiece y termine cerca del rango.
+            # Si ningún mensaje es tan reciente, el límite inferior deja el rango vacío
+            conditions.append(f"{key} >= coalesce((SELECT id FROM messages WHERE ts >= ? ORDER BY ts LIMIT 1), {_MAX_ID})")
+            params.append(since - _CLOCK_SKEW)
+        if until is not None:
+            conditions.append("m.ts < ?")
+            params.append(until)
+            conditions.append(f"{key} < coalesce((SELECT id FROM messages WHERE ts >= ? ORDER BY ts LIMIT 1), {_MAX_ID})")
+            params.append(until + _CLOCK_SKEW)
+        if direction is not None:
+            conditions.append("m.direction = ?")
+            params.append(direction)
+        columns = ", ".join(f"m.{column}" for column in _COLUMNS)
+        if by_text:
+            sql = (f"SELECT {columns}, snippet(messages_fts, 0, '[', ']', '…', 12) FROM messages_fts "
+                   "JOIN messages m ON m.id = messages_fts.rowid")
+        elif query:
+            # CROSS JOIN fija el orden de recorrido: primero los mensajes del remitente
+            sql = (f"SELECT {columns}, snippet(messages_fts, 0, '[', ']', '…', 12) FROM messages m "
+                   "CROSS JOIN messages_fts ON messages_fts.rowid = m.id")
+        else:
+            sql = f"SELECT {columns} FROM messages m"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        # Se pide un resultado de más para saber si hay otra página
+        sql += f" ORDER BY {key} DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = await self._reader.run(lambda conn: conn.execute(sql, params).fetchall())
+        self.searches += 1
+        results = []
+        for row in rows[:limit]:
+            result = dict(zip(_COLUMNS, row))
+            if query:
+                result["snippet"] = row[len(_COLUMNS)]
+            results.append(result)
+        next_cursor = results[-1]["id"] if len(rows) > limit else None
+        return {"results": results, "next_cursor": next_cursor}
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "received": self.received,
+            "dropped": self.dropped,
+            "indexed": self.indexed,
+            "batches": self.batches,
+            "searches": self.searches,
+        }
+
+    async def close(self):
+        """
+        Deja de recibir mensajes, indexa los pendientes y cierra la base.
+        """
+        remove_event_listener(self.add)
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self._flush()
+        self._reader.close()
+        self._db.close()
+
+_search_index: SearchIndex = None
+
+async def start_search_index(settings: Settings):
+    """
+    Crea y abre el índice de búsqueda si está habilitado (SEARCH_ENABLED).
+    """
+    global _search_index
+    if settings.SEARCH_ENABLED and _search_index is None:
+        _search_index = SearchIndex(
+            settings.SEARCH_DB_PATH,
+            flush_interval=settings.SEARCH_FLUSH_INTERVAL,
+            batch_size=settings.SEARCH_BATCH_SIZE,
+            max_pending=settings.SEARCH_MAX_PENDING,
+            retention=settings.SEARCH_RETENTION,
+        )
+        await _search_index.open()
+        logger.info(f"Índice de búsqueda de mensajes en {settings.SEARCH_DB_PATH}.")
+
+async def close_search_index():
+    global _search_index
+    if _search_index is not None:
+        await _search_index.close()
+        _search_index = None
+
+def get_search_index() -> SearchIndex:
+    """
+    Devuelve el índice de búsqueda, o None si está deshabilitado.
+    """
+    return _search_index
@@ -0,0 +1,42 @@
+"""
+Este módulo verifica la firma de las notificaciones del webhook.
+Meta firma cada notificación con HMAC-SHA256 del cuerpo crudo usando el App Secret de la aplicación y
+la envía en el encabezado X-Hub-Signature-256 ("sha256=<hex>"). La verificación se hace sobre los mismos
+bytes que luego se decodifican (sin volver a leer ni copiar el cuerpo) y antes de cualquier parseo, y la
+comparación es de tiempo constante (hmac.compare_digest).
+"""
+import hashlib
+import hmac
+from services.exceptions import InvalidSignatureException
+
+SIGNATURE_HEADER = "x-hub-signature-256"
+_PREFIX = "sha256="
+# Largo de "sha256=" + 64 dígitos hexadecimales
+_SIGNATURE_LENGTH = len(_PREFIX) + 64
+
+def sign(body: bytes, app_secret: str) -> str:
+    """
+    Devuelve el valor de X-Hub-Signature-256 para `body` (útil para pruebas y el generador de carga).
+    """
+    return _PREFIX + hmac.new(app_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+def verify_signature(body: bytes, signature: str, app_secret: str):
+    """
+    Verifica la firma de una notificación.
+
+    Args:
+        body (bytes): Cuerpo crudo de la solicitud.
+        signature (str): Valor del encabezado X-Hub-Signature-256 (None si no vino).
+        app_secret (str): App Secret de la aplicación.
+
+    Raises:
+        InvalidSignatureException: Si la firma falta, tiene un formato inválido o no coincide.
+    """
+    # Los rechazos por formato no calculan el HMAC
+    if not signature:
+        raise InvalidSignatureException("falta el encabezado X-Hub-Signature-256")
+    if len(signature) != _SIGNATURE_LENGTH or not signature.startswith(_PREFIX):
+        raise InvalidSignatureException("formato inválido")
+    # Se comparan bytes: compare_digest no acepta str con caracteres no ASCII (encabezados en latin-1)
+    if not hmac.compare_digest(sign(body, app_secret).encode("ascii"), signature.lower().encode("utf-8")):
+        raise InvalidSignatureException("no coincide")
@@ -0,0 +1,93 @@
+import asyncio
+import httpx
+from types import SimpleNamespace
+from services.admission import AdmissionController, AdmissionMiddleware
+'''
+Pruebas del control de admisión: tasa por IP, concurrencia, profundidad de la cola y rutas no controladas.
+'''
+def make_settings(**overrides) -> SimpleNamespace:
+    values = dict(ADMISSION_ENABLED=True, ADMISSION_PATHS="/webhook", ADMISSION_MAX_CONCURRENCY=0, QUEUE_MAXSIZE=100,
+                  ADMISSION_QUEUE_THRESHOLD=0.8, ADMISSION_IP_RATE=0.0, ADMISSION_IP_BURST=1.0, ADMISSION_MAX_SOURCES=100,
+                  ADMISSION_TRUST_FORWARDED=False, ADMISSION_RETRY_AFTER=2.0)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+def scope(ip: str = "10.0.0.1", headers: list = ()) -> dict:
+    return {"type": "http", "path": "/webhook", "client": (ip, 1234), "headers": list(headers)}
+
+def test_ip_rate_limit_rejects_with_429():
+    controller = AdmissionController()
+    controller.start(make_settings(ADMISSION_IP_RATE=0.5, ADMISSION_IP_BURST=2))
+    assert controller.check(scope()) is None
+    assert controller.check(scope()) is None
+    rejection = controller.check(scope())
+    assert rejection.status_code == 429
+    assert rejection.extra_data["retry_after"] == 2
+    # Otra IP tiene su propio bucket
+    assert controller.check(scope("10.0.0.2")) is None
+
+def test_forwarded_header_is_used_only_when_trusted():
+    controller = AdmissionController()
+    headers = [(b"x-forwarded-for", b"203.0.113.7, 10.0.0.1")]
+    controller.start(make_settings())
+    assert controller.source(scope(headers=headers)) == "10.0.0.1"
+    controller.start(make_settings(ADMISSION_TRUST_FORWARDED=True))
+    assert controller.source(scope(headers=headers)) == "203.0.113.7"
+
+def test_sources_are_bounded():
+    controller = AdmissionController()
+    controller.start(make_settings(ADMISSION_IP_RATE=1.0, ADMISSION_MAX_SOURCES=2))
+    for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+        controller.check(scope(ip))
+    assert len(controller._buckets) == 2
+    assert "10.0.0.1" not in controller._buckets
+
+def test_concurrency_limit_rejects_with_503():
+    controller = AdmissionController()
+    controller.start(make_settings(ADMISSION_MAX_CONCURRENCY=2))
+    controller.in_flight = 2
+    rejection = controller.check(scope())
+    assert rejection.status_code == 503
+    controller.in_flight = 1
+    assert controller.check(scope()) is None
+
+def test_queue_depth_threshold():
+    depth = [79]
+    controller = AdmissionController()
+    controller.start(make_settings(), queue_depth=lambda: depth[0])
+    assert controller.queue_limit == 80
+    assert controller.check(scope()) is None
+    depth[0] = 80
+    assert controller.check(scope()).extra_data["reason"] == "cola de mensajes"
+
+def test_middleware_sheds_only_controlled_paths():
+    controller = AdmissionController()
+    controller.start(make_settings(ADMISSION_MAX_CONCURRENCY=1))
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if scope["path"] == "/webhook":
+            await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=AdmissionMiddleware(app, controller))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.create_task(client.post("/webhook"))
+            while controller.in_flight == 0:
+                await asyncio.sleep(0)
+            rejected = await client.post("/webhook")
+            health = await client.get("/health")
+            release.set()
+            admitted = await first
+        return rejected, health, admitted
+
+    rejected, health, admitted = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.headers["retry-after"] == "2"
+    assert rejected.json()["extra_data"]["reason"] == "solicitudes en curso"
+    assert health.status_code == 200
+    assert admitted.status_code == 200
+    assert controller.stats() == {"in_flight": 0, "admitted": 1, "rejected": 1, "sources": 0}
+    controller.close()
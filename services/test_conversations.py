@@ -0,0 +1,87 @@
+import asyncio
+from services.conversations import ConversationStore
+'''
+Pruebas del almacén de conversaciones: LRU, vencimiento por TTL, tope de memoria y escritura diferida en SQLite.
+'''
+def test_least_recent_conversation_is_evicted():
+    store = ConversationStore(max_entries=2)
+    store.record_message("a")
+    store.record_message("b")
+    store.get("a")
+    store.record_message("c")
+    assert store.get("b") is None
+    assert store.get("a").message_count == 1
+    assert store.stats()["evictions"] == 1
+
+def test_inactive_conversation_expires():
+    store = ConversationStore(ttl=60)
+    state = store.record_message("a", "wamid.1")
+    state.updated_at -= 61
+    assert store.get("a") is None
+    assert store.stats()["size"] == 0
+    assert store.get_or_create("a").message_count == 0
+
+def test_max_bytes_evicts_oldest():
+    store = ConversationStore(max_bytes=1000)
+    for wa_id in ("a", "b", "c"):
+        state = store.get_or_create(wa_id)
+        state.data["texto"] = "x" * 200
+        store.save(state)
+    assert store.get("a") is None
+    assert store.get("c") is not None
+    assert store.stats()["estimated_bytes"] <= 1000
+
+def test_changes_are_persisted_and_reloaded(tmp_path):
+    path = str(tmp_path / "conversations.db")
+
+    async def scenario():
+        store = ConversationStore(db_path=path, flush_interval=3600.0)
+        await store.open()
+        state = store.record_message("a", "wamid.1")
+        state.step = "pedir_direccion"
+        state.data["nombre"] = "Ñandú"
+        store.save(state)
+        store.record_message("b", "wamid.2")
+        await store._flush()
+        store.end("b")
+        # Escrita en disco pero vencida: no se carga al reabrir
+        store.record_message("c").updated_at -= store.ttl + 1
+        await store.close()
+        reopened = ConversationStore(db_path=path)
+        await reopened.open()
+        loaded = [reopened.get(wa_id) for wa_id in ("a", "b", "c")]
+        await reopened.close()
+        return store.stats()["writes"], loaded
+
+    writes, (a, b, c) = asyncio.run(scenario())
+    assert writes == 4
+    assert (a.step, a.data, a.message_count, a.last_message) == ("pedir_direccion", {"nombre": "Ñandú"}, 1, "wamid.1")
+    assert b is None
+    assert c is None
+
+def test_failed_flush_does_not_block_later_flushes(tmp_path):
+    path = str(tmp_path / "conversations.db")
+
+    async def scenario():
+        store = ConversationStore(db_path=path, flush_interval=3600.0)
+        await store.open()
+        await store._db.run(lambda conn: conn.execute(
+            "CREATE TRIGGER fail BEFORE INSERT ON conversations BEGIN SELECT RAISE(ABORT, 'disco lleno'); END"
+        ))
+        store.record_message("a")
+        try:
+            await store._flush()
+        except Exception as e:
+            failed = str(e)
+        await store._db.run(lambda conn: conn.execute("DROP TRIGGER fail"))
+        store.record_message("a")
+        await store.close()
+        reopened = ConversationStore(db_path=path)
+        await reopened.open()
+        state = reopened.get("a")
+        await reopened.close()
+        return failed, state
+
+    failed, state = asyncio.run(scenario())
+    assert "disco lleno" in failed
+    assert state.message_count == 2
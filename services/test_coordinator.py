@@ -0,0 +1,100 @@
+import asyncio
+import json
+from services.coordinator import CoordinatorClient, CoordinatorServer
+from services.dedup import DedupCache
+'''
+Pruebas del coordinador de workers: deduplicación compartida, reserva de envíos, pausas y locks.
+'''
+def build_server() -> CoordinatorServer:
+    return CoordinatorServer(DedupCache(max_entries=10, ttl=60))
+
+def test_dedup_and_forget():
+    server = build_server()
+    assert server.handle("D wamid.1") == "0"
+    assert server.handle("D wamid.1") == "1"
+    assert server.handle("F wamid.1") == "OK"
+    assert server.handle("D wamid.1") == "0"
+
+def test_admission_waits_when_recipient_burst_is_spent():
+    server = build_server()
+    assert float(server.handle("A 549111 100 100 1 1")) == 0.0
+    assert 0.9 < float(server.handle("A 549111 100 100 1 1")) <= 1.0
+    # Otro destinatario no espera por el primero
+    assert float(server.handle("A 549222 100 100 1 1")) == 0.0
+
+def test_pause_delays_every_recipient():
+    server = build_server()
+    assert server.handle("P 5") == "OK"
+    assert float(server.handle("A 549111 100 100 10 10")) > 4.9
+
+def test_lock_belongs_to_first_client():
+    server = build_server()
+    first, second = object(), object()
+    assert server.handle("L journal-replay", first) == "1"
+    assert server.handle("L journal-replay", second) == "0"
+    assert server.handle("L journal-replay", first) == "1"
+    server.release_locks(first)
+    assert server.handle("L journal-replay", second) == "1"
+
+def test_unknown_operation():
+    assert build_server().handle("X") == "ERR"
+
+def test_lock_is_released_when_worker_disconnects():
+    async def scenario():
+        server = build_server()
+        listener = await asyncio.start_server(server._serve_client, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        first, second = CoordinatorClient("127.0.0.1", port), CoordinatorClient("127.0.0.1", port)
+        try:
+            assert await first.acquire_lock("ngrok-tunnel") is True
+            assert await second.acquire_lock("ngrok-tunnel") is False
+            await first.close()
+            # El coordinador libera el lock al detectar el cierre de la conexión
+            for _ in range(100):
+                if not json.loads(await second.request("S"))["locks"]:
+                    break
+                await asyncio.sleep(0.01)
+            assert await second.acquire_lock("ngrok-tunnel") is True
+        finally:
+            await second.close()
+            listener.close()
+            await listener.wait_closed()
+
+    asyncio.run(scenario())
+
+def test_recipient_pause_only_delays_that_recipient():
+    server = build_server()
+    assert float(server.handle("A 549111 100 100 1 10")) == 0.0
+    assert server.handle("R 549111 3") == "OK"
+    # La pausa más el token del propio envío (1 por segundo)
+    assert 3.9 < float(server.handle("A 549111 100 100 1 10")) <= 4.0
+    assert float(server.handle("A 549222 100 100 1 10")) == 0.0
+    # Un destinatario sin bucket no tiene envíos que frenar
+    assert server.handle("R 549333 3") == "OK"
+
+def test_cancelled_request_does_not_shift_later_replies():
+    async def echo(reader, writer):
+        # Responde cada línea con ella misma; las "lentas" tardan en responder
+        while line := await reader.readline():
+            if line.startswith(b"slow"):
+                await asyncio.sleep(0.2)
+            writer.write(line)
+            await writer.drain()
+
+    async def scenario():
+        listener = await asyncio.start_server(echo, "127.0.0.1", 0)
+        client = CoordinatorClient("127.0.0.1", listener.sockets[0].getsockname()[1])
+        try:
+            slow = asyncio.create_task(client.request("slow D wamid.1"))
+            await asyncio.sleep(0.05)
+            slow.cancel()
+            try:
+                await slow
+            except asyncio.CancelledError:
+                pass
+            return await client.request("D wamid.2")
+        finally:
+            await client.close()
+            listener.close()
+
+    assert asyncio.run(scenario()) == "D wamid.2"
@@ -0,0 +1,61 @@
+import asyncio
+from services.dedup import DedupCache
+'''
+Pruebas de la caché de deduplicación: detección de reintentos, expiración por TTL y límite de capacidad.
+'''
+def test_duplicate_is_detected():
+    cache = DedupCache(max_entries=10, ttl=60)
+    assert cache.check_and_add("wamid.1") is False
+    assert cache.check_and_add("wamid.1") is True
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_expired_id_is_not_duplicate():
+    cache = DedupCache(max_entries=10, ttl=0)
+    cache.check_and_add("wamid.1")
+    assert cache.check_and_add("wamid.1") is False
+
+def test_capacity_evicts_oldest():
+    cache = DedupCache(max_entries=2, ttl=60)
+    for message_id in ("a", "b", "c"):
+        cache.check_and_add(message_id)
+    assert cache.stats()["size"] == 2
+    assert cache.check_and_add("a") is False
+
+def test_missing_id_is_never_duplicate():
+    cache = DedupCache()
+    assert cache.check_and_add(None) is False
+    assert cache.check_and_add(None) is False
+
+def test_discarded_id_is_processed_again():
+    cache = DedupCache()
+    cache.check_and_add("wamid.1")
+    cache.discard("wamid.1")
+    assert cache.check_and_add("wamid.1") is False
+
+def test_failed_flush_does_not_block_later_flushes(tmp_path):
+    path = str(tmp_path / "dedup.db")
+
+    async def scenario():
+        cache = DedupCache(db_path=path, flush_interval=3600.0)
+        await cache.open()
+        await cache._db.run(lambda conn: conn.execute(
+            "CREATE TRIGGER fail BEFORE INSERT ON seen_messages BEGIN SELECT RAISE(ABORT, 'disco lleno'); END"
+        ))
+        cache.check_and_add("wamid.1")
+        try:
+            await cache._flush()
+        except Exception as e:
+            failed = str(e)
+        await cache._db.run(lambda conn: conn.execute("DROP TRIGGER fail"))
+        cache.check_and_add("wamid.2")
+        await cache.close()
+        reopened = DedupCache(db_path=path)
+        await reopened.open()
+        duplicate = reopened.check_and_add("wamid.2")
+        await reopened.close()
+        return failed, duplicate
+
+    failed, duplicate = asyncio.run(scenario())
+    assert "disco lleno" in failed
+    assert duplicate is True
@@ -0,0 +1,87 @@
+import asyncio
+from types import SimpleNamespace
+from services.delivery_tracker import DeliveryTracker
+'''
+Pruebas del registro de estados de entrega: agregación por mensaje y combinación entre workers en SQLite.
+'''
+def status(message_id: str, name: str, error_code: int = None) -> SimpleNamespace:
+    errors = [SimpleNamespace(code=error_code)] if error_code is not None else []
+    return SimpleNamespace(id=message_id, status=name, recipient_id="5491122334455", errors=errors)
+
+def test_keeps_furthest_status_and_counts():
+    tracker = DeliveryTracker()
+    tracker._aggregate([status("wamid.1", "read"), status("wamid.1", "sent"), status("wamid.1", "delivered")])
+    record = tracker._records["wamid.1"]
+    assert record.status == "read"
+    assert record.counts == {"sent": 1, "delivered": 1, "read": 1, "failed": 0}
+
+def test_unknown_status_is_only_counted():
+    tracker = DeliveryTracker()
+    tracker._aggregate([status("wamid.1", "deleted")])
+    assert "wamid.1" not in tracker._records
+
+def test_error_code_is_recorded():
+    tracker = DeliveryTracker()
+    tracker._aggregate([status("wamid.1", "failed", error_code=131026)])
+    assert tracker._records["wamid.1"].error_code == 131026
+
+def test_capacity_evicts_oldest():
+    tracker = DeliveryTracker(max_entries=2)
+    tracker._aggregate([status(message_id, "sent") for message_id in ("a", "b", "c")])
+    assert list(tracker._records) == ["b", "c"]
+    assert tracker.stats()["evictions"] == 1
+
+def test_workers_are_combined_in_the_database(tmp_path):
+    async def scenario():
+        db_path = str(tmp_path / "deliveries.db")
+        first, second = DeliveryTracker(db_path=db_path), DeliveryTracker(db_path=db_path)
+        await first.open()
+        await second.open()
+        try:
+            first.record_many([status("wamid.1", "sent"), status("wamid.1", "read")])
+            second.record_many([status("wamid.1", "delivered"), status("wamid.1", "sent")])
+            await first._flush()
+            await second._flush()
+            # El segundo worker no pisa el estado ni las cantidades del primero
+            for tracker in (first, second):
+                record = await tracker.get("wamid.1")
+                assert record.status == "read"
+                assert record.counts == {"sent": 2, "delivered": 1, "read": 1, "failed": 0}
+            assert await second.get("wamid.2") is None
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(scenario())
+
+def test_unflushed_record_is_read_from_memory(tmp_path):
+    async def scenario():
+        tracker = DeliveryTracker(db_path=str(tmp_path / "deliveries.db"))
+        await tracker.open()
+        try:
+            tracker._aggregate([status("wamid.1", "sent")])
+            return (await tracker.get("wamid.1")).status
+        finally:
+            await tracker.close()
+
+    assert asyncio.run(scenario()) == "sent"
+
+def test_old_records_are_purged_from_the_database(tmp_path):
+    async def scenario():
+        tracker = DeliveryTracker(db_path=str(tmp_path / "deliveries.db"), flush_interval=3600.0, retention=60.0)
+        await tracker.open()
+        try:
+            tracker.record_many([status("wamid.old", "sent")])
+            await tracker._flush()
+            await tracker._db.run(lambda conn: conn.execute("UPDATE deliveries SET updated_at = updated_at - 120"))
+            tracker._last_purge = 0.0
+            tracker.record_many([status("wamid.new", "sent")])
+            await tracker._flush()
+            tracker._records.clear()
+            return await tracker.get("wamid.old"), await tracker.get("wamid.new")
+        finally:
+            await tracker.close()
+
+    old, new = asyncio.run(scenario())
+    assert old is None
+    assert new.status == "sent"
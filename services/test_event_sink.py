@@ -0,0 +1,55 @@
+import asyncio
+import os
+from services.event_sink import EventSink, RotatingWriter, event_files, read_events
+from services.message_events import record_event
+'''
+Pruebas de la exportación de eventos de mensajes: escritura en lote, lectura con filtros y rotación.
+'''
+DEAD_PID = 99_999_999  # mayor que cualquier pid posible
+
+def touch(directory, name: str) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "wb"):
+        pass
+    return path
+
+def test_events_are_written_and_read_back(tmp_path):
+    async def scenario():
+        sink = EventSink(RotatingWriter(str(tmp_path), "jsonl"), flush_interval=3600.0)
+        await sink.open()
+        record_event("in", "5491122334455", "wamid.1", "text", "hola")
+        record_event("out", "5491122334455", "wamid.2", "text", "¿en qué puedo ayudarte?", 200)
+        await sink.close()
+
+    asyncio.run(scenario())
+    events = list(read_events(str(tmp_path)))
+    assert [event["message_id"] for event in events] == ["wamid.1", "wamid.2"]
+    assert events[1]["status"] == "200"
+    assert [event["message_id"] for event in read_events(str(tmp_path), direction="out")] == ["wamid.2"]
+
+def test_prune_keeps_files_of_live_workers(tmp_path):
+    directory = str(tmp_path)
+    other = touch(directory, f"events-20240101-000000-{os.getppid()}-0001.jsonl.gz")
+    orphan = touch(directory, f"events-20240101-000001-{DEAD_PID}-0001.jsonl.gz")
+    own = touch(directory, f"events-20240101-000002-{os.getpid()}-0001.jsonl.gz")
+    writer = RotatingWriter(directory, "jsonl", max_files=1)
+    writer.rotate()
+    # Se conserva el último archivo terminado propio; el huérfano se borra y el del otro worker, no
+    assert os.path.exists(other)
+    assert not os.path.exists(orphan)
+    assert os.path.exists(own)
+    writer.write([(1.0, "in", "549", "wamid.1", "text", "hola", None)])
+    writer.rotate()
+    assert not os.path.exists(own)
+    assert os.path.exists(other)
+    # El archivo recién abierto todavía no existe en disco: quedan el del otro worker y el terminado propio
+    assert len(event_files(directory)) == 2
+
+def test_prune_removes_partial_files_of_dead_workers(tmp_path):
+    directory = str(tmp_path)
+    writer = RotatingWriter(directory, "jsonl")
+    orphan = touch(directory, f"events-20240101-000000-{DEAD_PID}-0001{writer.extension}.part")
+    live = touch(directory, f"events-20240101-000001-{os.getppid()}-0001{writer.extension}.part")
+    writer.rotate()
+    assert not os.path.exists(orphan)
+    assert os.path.exists(live)
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from services.journal import MessageJournal
+'''
+Pruebas del journal de mensajes: registro agrupado, confirmación y reproceso de los no confirmados.
+'''
+async def reopen(path: str) -> MessageJournal:
+    journal = MessageJournal(path, max_replays=2)
+    await journal.open()
+    return journal
+
+def test_append_returns_ids_in_order(tmp_path):
+    async def scenario():
+        journal = await reopen(str(tmp_path / "journal.db"))
+        ids = await journal.append_many([{"id": "wamid.1"}, {"id": "wamid.2"}])
+        more = await journal.append_many([{"id": "wamid.3"}])
+        stats = journal.stats()
+        await journal.close()
+        return ids + more, stats
+
+    ids, stats = asyncio.run(scenario())
+    assert ids == sorted(ids) and len(set(ids)) == 3
+    assert stats["appended"] == 3
+
+def test_unacked_messages_are_replayed_after_restart(tmp_path):
+    path = str(tmp_path / "journal.db")
+
+    async def scenario():
+        journal = await reopen(path)
+        first, second = await journal.append_many([{"id": "wamid.1"}, {"id": "wamid.2", "text": {"body": "ñandú"}}])
+        journal.ack(first)
+        await journal.close()
+        journal = await reopen(path)
+        pending = await journal.pending()
+        await journal.close()
+        return second, pending
+
+    second, pending = asyncio.run(scenario())
+    assert pending == [(second, {"id": "wamid.2", "text": {"body": "ñandú"}})]
+
+def test_messages_after_start_are_not_replayed(tmp_path):
+    async def scenario():
+        journal = await reopen(str(tmp_path / "journal.db"))
+        started_at = time.time()
+        await asyncio.sleep(0.01)
+        # Otro worker lo registró después de este arranque y lo está procesando
+        await journal.append_many([{"id": "wamid.1"}])
+        pending = await journal.pending(before=started_at)
+        await journal.close()
+        return pending
+
+    assert asyncio.run(scenario()) == []
+
+def test_message_is_dropped_after_max_replays(tmp_path):
+    async def scenario():
+        journal = await reopen(str(tmp_path / "journal.db"))
+        await journal.append_many([{"id": "wamid.1"}])
+        replays = [len(await journal.pending()) for _ in range(3)]
+        await journal.close()
+        return replays
+
+    assert asyncio.run(scenario()) == [1, 1, 0]
+
+def test_compact_removes_acked_messages(tmp_path):
+    async def scenario():
+        journal = await reopen(str(tmp_path / "journal.db"))
+        ids = await journal.append_many([{"id": "wamid.1"}, {"id": "wamid.2"}])
+        for entry_id in ids:
+            journal.ack(entry_id)
+        await journal._flush()
+        await journal.compact()
+        count = await journal._db.run(lambda conn: conn.execute("SELECT count(*) FROM journal").fetchone()[0])
+        await journal.close()
+        return count
+
+    assert asyncio.run(scenario()) == 0
+
+def test_failed_flush_does_not_block_later_writes(tmp_path):
+    async def scenario():
+        journal = await reopen(str(tmp_path / "journal.db"))
+        await journal._db.run(lambda conn: conn.execute(
+            "CREATE TRIGGER fail BEFORE INSERT ON journal BEGIN SELECT RAISE(ABORT, 'disco lleno'); END"
+        ))
+        try:
+            await journal.append_many([{"id": "wamid.1"}])
+        except Exception as e:
+            failed = str(e)
+        await journal._db.run(lambda conn: conn.execute("DROP TRIGGER fail"))
+        ids = await journal.append_many([{"id": "wamid.2"}])
+        pending = await journal.pending()
+        await journal.close()
+        return failed, ids, pending
+
+    failed, ids, pending = asyncio.run(scenario())
+    assert "disco lleno" in failed
+    assert pending == [(ids[0], {"id": "wamid.2"})]
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import os
+import time
+from services.media import MediaStore
+'''
+Pruebas de la caché de medios compartida entre workers: el tamaño y el desalojo LRU se calculan sobre el
+índice común (index.db), no sobre la copia en memoria de cada worker.
+'''
+async def add_file(store: MediaStore, content: bytes):
+    tmp_path = os.path.join(store.cache_dir, "tmp", hashlib.md5(content).hexdigest())
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    return await store._add(hashlib.sha256(content).hexdigest(), tmp_path, len(content), "image/jpeg")
+
+def test_eviction_accounts_for_files_of_every_worker(tmp_path):
+    async def scenario():
+        first = MediaStore(str(tmp_path), max_bytes=250)
+        second = MediaStore(str(tmp_path), max_bytes=250)
+        await first.open()
+        await second.open()
+        try:
+            a = await add_file(first, b"a" * 100)
+            b = await add_file(second, b"b" * 100)
+            # El tercer archivo supera el tope común: se desaloja el menos usado, aunque lo agregó el otro worker
+            c = await add_file(first, b"c" * 100)
+            assert not os.path.exists(a.path)
+            assert os.path.exists(b.path) and os.path.exists(c.path)
+            assert first.stats()["bytes"] == 200
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(scenario())
+
+def test_recently_used_file_is_kept(tmp_path):
+    async def scenario():
+        first = MediaStore(str(tmp_path), max_bytes=250)
+        second = MediaStore(str(tmp_path), max_bytes=250)
+        await first.open()
+        await second.open()
+        try:
+            a = await add_file(first, b"a" * 100)
+            b = await add_file(first, b"b" * 100)
+            await asyncio.sleep(0.01)
+            await second._touch(a)
+            await add_file(second, b"c" * 100)
+            assert os.path.exists(a.path)
+            assert not os.path.exists(b.path)
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(scenario())
+
+def test_file_evicted_by_another_worker_is_not_served(tmp_path):
+    async def scenario():
+        first = MediaStore(str(tmp_path), max_bytes=150)
+        second = MediaStore(str(tmp_path), max_bytes=150)
+        await first.open()
+        await second.open()
+        try:
+            a = await add_file(first, b"a" * 100)
+            first._media_ids["media.a"] = a.digest
+            assert first.cached("media.a") is a
+            await add_file(second, b"b" * 100)
+            assert first.cached("media.a") is None
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(scenario())
+
+def test_same_content_is_stored_once(tmp_path):
+    async def scenario():
+        first = MediaStore(str(tmp_path), max_bytes=1000)
+        second = MediaStore(str(tmp_path), max_bytes=1000)
+        await first.open()
+        await second.open()
+        try:
+            await add_file(first, b"a" * 100)
+            await add_file(second, b"a" * 100)
+            assert second.stats()["bytes"] == 100
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(scenario())
+
+def test_open_removes_abandoned_temporary_files(tmp_path):
+    tmp_dir = tmp_path / "tmp"
+    tmp_dir.mkdir()
+    abandoned, in_progress = tmp_dir / "abandonada", tmp_dir / "en-curso"
+    abandoned.write_bytes(b"a" * 10)
+    in_progress.write_bytes(b"b" * 10)
+    old = time.time() - 2 * 3600
+    os.utime(abandoned, (old, old))
+
+    async def scenario():
+        store = MediaStore(str(tmp_path))
+        await store.open()
+        await store.close()
+
+    asyncio.run(scenario())
+    assert not abandoned.exists()
+    # Puede ser una descarga en curso de otro worker
+    assert in_progress.exists()
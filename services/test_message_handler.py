@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from schemas.decoder import decode_payload
+from services.dedup import DedupCache
+from services.exceptions import QueueFullException
+from services.journal import MessageJournal
+from services.message_handler import enqueue_messages
+from services.wa_queue import MessageQueue
+'''
+Pruebas del encolado de mensajes del webhook: si la cola rechaza parte de una notificación, el reintento
+de Meta debe procesar los mensajes que no se encolaron.
+'''
+def build_payload(*message_ids) -> bytes:
+    messages = ",".join(
+        f'{{"from": "5491122334455", "id": "{message_id}", "timestamp": "1700000000", "type": "text", "text": {{"body": "hola"}}}}'
+        for message_id in message_ids
+    )
+    return (
+        '{"object": "whatsapp_business_account", "entry": [{"id": "1", "changes": [{"field": "messages", "value": '
+        '{"messaging_product": "whatsapp", "metadata": {"display_phone_number": "1", "phone_number_id": "1"}, '
+        f'"messages": [{messages}]}}}}]}}]}}'
+    ).encode()
+
+async def receive(queue, journal, dedup, raw: bytes) -> list:
+    """
+    Lo que hace POST /webhook en modo asíncrono: filtra duplicados y encola.
+    """
+    messages = decode_payload(raw).entry[0].changes[0].value.messages
+    messages = [message for message in messages if not await dedup.is_duplicate(message.id)]
+    await enqueue_messages(queue, journal, dedup, messages)
+    return [message.id for message in messages]
+
+def test_retry_processes_messages_the_queue_refused():
+    async def scenario():
+        queue = MessageQueue(handler=None, maxsize=1, workers=0)
+        queue.start()
+        dedup = DedupCache(max_entries=10, ttl=60)
+        raw = build_payload("wamid.L1", "wamid.L2")
+        with pytest.raises(QueueFullException):
+            await receive(queue, None, dedup, raw)
+        # El worker libera la cola; el reintento de Meta trae la notificación completa
+        assert queue._queue.get_nowait()[1][1].id == "wamid.L1"
+        assert await receive(queue, None, dedup, raw) == ["wamid.L2"]
+
+    asyncio.run(scenario())
+
+def test_refused_messages_are_acked_in_the_journal(tmp_path):
+    async def scenario():
+        journal = MessageJournal(str(tmp_path / "journal.db"))
+        await journal.open()
+        queue = MessageQueue(handler=None, maxsize=1, workers=0)
+        queue.start()
+        dedup = DedupCache(max_entries=10, ttl=60)
+        with pytest.raises(QueueFullException):
+            await receive(queue, journal, dedup, build_payload("wamid.L1", "wamid.L2"))
+        await journal.close()
+        # Solo queda pendiente el mensaje encolado: el rechazado lo reenvía Meta, no el reproceso del arranque
+        journal = MessageJournal(str(tmp_path / "journal.db"))
+        await journal.open()
+        pending = await journal.pending()
+        await journal.close()
+        return pending
+
+    pending = asyncio.run(scenario())
+    assert [data["id"] for _, data in pending] == ["wamid.L1"]
+
+def test_enqueued_messages_stay_marked_as_seen():
+    async def scenario():
+        queue = MessageQueue(handler=None, maxsize=10, workers=0)
+        queue.start()
+        dedup = DedupCache(max_entries=10, ttl=60)
+        raw = build_payload("wamid.L1", "wamid.L2")
+        assert await receive(queue, None, dedup, raw) == ["wamid.L1", "wamid.L2"]
+        assert await receive(queue, None, dedup, raw) == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,18 @@
+from services.metrics import Counter, message_type_label
+'''
+Pruebas de las métricas: etiquetas acotadas y exportación de los contadores.
+'''
+def test_known_message_types_are_kept():
+    assert message_type_label("text") == "text"
+    assert message_type_label("interactive") == "interactive"
+
+def test_unknown_message_types_are_grouped():
+    assert message_type_label("a|b") == "other"
+    assert message_type_label("tipo-nuevo-123") == "other"
+
+def test_counter_snapshot_round_trip():
+    counter = Counter("messages_total", "Mensajes", ("type",))
+    for type in ("text", "a|b", "text", "x" * 50):
+        counter.inc(message_type_label(type))
+    lines = counter.render(Counter.merge([counter.snapshot(), counter.snapshot()]))
+    assert lines == ['messages_total{type="other"} 4', 'messages_total{type="text"} 4']
@@ -0,0 +1,63 @@
+import json
+import pytest
+from types import SimpleNamespace
+from services.phone_numbers import PhoneNormalizer, build_normalizer, digits_only, parse_country_rules
+'''
+Pruebas de la normalización de números: reglas por prefijo y largo, prioridad de la tabla y caché LRU.
+'''
+def test_digits_only():
+    assert digits_only("+54 9 11 2233-4455") == "5491122334455"
+    assert digits_only("5491122334455") == "5491122334455"
+
+def test_parse_country_rules():
+    assert parse_country_rules("549:54:13, 521:52:13,1::") == {"549": ("54", 13), "521": ("52", 13), "1": ("", None)}
+    assert parse_country_rules("") == {}
+
+@pytest.mark.parametrize("value", ["549", "54a:54", "549:54:13:1", "549:x"])
+def test_invalid_country_rules_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_country_rules(value)
+
+def test_rule_rewrites_prefix_only_with_expected_length():
+    normalizer = PhoneNormalizer(rules=parse_country_rules("549:54:13"))
+    assert normalizer.normalize("5491122334455") == "541122334455"
+    assert normalizer.normalize("54911223344") == "54911223344"
+    assert normalizer.normalize("5411223344556") == "5411223344556"
+
+def test_longest_prefix_wins():
+    normalizer = PhoneNormalizer(rules=parse_country_rules("52:99,521:52"))
+    assert normalizer.normalize("5215512345678") == "525512345678"
+    assert normalizer.normalize("525512345678") == "995512345678"
+
+def test_mapping_has_priority_over_rules():
+    normalizer = PhoneNormalizer({"+54 9 11 2233 4455": "54 11 9999 0000"}, parse_country_rules("549:54"))
+    assert normalizer.normalize("5491122334455") == "541199990000"
+    assert normalizer.normalize("5491100000000") == "541100000000"
+
+def test_input_is_reduced_to_digits():
+    normalizer = PhoneNormalizer()
+    assert normalizer.normalize("+54 11 2233-4455") == "541122334455"
+    assert normalizer.stats()["rewrites"] == 1
+
+def test_cache_is_bounded_and_counts_hits():
+    normalizer = PhoneNormalizer(cache_size=2)
+    for number in ("1", "2", "1", "3"):
+        normalizer.normalize(number)
+    stats = normalizer.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["cache_size"] == 2
+    # "2" fue el menos usado recientemente
+    normalizer.normalize("2")
+    assert normalizer.stats()["misses"] == 4
+
+def test_build_normalizer_from_settings(tmp_path):
+    path = tmp_path / "phones.json"
+    path.write_text(json.dumps({"5491100000000": "541100000001", "5215500000000": "525500000001"}), encoding="utf-8")
+    settings = SimpleNamespace(PHONE_MAP_PATH=str(path), RECIPIENT_WAID_1="5491100000000", RECIPIENT_ITEM_1="541100000002",
+                               PHONE_COUNTRY_RULES="549:54:13", PHONE_CACHE_SIZE=100)
+    normalizer = build_normalizer(settings)
+    # RECIPIENT_* pisa la entrada del archivo
+    assert normalizer.normalize("5491100000000") == "541100000002"
+    assert normalizer.normalize("5215500000000") == "525500000001"
+    assert normalizer.normalize("5491122334455") == "541122334455"
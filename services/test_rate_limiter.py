@@ -0,0 +1,91 @@
+import asyncio
+import httpx
+from services.rate_limiter import RateLimiter, TokenBucket
+'''
+Pruebas del limitador de tasa: token buckets, ajuste adaptativo (AIMD) y límite por destinatario.
+'''
+class RecordingCoordinator:
+    """
+    Coordinador que registra las operaciones recibidas y no pide esperas.
+    """
+    def __init__(self):
+        self.requests = []
+
+    async def request(self, line: str) -> str:
+        self.requests.append(line)
+        return "0.0" if line.startswith("A ") else "OK"
+
+def graph_error(code: int, status_code: int = 400) -> httpx.Response:
+    return httpx.Response(status_code, json={"error": {"code": code}})
+
+def test_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=10.0, capacity=2.0)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert 0.09 < bucket.reserve() <= 0.1
+
+def test_try_take_does_not_reserve():
+    bucket = TokenBucket(rate=1.0, capacity=1.0)
+    assert bucket.try_take() is True
+    assert bucket.try_take() is False
+    assert bucket.tokens > -0.01
+
+def test_drain_adds_debt():
+    bucket = TokenBucket(rate=2.0, capacity=5.0)
+    bucket.drain(1.5)
+    # 1,5 s de deuda más el medio segundo del token pedido
+    assert 1.9 < bucket.reserve() <= 2.0
+
+def test_rate_limit_halves_rate_and_success_recovers():
+    async def scenario():
+        limiter = RateLimiter(global_rate=80.0, global_burst=80.0)
+        assert limiter.observe("549", httpx.Response(429)) is True
+        assert limiter.stats()["rate_factor"] == 0.5
+        assert limiter.stats()["paused_for_seconds"] > 0
+        assert limiter.observe("549", httpx.Response(200)) is False
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rate_factor"] == 0.51
+    assert stats["effective_global_rate"] == 40.8
+    assert stats["rate_limited"] == 1
+
+def test_factor_has_a_floor():
+    async def scenario():
+        limiter = RateLimiter()
+        for _ in range(20):
+            limiter.observe("549", graph_error(130429))
+        return limiter.stats()["rate_factor"]
+
+    assert asyncio.run(scenario()) == 0.05
+
+def test_pair_limit_only_delays_that_recipient():
+    limiter = RateLimiter(recipient_rate=1.0, recipient_burst=10.0)
+    assert limiter.observe("549111", graph_error(131056)) is True
+    assert limiter.stats()["paused_for_seconds"] == 0
+    assert limiter._recipient_bucket("549111").reserve() > 1.0
+    assert limiter._recipient_bucket("549222").reserve() == 0.0
+
+def test_pair_limit_is_shared_through_the_coordinator():
+    async def scenario():
+        coordinator = RecordingCoordinator()
+        limiter = RateLimiter(recipient_rate=0.5, coordinator=coordinator)
+        await limiter.acquire("549 111")
+        limiter.observe("549 111", graph_error(131056))
+        await asyncio.sleep(0)
+        return coordinator.requests
+
+    requests = asyncio.run(scenario())
+    assert requests[0].startswith("A 549111 ")
+    assert requests[1] == "R 549111 2.0"
+
+def test_usage_headers_reduce_rate_and_pause():
+    async def scenario():
+        limiter = RateLimiter()
+        usage = '{"1": [{"call_count": 95, "total_time": 10, "total_cputime": 10, "estimated_time_to_regain_access": 1}]}'
+        limiter.observe("549", httpx.Response(200, headers={"x-business-use-case-usage": usage}))
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rate_factor"] == 0.8
+    assert 59 < stats["paused_for_seconds"] <= 60
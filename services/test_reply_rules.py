@@ -0,0 +1,100 @@
+import asyncio
+import json
+import pytest
+from services.reply_rules import ReplyEngine, ReplyMatcher, normalize, required_literal
+'''
+Pruebas del motor de respuestas: prioridad de las reglas, palabras completas, normalización y recarga del archivo.
+'''
+def rule(type: str, pattern: str, reply: str) -> dict:
+    return {"type": type, "pattern": pattern, "reply": reply}
+
+def test_normalize_ignores_case_and_accents():
+    assert normalize("  ¿Envíos a CÓRDOBA? ") == normalize("¿envios a cordoba?")
+
+def test_first_rule_in_file_wins():
+    matcher = ReplyMatcher([
+        rule("keyword", "precio", "precios"),
+        rule("prefix", "hola", "saludo"),
+        rule("exact", "hola precio", "exacta"),
+    ], "default")
+    assert matcher.reply_for("hola precio") == "precios"
+    assert matcher.reply_for("hola") == "saludo"
+
+def test_earlier_regex_beats_later_keyword():
+    matcher = ReplyMatcher([
+        rule("regex", r"pedido \d+", "estado del pedido"),
+        rule("keyword", "pedido", "pedidos"),
+    ], "default")
+    assert matcher.reply_for("mi pedido 1234") == "estado del pedido"
+    assert matcher.reply_for("un pedido") == "pedidos"
+
+def test_keyword_matches_whole_words_only():
+    matcher = ReplyMatcher([rule("keyword", "hola", "saludo")], "default")
+    assert matcher.reply_for("hola, qué tal") == "saludo"
+    assert matcher.reply_for("buenas... ¡hola!") == "saludo"
+    assert matcher.reply_for("viajo a holanda") == "default"
+    assert matcher.reply_for("ahola") == "default"
+
+def test_keyword_skips_partial_match_and_finds_later_whole_word():
+    matcher = ReplyMatcher([rule("keyword", "plan", "planes")], "default")
+    assert matcher.reply_for("planilla del plan") == "planes"
+
+def test_exact_and_prefix_are_normalized():
+    matcher = ReplyMatcher([
+        rule("exact", "Menú", "menu"),
+        rule("prefix", "Envío", "envios"),
+    ], "default")
+    assert matcher.reply_for("MENU") == "menu"
+    assert matcher.reply_for("menu por favor") == "default"
+    assert matcher.reply_for("envio a domicilio") == "envios"
+
+def test_default_reply_when_nothing_matches():
+    matcher = ReplyMatcher([rule("keyword", "precio", "precios")], "default")
+    assert matcher.reply_for("nada que ver") == "default"
+    assert matcher.reply_for("") == "default"
+
+def test_required_literal():
+    assert required_literal(r"pedido \d+") == "pedido "
+    assert required_literal(r"\d+") == ""
+    assert required_literal(r"(?i)pedido") == ""
+
+def test_regex_without_literal_is_always_evaluated():
+    matcher = ReplyMatcher([rule("regex", r"^\d{4}$", "codigo")], "default")
+    assert matcher.reply_for("1234") == "codigo"
+    assert matcher.reply_for("12345") == "default"
+
+@pytest.mark.parametrize("bad_rule", [
+    rule("fuzzy", "hola", "x"),
+    rule("regex", "(", "x"),
+    rule("keyword", "   ", "x"),
+    {"type": "keyword", "pattern": "hola"},
+])
+def test_invalid_rules_are_rejected(bad_rule):
+    with pytest.raises(ValueError):
+        ReplyMatcher([bad_rule], "default")
+
+def test_engine_keeps_previous_rules_when_file_is_invalid(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"default_reply": "archivo", "rules": [rule("keyword", "hola", "saludo")]}), encoding="utf-8")
+
+    async def scenario():
+        engine = ReplyEngine(str(path), "default", reload_interval=0)
+        await engine.open()
+        assert engine.reply_for("hola") == "saludo"
+        assert engine.reply_for("chau") == "archivo"
+        path.write_text("{no es json", encoding="utf-8")
+        await engine.reload()
+        assert engine.reply_for("hola") == "saludo"
+        assert engine.stats()["reloads"] == 1
+        await engine.close()
+
+    asyncio.run(scenario())
+
+def test_engine_without_file_uses_default(tmp_path):
+    async def scenario():
+        engine = ReplyEngine(str(tmp_path / "missing.json"), "default", reload_interval=0)
+        await engine.open()
+        assert engine.reply_for("hola") == "default"
+        assert engine.stats()["rules"] == 0
+
+    asyncio.run(scenario())
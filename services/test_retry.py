@@ -0,0 +1,173 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+import pytest
+from services import wa_services
+from services.exceptions import CircuitOpenException
+from services.retry import CircuitBreaker, backoff_delay, parse_status_codes
+'''
+Pruebas de las políticas de resiliencia de los envíos: backoff, circuit breaker y qué errores se reintentan.
+'''
+SETTINGS = SimpleNamespace(RETRY_STATUS_CODES="500,503", RETRY_MAX_ATTEMPTS=3, RETRY_BASE_DELAY=0.0,
+                           RETRY_MAX_DELAY=0.0, RATE_LIMIT_MAX_REQUEUE=2)
+
+class RateLimitedLimiter:
+    """
+    Limitador que informa límite de tasa en cada respuesta.
+    """
+    def __init__(self):
+        self.observed = 0
+
+    async def acquire(self, to: str):
+        pass
+
+    def observe(self, to: str, response: httpx.Response) -> bool:
+        self.observed += 1
+        return response.status_code == 429
+
+def half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.0)
+    breaker.record_failure()
+    return breaker
+
+def post(monkeypatch, handler, breaker: CircuitBreaker = None, limiter=None) -> httpx.Response:
+    calls = []
+
+    def counting_handler(request):
+        calls.append(request)
+        return handler(request)
+
+    async def scenario():
+        async with httpx.AsyncClient(base_url="http://graph", transport=httpx.MockTransport(counting_handler)) as client:
+            monkeypatch.setattr(wa_services, "get_settings", lambda: SETTINGS)
+            monkeypatch.setattr(wa_services, "get_wa_client", lambda: client)
+            monkeypatch.setattr(wa_services, "get_circuit_breaker", lambda: breaker)
+            monkeypatch.setattr(wa_services, "get_rate_limiter", lambda: limiter)
+            return await wa_services.post_to_graph_api("/messages", "549", json={})
+
+    try:
+        return asyncio.run(scenario()), len(calls)
+    except Exception as e:
+        e.calls = len(calls)
+        raise
+
+def test_parse_status_codes():
+    assert parse_status_codes("500, 503,") == frozenset({500, 503})
+
+def test_backoff_delay_is_capped():
+    assert all(0 <= backoff_delay(attempt, 0.2, 1.0) <= 1.0 for attempt in range(10))
+
+def test_breaker_opens_after_threshold_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    # Sin espera de recuperación, la siguiente llamada es de prueba
+    breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenException):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_open_breaker_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60.0)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenException):
+        breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+def test_failed_half_open_call_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=0.0)
+    for _ in range(5):
+        breaker.record_failure()
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["opened_count"] == 2
+
+def test_connect_error_is_retried(monkeypatch):
+    attempts = iter([httpx.ConnectError("refused"), None])
+
+    def handler(request):
+        error = next(attempts)
+        if error is not None:
+            raise error
+        return httpx.Response(200, json={})
+
+    response, calls = post(monkeypatch, handler)
+    assert response.status_code == 200
+    assert calls == 2
+
+def test_read_timeout_is_not_retried(monkeypatch):
+    def handler(request):
+        raise httpx.ReadTimeout("sin respuesta")
+
+    breaker = CircuitBreaker(failure_threshold=5)
+    with pytest.raises(httpx.ReadTimeout) as error:
+        post(monkeypatch, handler, breaker=breaker)
+    # El mensaje pudo haberse enviado: un reintento lo duplicaría
+    assert error.value.calls == 1
+    assert breaker.stats()["consecutive_failures"] == 1
+
+def test_retryable_status_is_retried_until_attempts_run_out(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=10)
+    response, calls = post(monkeypatch, lambda request: httpx.Response(503), breaker=breaker)
+    assert response.status_code == 503
+    assert calls == SETTINGS.RETRY_MAX_ATTEMPTS
+    assert breaker.stats()["consecutive_failures"] == SETTINGS.RETRY_MAX_ATTEMPTS
+
+def test_exhausted_rate_limit_is_not_a_success(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=10)
+    breaker.record_failure()
+    limiter = RateLimitedLimiter()
+    response, calls = post(monkeypatch, lambda request: httpx.Response(429), breaker=breaker, limiter=limiter)
+    assert response.status_code == 429
+    assert calls == SETTINGS.RATE_LIMIT_MAX_REQUEUE + 1
+    # El rechazo por límite de tasa no reinicia la cuenta de fallos del circuito
+    assert breaker.stats()["consecutive_failures"] == 1
+
+def test_requeued_probe_keeps_its_half_open_slot(monkeypatch):
+    breaker = half_open_breaker()
+    responses = iter([httpx.Response(429), httpx.Response(200, json={})])
+    response, calls = post(monkeypatch, lambda request: next(responses), breaker=breaker, limiter=RateLimitedLimiter())
+    assert response.status_code == 200
+    assert calls == 2
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_rate_limited_probe_releases_half_open_slot(monkeypatch):
+    breaker = half_open_breaker()
+    response, _ = post(monkeypatch, lambda request: httpx.Response(429), breaker=breaker, limiter=RateLimitedLimiter())
+    assert response.status_code == 429
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # La siguiente llamada puede probar el endpoint y cerrar el circuito
+    response, _ = post(monkeypatch, lambda request: httpx.Response(200, json={}), breaker=breaker)
+    assert response.status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["rejected"] == 0
+
+def test_cancelled_probe_releases_half_open_slot(monkeypatch):
+    breaker = half_open_breaker()
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def handler(request):
+            started.set()
+            await asyncio.sleep(60)
+
+        async with httpx.AsyncClient(base_url="http://graph", transport=httpx.MockTransport(handler)) as client:
+            monkeypatch.setattr(wa_services, "get_settings", lambda: SETTINGS)
+            monkeypatch.setattr(wa_services, "get_wa_client", lambda: client)
+            monkeypatch.setattr(wa_services, "get_circuit_breaker", lambda: breaker)
+            monkeypatch.setattr(wa_services, "get_rate_limiter", lambda: None)
+            task = asyncio.create_task(wa_services.post_to_graph_api("/messages", "549", json={}))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(scenario())
+    breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
@@ -0,0 +1,100 @@
+import asyncio
+from services.message_events import MessageEvent
+from services.search_index import SearchIndex, fts_query
+'''
+Pruebas del índice de búsqueda: consulta FTS5, filtros, paginación por cursor y tope de pendientes.
+'''
+BASE_TS = 1_700_000_000.0
+
+def build_events(count: int = 30) -> list:
+    events = []
+    for i in range(count):
+        text = "quiero saber el precio del envío" if i % 3 == 0 else f"hola, mensaje {i}"
+        events.append(MessageEvent(BASE_TS + i, ("in", "out")[i % 2], f"54911000000{i % 3}", f"wamid.{i}", "text", text))
+    return events
+
+def run_with_index(tmp_path, scenario, **kwargs):
+    async def runner():
+        index = SearchIndex(str(tmp_path / "search.db"), flush_interval=3600.0, **kwargs)
+        await index.open()
+        try:
+            return await scenario(index)
+        finally:
+            await index.close()
+
+    return asyncio.run(runner())
+
+async def populate(index: SearchIndex, events: list):
+    for event in events:
+        index.add(event)
+    await index._flush()
+
+async def all_pages(index: SearchIndex, **kwargs) -> list:
+    pages, cursor = [], None
+    while True:
+        page = await index.search(cursor=cursor, **kwargs)
+        pages.append(page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+def test_fts_query_quotes_words_and_keeps_prefixes():
+    assert fts_query("precio plan") == '"precio" "plan"'
+    assert fts_query('prec* a"b') == '"prec"* "ab"'
+    assert fts_query(" * ") == ""
+
+def test_text_search_ignores_accents_and_supports_prefix(tmp_path):
+    async def scenario(index):
+        await populate(index, build_events())
+        by_accent = await index.search(text="ENVIO", limit=100)
+        by_prefix = await index.search(text="prec*", limit=100)
+        return by_accent, by_prefix
+
+    by_accent, by_prefix = run_with_index(tmp_path, scenario)
+    assert len(by_accent["results"]) == 10
+    assert [r["id"] for r in by_accent["results"]] == [r["id"] for r in by_prefix["results"]]
+    assert "[envío]" in by_accent["results"][0]["snippet"]
+
+def test_cursor_pages_cover_every_match_once(tmp_path):
+    async def scenario(index):
+        await populate(index, build_events())
+        return await all_pages(index, text="precio", limit=3), await all_pages(index, limit=7)
+
+    by_text, everything = run_with_index(tmp_path, scenario)
+    assert [len(page) for page in by_text] == [3, 3, 3, 1]
+    ids = [r["id"] for page in by_text for r in page]
+    assert ids == sorted(ids, reverse=True)
+    assert [r["message_id"] for page in by_text for r in page] == [f"wamid.{i}" for i in range(27, -1, -3)]
+    assert sum(len(page) for page in everything) == 30
+    assert "snippet" not in everything[0][0]
+
+def test_filters_combine(tmp_path):
+    async def scenario(index):
+        await populate(index, build_events())
+        by_sender = await all_pages(index, wa_id="549110000000", text="precio", limit=4)
+        by_range = await index.search(since=BASE_TS + 10, until=BASE_TS + 20, limit=100)
+        by_direction = await index.search(direction="out", text="precio", limit=100)
+        return by_sender, by_range, by_direction
+
+    by_sender, by_range, by_direction = run_with_index(tmp_path, scenario)
+    assert [r["message_id"] for page in by_sender for r in page] == [f"wamid.{i}" for i in range(27, -1, -3)]
+    assert [r["ts"] for r in by_range["results"]] == [BASE_TS + i for i in range(19, 9, -1)]
+    assert by_range["next_cursor"] is None
+    assert {r["message_id"] for r in by_direction["results"]} == {f"wamid.{i}" for i in (3, 9, 15, 21, 27)}
+
+def test_range_newer_than_every_message_is_empty(tmp_path):
+    async def scenario(index):
+        await populate(index, build_events())
+        return await index.search(since=BASE_TS + 1000)
+
+    assert run_with_index(tmp_path, scenario) == {"results": [], "next_cursor": None}
+
+def test_pending_messages_beyond_limit_are_dropped(tmp_path):
+    async def scenario(index):
+        await populate(index, build_events(5))
+        return index.stats()
+
+    stats = run_with_index(tmp_path, scenario, max_pending=3)
+    assert stats["received"] == 3
+    assert stats["dropped"] == 2
+    assert stats["indexed"] == 3
@@ -0,0 +1,35 @@
+import pytest
+from services.exceptions import InvalidSignatureException
+from services.signature import sign, verify_signature
+'''
+Pruebas de la verificación de la firma X-Hub-Signature-256 de las notificaciones del webhook.
+'''
+SECRET = "app-secret"
+BODY = b'{"object": "whatsapp_business_account", "entry": []}'
+
+def test_valid_signature_is_accepted():
+    verify_signature(BODY, sign(BODY, SECRET), SECRET)
+
+def test_uppercase_hex_is_accepted():
+    signature = sign(BODY, SECRET)
+    verify_signature(BODY, "sha256=" + signature[len("sha256="):].upper(), SECRET)
+
+def test_signature_of_another_body_is_rejected():
+    with pytest.raises(InvalidSignatureException):
+        verify_signature(BODY + b" ", sign(BODY, SECRET), SECRET)
+
+def test_signature_with_another_secret_is_rejected():
+    with pytest.raises(InvalidSignatureException):
+        verify_signature(BODY, sign(BODY, "otro-secreto"), SECRET)
+
+@pytest.mark.parametrize("signature", [
+    None,
+    "",
+    "sha256=abc",
+    "sha1=" + "0" * 66,
+    "sha256=" + "\xe9" * 64,  # encabezado latin-1 con caracteres no ASCII
+    "sha256=" + "ñ" * 64,
+])
+def test_malformed_signature_is_rejected(signature):
+    with pytest.raises(InvalidSignatureException):
+        verify_signature(BODY, signature, SECRET)
@@ -0,0 +1,71 @@
+import asyncio
+from services.wa_batcher import OutboundBatcher
+'''
+Pruebas del agrupador de envíos: fusión por destinatario, demora máxima y propagación de errores.
+'''
+class RecordingSender:
+    def __init__(self, error: Exception = None):
+        self.sent = []
+        self.error = error
+
+    async def __call__(self, to: str, text: str):
+        self.sent.append((to, text))
+        if self.error is not None:
+            raise self.error
+        return f"enviado a {to}"
+
+def test_merge_texts_drops_repeats_and_keeps_order():
+    assert OutboundBatcher.merge_texts(["hola", "menu", "hola", "chau"]) == "hola\nmenu\nchau"
+
+def test_messages_to_same_recipient_are_merged():
+    async def scenario():
+        sender = RecordingSender()
+        batcher = OutboundBatcher(sender, window=0.02, max_delay=0.5)
+        results = await asyncio.gather(batcher.send("549111", "hola"), batcher.send("549111", "¿cómo estás?"),
+                                       batcher.send("549222", "hola"))
+        return sender.sent, results, batcher.stats()
+
+    sent, results, stats = asyncio.run(scenario())
+    assert sorted(sent) == [("549111", "hola\n¿cómo estás?"), ("549222", "hola")]
+    assert results == ["enviado a 549111", "enviado a 549111", "enviado a 549222"]
+    assert stats["submitted"] == 3 and stats["sent"] == 2 and stats["coalesced"] == 1
+
+def test_max_delay_bounds_a_growing_batch():
+    async def scenario():
+        sender = RecordingSender()
+        batcher = OutboundBatcher(sender, window=0.05, max_delay=0.1)
+        async def trickle():
+            # Un mensaje cada 30 ms mantiene la ventana abierta indefinidamente
+            for index in range(10):
+                asyncio.ensure_future(batcher.send("549111", f"mensaje {index}"))
+                await asyncio.sleep(0.03)
+
+        await trickle()
+        await batcher.close()
+        return sender.sent
+
+    sent = asyncio.run(scenario())
+    # Con max_delay=0,1 s los 300 ms de mensajes no pueden salir en un solo lote
+    assert len(sent) > 1
+    assert sum(text.count("\n") + 1 for _, text in sent) == 10
+
+def test_send_error_reaches_every_caller():
+    async def scenario():
+        batcher = OutboundBatcher(RecordingSender(error=RuntimeError("Graph API caída")), window=0.01)
+        return await asyncio.gather(batcher.send("549111", "a"), batcher.send("549111", "b"), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_close_flushes_pending_batches():
+    async def scenario():
+        sender = RecordingSender()
+        batcher = OutboundBatcher(sender, window=60.0, max_delay=60.0)
+        pending = asyncio.ensure_future(batcher.send("549111", "hola"))
+        await asyncio.sleep(0)
+        await batcher.close()
+        return await pending, sender.sent
+
+    result, sent = asyncio.run(scenario())
+    assert result == "enviado a 549111"
+    assert sent == [("549111", "hola")]
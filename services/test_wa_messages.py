@@ -0,0 +1,77 @@
+import json
+import pytest
+from types import SimpleNamespace
+from services.wa_messages import (GraphEndpoint, button_message, cached_text_message, media_message, template_message,
+                                  text_message)
+'''
+Pruebas del armado de los cuerpos de envío: cada cuerpo concatenado debe ser el JSON equivalente a json.dumps del dict.
+'''
+TRICKY = 'Dijo "hola"\ny se fue \\ ñandú 🚀 </script>'
+TO = "5491122334455"
+
+ENDPOINT = GraphEndpoint(SimpleNamespace(META_API_VER="v19.0", PHONE_NUMBER_ID="123", ACCESS_TOKEN="token"), version=1)
+
+def expected(type: str, content: dict) -> dict:
+    return json.loads(json.dumps({"messaging_product": "whatsapp", "recipient_type": "individual", "to": TO,
+                                  "type": type, type: content}))
+
+def decode(message) -> dict:
+    return json.loads(ENDPOINT.body(TO, message))
+
+def test_endpoint_parts():
+    assert ENDPOINT.url == "/v19.0/123/messages"
+    assert ENDPOINT.headers["Authorization"] == "Bearer token"
+
+@pytest.mark.parametrize("body", ["hola", TRICKY, ""])
+def test_text_body(body):
+    assert decode(text_message(body)) == expected("text", {"body": body})
+    assert decode(cached_text_message(body)) == expected("text", {"body": body})
+
+def test_text_with_preview():
+    assert decode(text_message(TRICKY, preview_url=True)) == expected("text", {"body": TRICKY, "preview_url": True})
+
+def test_recipient_is_escaped():
+    body = json.loads(ENDPOINT.body('54"9', text_message("hola")))
+    assert body["to"] == '54"9'
+
+def test_template_without_components():
+    assert decode(template_message("bienvenida", "es_AR")) == expected(
+        "template", {"name": "bienvenida", "language": {"code": "es_AR"}}
+    )
+
+def test_template_with_components():
+    components = [{"type": "body", "parameters": [{"type": "text", "text": TRICKY}]}]
+    assert decode(template_message('promo "verano"', "es", components)) == expected(
+        "template", {"name": 'promo "verano"', "language": {"code": "es"}, "components": components}
+    )
+
+def test_interactive_buttons():
+    message = button_message(TRICKY, [("si", "Sí ✅"), ("no", 'No "gracias"')], header="Título\n", footer="pie ñ")
+    assert decode(message) == expected("interactive", {
+        "type": "button",
+        "body": {"text": TRICKY},
+        "action": {"buttons": [
+            {"type": "reply", "reply": {"id": "si", "title": "Sí ✅"}},
+            {"type": "reply", "reply": {"id": "no", "title": 'No "gracias"'}},
+        ]},
+        "header": {"type": "text", "text": "Título\n"},
+        "footer": {"text": "pie ñ"},
+    })
+    assert message.text == TRICKY
+
+def test_media_by_id():
+    message = media_message("document", media_id="987", caption=TRICKY, filename="factura ñ.pdf")
+    assert decode(message) == expected("document", {"id": "987", "caption": TRICKY, "filename": "factura ñ.pdf"})
+
+def test_media_by_link():
+    link = 'https://example.com/a b?x="1"&y=ñ'
+    assert decode(media_message("image", link=link)) == expected("image", {"link": link})
+
+@pytest.mark.parametrize("kwargs", [
+    {"media_type": "gif", "media_id": "1"},
+    {"media_type": "image"},
+    {"media_type": "image", "media_id": "1", "link": "https://example.com"},
+])
+def test_invalid_media_is_rejected(kwargs):
+    with pytest.raises(ValueError):
+        media_message(**kwargs)
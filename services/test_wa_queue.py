@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from services.exceptions import QueueFullException
+from services.wa_queue import MessageQueue
+'''
+Pruebas de la cola de mensajes del modo asíncrono: contrapresión, procesamiento por los workers y vaciado.
+'''
+def test_full_queue_rejects():
+    async def scenario():
+        queue = MessageQueue(handler=None, maxsize=2, workers=0)
+        queue.start()
+        queue.put("a")
+        queue.put("b")
+        with pytest.raises(QueueFullException):
+            queue.put("c")
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["enqueued"] == 2
+    assert stats["rejected"] == 1
+    assert stats["high_watermark"] == 2
+
+def test_workers_process_every_item():
+    async def scenario():
+        processed = []
+
+        async def handler(item):
+            await asyncio.sleep(0)
+            processed.append(item)
+
+        queue = MessageQueue(handler, maxsize=100, workers=4)
+        queue.start()
+        for item in range(50):
+            queue.put(item)
+        await queue.drain()
+        return processed, queue.stats()
+
+    processed, stats = asyncio.run(scenario())
+    assert sorted(processed) == list(range(50))
+    assert stats["processed"] == 50
+    assert stats["depth"] == 0
+
+def test_handler_errors_do_not_stop_the_worker():
+    async def scenario():
+        async def handler(item):
+            if item == "falla":
+                raise RuntimeError("error de prueba")
+
+        queue = MessageQueue(handler, maxsize=10, workers=1)
+        queue.start()
+        for item in ("a", "falla", "b"):
+            queue.put(item)
+        await queue.drain()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["processed"] == 2
+    assert stats["failed"] == 1
+
+def test_drain_gives_up_after_timeout():
+    async def scenario():
+        async def handler(item):
+            await asyncio.sleep(10)
+
+        queue = MessageQueue(handler, maxsize=10, workers=1)
+        queue.start()
+        queue.put("lento")
+        queue.put("pendiente")
+        await queue.drain(timeout=0.05)
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["processed"] == 0
+    assert stats["depth"] == 1
+
+def test_put_wait_waits_for_room():
+    async def scenario():
+        queue = MessageQueue(handler=None, maxsize=1, workers=0)
+        queue.start()
+        queue.put("a")
+        waiting = asyncio.create_task(queue.put_wait("b"))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        queue._queue.get_nowait()
+        await asyncio.wait_for(waiting, timeout=1)
+        return queue.depth()
+
+    assert asyncio.run(scenario()) == 1
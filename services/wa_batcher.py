@@ -0,0 +1,160 @@
+"""
+Este módulo agrupa los envíos salientes por destinatario.
+Los mensajes dirigidos al mismo número dentro de una ventana corta se fusionan en un solo envío
+(los textos repetidos se envían una sola vez), y los envíos a distintos destinatarios se despachan
+en paralelo con un límite de concurrencia. Así se reducen las llamadas a la Graph API en ráfagas.
+"""
+import asyncio
+import logging
+import time
+from config_setup.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+_batcher = None
+
+class _PendingBatch:
+    """
+    Mensajes acumulados para un destinatario a la espera de ser enviados.
+    """
+    __slots__ = ("texts", "futures", "first_at", "timer")
+
+    def __init__(self):
+        self.texts: list = []
+        self.futures: list = []
+        self.first_at = time.monotonic()
+        self.timer: asyncio.TimerHandle = None
+
+class OutboundBatcher:
+    """
+    Agrupador de envíos por destinatario.
+
+    Args:
+        sender (callable): Corrutina sender(to, text) que realiza el envío real.
+        window (float): Segundos que se espera por más mensajes del mismo destinatario.
+        max_delay (float): Demora máxima (segundos) desde el primer mensaje del lote hasta su envío.
+        max_concurrency (int): Envíos simultáneos máximos (a distintos destinatarios).
+    """
+    def __init__(self, sender, window: float = 0.05, max_delay: float = 0.25, max_concurrency: int = 16):
+        self.sender = sender
+        self.window = window
+        self.max_delay = max_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._batches: dict = {}
+        self._inflight: set = set()
+        # Métricas
+        self.submitted = 0
+        self.sent = 0
+        self.coalesced = 0
+
+    async def send(self, to: str, text: str):
+        """
+        Agrega un mensaje al lote del destinatario y espera a que el lote se envíe.
+
+        Raises:
+            Exception: La misma excepción que haya lanzado el envío del lote.
+        """
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(to)
+        if batch is None:
+            batch = self._batches[to] = _PendingBatch()
+        future = loop.create_future()
+        batch.texts.append(text)
+        batch.futures.append(future)
+        self.submitted += 1
+        self._schedule(to, batch, loop)
+        return await future
+
+    def _schedule(self, to: str, batch: _PendingBatch, loop: asyncio.AbstractEventLoop):
+        """
+        (Re)programa el envío del lote: al cerrar la ventana, sin superar la demora máxima.
+        """
+        if batch.timer is not None:
+            batch.timer.cancel()
+        now = time.monotonic()
+        delay = min(self.window, batch.first_at + self.max_delay - now)
+        batch.timer = loop.call_later(max(delay, 0.0), self._flush, to)
+
+    def _flush(self, to: str):
+        batch = self._batches.pop(to, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._dispatch(to, batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    @staticmethod
+    def merge_texts(texts: list) -> str:
+        """
+        Fusiona los textos de un lote: descarta los repetidos y conserva el orden.
+        """
+        return "\n".join(dict.fromkeys(texts))
+
+    async def _dispatch(self, to: str, batch: _PendingBatch):
+        text = self.merge_texts(batch.texts)
+        try:
+            async with self._semaphore:
+                result = await self.sender(to, text)
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.sent += 1
+        self.coalesced += len(batch.texts) - 1
+        for future in batch.futures:
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """
+        Devuelve las métricas del agrupador.
+        """
+        return {
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "pending_recipients": len(self._batches),
+            "inflight": len(self._inflight),
+        }
+
+    async def close(self):
+        """
+        Envía de inmediato los lotes pendientes y espera a que terminen los envíos en curso.
+        """
+        for to in list(self._batches):
+            self._flush(to)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+def start_batcher(settings: Settings, sender) -> OutboundBatcher:
+    """
+    Crea el agrupador compartido si BATCH_ENABLED está activo. Se llama al arrancar la aplicación.
+    """
+    global _batcher
+    if settings.BATCH_ENABLED and _batcher is None:
+        _batcher = OutboundBatcher(
+            sender,
+            window=settings.BATCH_WINDOW,
+            max_delay=settings.BATCH_MAX_DELAY,
+            max_concurrency=settings.BATCH_MAX_CONCURRENCY,
+        )
+        logger.info(f"Agrupador de envíos iniciado: ventana={settings.BATCH_WINDOW}s, demora máxima={settings.BATCH_MAX_DELAY}s")
+    return _batcher
+
+async def close_batcher():
+    """
+    Envía los lotes pendientes y descarta el agrupador compartido.
+    """
+    global _batcher
+    if _batcher is not None:
+        await _batcher.close()
+        _batcher = None
+
+def get_batcher() -> OutboundBatcher:
+    """
+    Devuelve el agrupador compartido, o None si el agrupamiento está deshabilitado.
+    """
+    return _batcher
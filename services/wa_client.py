@@ -0,0 +1,82 @@
+"""
+Este módulo mantiene el cliente HTTP asíncrono usado para hablar con la Graph API de Meta.
+El cliente es único por proceso, se abre al arrancar la aplicación y se cierra al apagarla,
+de modo que todas las llamadas salientes reutilizan el mismo pool de conexiones (keep-alive y HTTP/2).
+"""
+import logging
+import httpx
+from config_setup.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient = None
+
+def _http2_available() -> bool:
+    """
+    Verifica si el paquete h2 (soporte HTTP/2 de httpx) está instalado.
+    """
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def build_client(settings: Settings) -> httpx.AsyncClient:
+    """
+    Construye un cliente httpx.AsyncClient con los límites de pool definidos en Settings.
+
+    Args:
+        settings (Settings): Configuración de la aplicación.
+
+    Returns:
+        httpx.AsyncClient: Cliente listo para usar.
+    """
+    http2 = settings.WA_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("HTTP/2 solicitado pero el paquete 'h2' no está instalado. Se usará HTTP/1.1.")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.WA_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.WA_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.WA_POOL_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=settings.WA_CONNECT_TIMEOUT,
+        read=settings.WA_READ_TIMEOUT,
+        write=settings.WA_WRITE_TIMEOUT,
+        pool=settings.WA_POOL_TIMEOUT,
+    )
+    logger.info("Cliente de la Graph API: http2=%s, max_connections=%s, max_keepalive=%s",
+                http2, settings.WA_POOL_MAX_CONNECTIONS, settings.WA_POOL_MAX_KEEPALIVE)
+    return httpx.AsyncClient(base_url=settings.META_URL, http2=http2, limits=limits, timeout=timeout)
+
+async def start_wa_client(settings: Settings) -> httpx.AsyncClient:
+    """
+    Abre el cliente compartido. Se llama una sola vez al arrancar la aplicación.
+    """
+    global _client
+    if _client is None:
+        _client = build_client(settings)
+    return _client
+
+async def close_wa_client():
+    """
+    Cierra el cliente compartido y libera las conexiones del pool.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Cliente de la Graph API cerrado.")
+
+def get_wa_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente compartido.
+
+    Raises:
+        RuntimeError: Si el cliente no fue iniciado (la aplicación no ejecutó su arranque).
+    """
+    if _client is None:
+        raise RuntimeError("El cliente de la Graph API no está iniciado. Llame a start_wa_client() al arrancar la aplicación.")
+    return _client
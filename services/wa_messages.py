@@ -0,0 +1,163 @@
+"""
+Este módulo arma los mensajes salientes de la Graph API (texto, plantilla, interactivo y multimedia).
+
+Un envío tiene partes fijas (URL, encabezado de autorización, "messaging_product", el esqueleto de cada
+tipo de mensaje) y una sola parte por destinatario (el campo "to"). Para no reconstruir ni serializar lo
+fijo en cada envío:
+
+1. GraphEndpoint: URL, encabezados y el comienzo del JSON se arman una sola vez por versión de la
+   configuración (config_settings.settings_version); si una recarga del .env rota el ACCESS_TOKEN se
+   reconstruyen en el siguiente envío.
+2. OutboundMessage: el contenido del mensaje ya serializado a bytes. Un mensaje se puede armar una vez y
+   enviar a muchos destinatarios (por ejemplo, un menú interactivo); los textos de respuesta frecuentes
+   se memorizan (cached_text_message).
+3. El cuerpo final es la concatenación de bytes: prefijo + destinatario + contenido.
+"""
+import json
+from functools import lru_cache
+from config_setup.config_settings import get_settings, settings_version
+
+MEDIA_TYPES = ("image", "audio", "video", "document", "sticker")
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class OutboundMessage:
+    """
+    Contenido de un mensaje saliente, serializado una sola vez (inmutable).
+
+    Args:
+        type (str): Tipo de mensaje de la Graph API ("text", "template", "interactive", "image"...).
+        content (dict): Objeto del tipo (por ejemplo {"body": "..."} para "text").
+        text (str): Texto legible del mensaje (cuerpo o epígrafe), para registrar el envío; None si no tiene.
+    """
+    __slots__ = ("type", "fragment", "text")
+
+    def __init__(self, type: str, content: dict, text: str = None):
+        self.type = type
+        self.text = text
+        # Todo lo que sigue al destinatario: ,"type":"text","text":{...}}
+        self.fragment = b',"type":' + _dumps(type) + b',' + _dumps(type) + b':' + _dumps(content) + b'}'
+
+    def __repr__(self) -> str:
+        return f"OutboundMessage(type={self.type!r}, {len(self.fragment)} bytes)"
+
+def text_message(body: str, preview_url: bool = False) -> OutboundMessage:
+    """
+    Mensaje de texto.
+    """
+    content = {"body": body}
+    if preview_url:
+        content["preview_url"] = True
+    return OutboundMessage("text", content, body)
+
+@lru_cache(maxsize=1024)
+def cached_text_message(body: str) -> OutboundMessage:
+    """
+    Mensaje de texto memorizado: las respuestas automáticas se repiten y se serializan una sola vez.
+    """
+    return text_message(body)
+
+@lru_cache(maxsize=256)
+def _template_skeleton(name: str, language: str) -> bytes:
+    return b',"type":"template","template":{"name":' + _dumps(name) + b',"language":{"code":' + _dumps(language) + b'}'
+
+def template_message(name: str, language: str = "es", components: list = None) -> OutboundMessage:
+    """
+    Mensaje de plantilla aprobada. El esqueleto (nombre e idioma) se serializa una vez por plantilla;
+    solo los componentes (parámetros del destinatario) se serializan en cada llamada.
+
+    Args:
+        name (str): Nombre de la plantilla.
+        language (str): Código de idioma de la plantilla.
+        components (list): Componentes con parámetros, en el formato de la Graph API.
+    """
+    message = OutboundMessage.__new__(OutboundMessage)
+    message.type = "template"
+    message.text = None
+    tail = b',"components":' + _dumps(components) + b'}}' if components else b'}}'
+    message.fragment = _template_skeleton(name, language) + tail
+    return message
+
+def interactive_message(interactive: dict) -> OutboundMessage:
+    """
+    Mensaje interactivo (botones, listas, etc.), con el objeto "interactive" de la Graph API.
+    """
+    return OutboundMessage("interactive", interactive, interactive.get("body", {}).get("text"))
+
+def button_message(body: str, buttons: list, header: str = None, footer: str = None) -> OutboundMessage:
+    """
+    Mensaje interactivo con botones de respuesta.
+
+    Args:
+        body (str): Texto del mensaje.
+        buttons (list): Botones como tuplas (id, título); la Graph API admite hasta 3.
+    """
+    interactive = {
+        "type": "button",
+        "body": {"text": body},
+        "action": {"buttons": [{"type": "reply", "reply": {"id": id_, "title": title}} for id_, title in buttons]},
+    }
+    if header:
+        interactive["header"] = {"type": "text", "text": header}
+    if footer:
+        interactive["footer"] = {"text": footer}
+    return interactive_message(interactive)
+
+def media_message(media_type: str, media_id: str = None, link: str = None, caption: str = None,
+                  filename: str = None) -> OutboundMessage:
+    """
+    Mensaje multimedia a partir de un id de medio subido a la Graph API o de un enlace público.
+
+    Raises:
+        ValueError: Si el tipo no es multimedia o no se indica exactamente uno de media_id y link.
+    """
+    if media_type not in MEDIA_TYPES:
+        raise ValueError(f"Tipo de medio inválido: '{media_type}' (válidos: {', '.join(MEDIA_TYPES)})")
+    if (media_id is None) == (link is None):
+        raise ValueError("Se debe indicar media_id o link (solo uno)")
+    content = {"id": media_id} if media_id is not None else {"link": link}
+    if caption:
+        content["caption"] = caption
+    if filename:
+        content["filename"] = filename
+    return OutboundMessage(media_type, content, caption)
+
+class GraphEndpoint:
+    """
+    Partes fijas de un envío, armadas una sola vez por versión de la configuración.
+
+    Attributes:
+        url (str): Ruta de envío relativa a META_URL.
+        headers (dict): Encabezados de autorización y tipo de contenido (no modificar).
+        prefix (bytes): Comienzo del cuerpo JSON, hasta el valor de "to".
+        version (int): Versión de la configuración con la que se armó.
+    """
+    __slots__ = ("url", "headers", "prefix", "version")
+
+    def __init__(self, settings, version: int):
+        self.url = f"/{settings.META_API_VER}/{settings.PHONE_NUMBER_ID}/messages"
+        self.headers = {
+            "Authorization": f"Bearer {settings.ACCESS_TOKEN}",
+            "Content-Type": "application/json"
+        }
+        self.prefix = b'{"messaging_product":"whatsapp","recipient_type":"individual","to":'
+        self.version = version
+
+    def body(self, to: str, message: OutboundMessage) -> bytes:
+        """
+        Cuerpo JSON del envío de `message` a `to`.
+        """
+        return self.prefix + _dumps(to) + message.fragment
+
+_endpoint: GraphEndpoint = None
+
+def get_endpoint() -> GraphEndpoint:
+    """
+    Devuelve las partes fijas del envío, reconstruyéndolas solo si cambió la versión de la configuración.
+    """
+    global _endpoint
+    version = settings_version()
+    if _endpoint is None or _endpoint.version != version:
+        _endpoint = GraphEndpoint(get_settings(), version)
+    return _endpoint
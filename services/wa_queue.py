@@ -0,0 +1,125 @@
+"""
+Este módulo implementa una cola en memoria (asyncio.Queue acotada) para procesar los mensajes
+entrantes en segundo plano. El endpoint POST /webhook encola y responde de inmediato; un pool
+de workers consume la cola y ejecuta el procesamiento (respuesta vía WhatsApp).
+"""
+import asyncio
+import logging
+import time
+from services.exceptions import QueueFullException
+
+logger = logging.getLogger(__name__)
+
+class MessageQueue:
+    """
+    Cola acotada de mensajes con un pool de workers y métricas de contrapresión.
+
+    Args:
+        handler (callable): Corrutina que procesa un elemento de la cola.
+        maxsize (int): Capacidad máxima de la cola.
+        workers (int): Cantidad de workers concurrentes.
+    """
+    def __init__(self, handler, maxsize: int = 1000, workers: int = 4):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue: asyncio.Queue = None
+        self._tasks: list = []
+        # Métricas
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.high_watermark = 0
+        self.wait_time_total = 0.0
+
+    def start(self):
+        """
+        Crea la cola y lanza los workers. Debe llamarse dentro del event loop.
+        """
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker(i), name=f"wa-queue-worker-{i}") for i in range(self.workers)]
+        logger.info(f"Cola de mensajes iniciada: maxsize={self.maxsize}, workers={self.workers}")
+
+    def put(self, item):
+        """
+        Encola un elemento sin esperar.
+
+        Raises:
+            QueueFullException: Si la cola está llena (contrapresión hacia Meta).
+        """
+        try:
+            self._queue.put_nowait((time.monotonic(), item))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning("Cola llena, se rechaza el mensaje (%s elementos en espera).", self.maxsize)
+            raise QueueFullException(queue_size=self.maxsize)
+        self.enqueued += 1
+        self.high_watermark = max(self.high_watermark, self._queue.qsize())
+
+    async def put_wait(self, item):
+        """
+        Encola un elemento esperando a que haya lugar (para reprocesos internos, no para el webhook).
+        """
+        await self._queue.put((time.monotonic(), item))
+        self.enqueued += 1
+        self.high_watermark = max(self.high_watermark, self._queue.qsize())
+
+    def depth(self) -> int:
+        """
+        Cantidad de elementos esperando en la cola.
+        """
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> dict:
+        """
+        Devuelve las métricas de la cola.
+        """
+        done = self.processed + self.failed
+        return {
+            "depth": self.depth(),
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "high_watermark": self.high_watermark,
+            "avg_wait_seconds": round(self.wait_time_total / done, 6) if done else 0.0,
+        }
+
+    async def _worker(self, worker_id: int):
+        """
+        Consume la cola indefinidamente hasta ser cancelado.
+        """
+        while True:
+            enqueued_at, item = await self._queue.get()
+            self.wait_time_total += time.monotonic() - enqueued_at
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("Error en el worker %s al procesar un mensaje: %s", worker_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def drain(self, timeout: float = 10.0):
+        """
+        Espera a que se procesen los elementos pendientes (hasta timeout segundos) y detiene los workers.
+        Se llama al apagar la aplicación.
+        """
+        if self._queue is None:
+            return
+        pending = self._queue.qsize()
+        if pending:
+            logger.info(f"Vaciando la cola de mensajes: {pending} pendientes...")
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Tiempo de vaciado agotado: quedan {self._queue.qsize()} mensajes sin procesar.")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Cola de mensajes detenida. Métricas finales: {self.stats()}")
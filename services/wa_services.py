@@ -13,58 +13,160 @@ Este módulo contiene funciones para enviar mensajes de WhatsApp Business API.
 │   ├── __init__.py        # Inicializa el paquete de configuración
 │   └── settings.py        # Manejo de configuración de la aplicación
 """
-import requests
+import asyncio
+import httpx
 import logging
-import json
-from config_setup.settings import settings
+import time
+from config_setup.config_settings import get_settings
 from fastapi import HTTPException
+from services.exceptions import CircuitOpenException
+from services.wa_client import get_wa_client
+from services.rate_limiter import get_rate_limiter
+from services.retry import get_circuit_breaker, backoff_delay, parse_status_codes, RETRYABLE_TRANSPORT_ERRORS
+from services.metrics import SEND_DURATION, SEND_RESPONSES
+from services.phone_numbers import get_phone_normalizer
+from services.wa_messages import OutboundMessage, get_endpoint, cached_text_message
+from services.message_events import has_event_listeners, record_event
 
 logger = logging.getLogger(__name__)
 
 def get_from_number(from_number: str) -> str:
     """
-    Verifica si el número de teléfono del remitente es el número de teléfono de WhatsApp Business API.
-    Si es así, cambia el FORMATO del número de teléfono del remitente al número de teléfono de WhatsApp Business API.
+    Devuelve el número del remitente con el formato con el que hay que responderle
+    (tabla de equivalencias y reglas por país, ver services/phone_numbers.py).
     """
-    if from_number == settings.RECIPIENT_WAID_1:
-        from_number = settings.RECIPIENT_ITEM_1
-        logger.info(f"RECIPIENT_WAID_1: {settings.RECIPIENT_WAID_1} detectado, cambiando a RECIPIENT_ITEM_1: {settings.RECIPIENT_ITEM_1}")
-    else:
-        logger.info(f"RECIPIENT_WAID_1: {settings.RECIPIENT_WAID_1} no detectado.")
-    return from_number        
+    return get_phone_normalizer().normalize(from_number)
 
-def send_message_via_wa(to: str, response_message: str, language: str = "es"):
+def sent_message_id(response: httpx.Response) -> str:
     """
-    Envia un mensaje usando la API de WhatsApp Business.
+    Devuelve el id (wamid...) del mensaje enviado según la respuesta de la Graph API, o None.
     """
+    try:
+        return response.json()["messages"][0]["id"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+async def post_to_graph_api(url: str, to: str, **kwargs) -> httpx.Response:
+    """
+    Realiza un POST a la Graph API aplicando las políticas de envío:
+    1. Circuit breaker: si el endpoint está degradado falla rápido con CircuitOpenException (503).
+    2. Limitador de tasa: espera su turno y reencola los envíos rechazados por límite de tasa.
+    3. Reintentos con backoff exponencial y jitter ante errores de conexión (solo si la solicitud no llegó a
+       enviarse, ver RETRYABLE_TRANSPORT_ERRORS) y códigos reintentables.
+
+    Args:
+        url (str): Ruta relativa a META_URL.
+        to (str): Destinatario (para el límite por destinatario).
+        **kwargs: Argumentos adicionales para httpx.AsyncClient.post (headers, json, content...).
+
+    Returns:
+        httpx.Response: Última respuesta recibida.
+    """
+    settings = get_settings()
+    breaker = get_circuit_breaker()
+    limiter = get_rate_limiter()
+    retry_status_codes = parse_status_codes(settings.RETRY_STATUS_CODES)
+    attempt = 0
+    requeues = 0
+    # True mientras el intento en curso ocupa un cupo del circuito sin haber registrado su resultado
+    pending = False
+    try:
+        while True:
+            # Los reencolados por límite de tasa son el mismo intento: no vuelven a pedir cupo al circuito
+            if breaker is not None and not pending:
+                breaker.allow()
+                pending = True
+            if limiter is not None:
+                await limiter.acquire(to)
+            try:
+                response = await get_wa_client().post(url, **kwargs)
+            except httpx.TransportError as e:
+                if breaker is not None:
+                    breaker.record_failure()
+                    pending = False
+                if not isinstance(e, RETRYABLE_TRANSPORT_ERRORS) or attempt + 1 >= settings.RETRY_MAX_ATTEMPTS:
+                    raise
+                delay = backoff_delay(attempt, settings.RETRY_BASE_DELAY, settings.RETRY_MAX_DELAY)
+                logger.warning("Error de transporte al enviar a %s (%r); reintento %s en %.2fs.", to, e, attempt + 1, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            rate_limited = limiter is not None and limiter.observe(to, response)
+            if rate_limited and requeues < settings.RATE_LIMIT_MAX_REQUEUE:
+                requeues += 1
+                continue
+            if response.status_code in retry_status_codes:
+                if breaker is not None:
+                    breaker.record_failure()
+                    pending = False
+                if attempt + 1 < settings.RETRY_MAX_ATTEMPTS:
+                    delay = backoff_delay(attempt, settings.RETRY_BASE_DELAY, settings.RETRY_MAX_DELAY)
+                    logger.warning("La Graph API respondió %s al enviar a %s; reintento %s en %.2fs.", response.status_code, to, attempt + 1, delay)
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+            elif breaker is not None and not rate_limited:
+                # Un rechazo por límite de tasa no dice nada de la salud del endpoint: no cierra el circuito
+                breaker.record_success()
+                pending = False
+            return response
+    finally:
+        # Límite de tasa agotado, cancelación u otro error: el cupo de prueba queda libre para otra llamada
+        if pending:
+            breaker.record_neutral()
+
+async def send_wa_message(to: str, message: OutboundMessage):
+    """
+    Envia un mensaje de cualquier tipo (texto, plantilla, interactivo o multimedia, ver services/wa_messages.py)
+    usando la API de WhatsApp Business.
+    Usa el cliente asíncrono compartido (services.wa_client), por lo que no bloquea el event loop.
+    El envío aplica limitador de tasa, reintentos y circuit breaker (ver post_to_graph_api).
+    La URL, los encabezados y el esqueleto del cuerpo se arman una vez por versión de la configuración:
+    un ACCESS_TOKEN rotado se usa sin reiniciar.
+    """
+    endpoint = get_endpoint()
+    wa_id = to
     to = get_from_number(to)    # controla si reqiere cambiar el formato del número de teléfono del remitente
-    url = f"{settings.META_URL}/{settings.META_API_VER}/{settings.PHONE_NUMBER_ID}/messages"
-    headers = {
-        "Authorization": f"Bearer {settings.ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "text",
-        "text": {"body": response_message},
-    }
+    payload = endpoint.body(to, message)
+    started = time.perf_counter()
+    status = "error"
+    response = None
     try:
-        logger.info(f"Enviando mensaje a {to} : {response_message} con payload: {json.dumps(payload, indent=2)}")
-        response = requests.post(url, headers=headers, json=payload)
+        logger.debug("Enviando mensaje a %s con payload: %s", to, payload)
+        response = await post_to_graph_api(endpoint.url, to, headers=endpoint.headers, content=payload)
+        status = response.status_code
         response.raise_for_status()
-        logger.info(f"Mensaje enviado exitosamente a {to}.")
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Error HTTP al enviar el mensaje a {to}: {response.status_code} - {response.text}")
+        logger.info("Mensaje enviado exitosamente a %s.", to, extra={"wa_id": to, "status_code": response.status_code})
+    except httpx.HTTPStatusError as e:
+        logger.error("Error HTTP al enviar el mensaje a %s: %s - %s", to, response.status_code, response.text)
         if response.status_code == 400:
-            logger.error(f"Detalles del error: {response.json().get('error', {}).get('error_data', {}).get('details')}")
+            logger.error("Detalles del error: %s", response.json().get('error', {}).get('error_data', {}).get('details'))
             raise HTTPException(status_code=response.status_code, detail=response.text)
-    except requests.exceptions.ConnectionError as e:
-        logger.error(f"Error de conexión al enviar el mensaje a {to}: {str(e)}")
+    except httpx.ConnectError as e:
+        status = "connect_error"
+        logger.error("Error de conexión al enviar el mensaje a %s: %s", to, e)
         raise HTTPException(status_code=500, detail="Error de conexión con el servidor de WhatsApp")
-    except requests.exceptions.Timeout as e:
-        logger.error(f"Tiempo de espera agotado al enviar el mensaje a {to}: {str(e)}")
+    except httpx.TimeoutException as e:
+        status = "timeout"
+        logger.error("Tiempo de espera agotado al enviar el mensaje a %s: %s", to, e)
         raise HTTPException(status_code=500, detail="Tiempo de espera agotado")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error inesperado al enviar el mensaje a {to}: {str(e)}")
+    except httpx.RequestError as e:
+        status = "request_error"
+        logger.error("Error inesperado al enviar el mensaje a %s: %s", to, e)
         raise HTTPException(status_code=500, detail="Error inesperado al enviar el mensaje")
+    except CircuitOpenException:
+        status = "circuit_open"
+        raise
+    finally:
+        SEND_DURATION.observe(time.perf_counter() - started, status)
+        SEND_RESPONSES.inc(status)
+        if has_event_listeners():
+            message_id = sent_message_id(response) if response is not None and response.is_success else None
+            # Se registra con el wa_id original, para que la conversación quede bajo el mismo número
+            record_event("out", wa_id, message_id, message.type, message.text, status)
+
+async def send_message_via_wa(to: str, response_message: str, language: str = "es"):
+    """
+    Envia un mensaje de texto usando la API de WhatsApp Business (ver send_wa_message).
+    """
+    await send_wa_message(to, cached_text_message(response_message))
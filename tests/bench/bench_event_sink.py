@@ -0,0 +1,75 @@
+'''
+bench_event_sink.py
+Benchmark de la exportación de eventos de mensajes (services/event_sink.py): costo de registrar un
+evento en el camino de la solicitud, throughput de escritura de cada formato disponible y tiempo de
+lectura con services/event_query.py.
+Author: @DanielChristello - 2024
+
+Ejecutar desde la raíz del proyecto:
+    python -m tests.bench.bench_event_sink [--events 200000] [--batch-size 5000]
+'''
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from services.event_sink import EventSink, RotatingWriter, EXTENSIONS, pyarrow, read_events
+from services.message_events import record_event
+
+TEXTS = ["Hola", "Quiero saber el precio del plan mensual", "gracias!", "¿Cuál es el horario de atención?", "menu"]
+
+def build_events(count: int) -> list:
+    rng = random.Random(7)
+    return [
+        (("in", "out")[i % 2], f"54911{rng.randrange(10 ** 8):08d}", f"wamid.{i:020d}", "text", rng.choice(TEXTS),
+         None if i % 2 == 0 else "200")
+        for i in range(count)
+    ]
+
+async def run_format(format: str, events: list, batch_size: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        writer = RotatingWriter(directory, format)
+        # Sin escrituras periódicas: solo las que dispara el tamaño de lote
+        sink = EventSink(writer, flush_interval=3600.0, batch_size=batch_size, max_pending=len(events) + 1)
+        await sink.open()
+        started = time.perf_counter()
+        record_seconds = 0.0
+        for start in range(0, len(events), batch_size):
+            chunk_started = time.perf_counter()
+            for direction, wa_id, message_id, type, text, status in events[start:start + batch_size]:
+                record_event(direction, wa_id, message_id, type, text, status)
+            record_seconds += time.perf_counter() - chunk_started
+            # Cede el event loop, como entre solicitudes, para que el lote se escriba en segundo plano
+            await asyncio.sleep(0)
+        await sink.close()
+        total_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        read = sum(1 for _ in read_events(directory))
+        read_seconds = time.perf_counter() - started
+        assert read == len(events), f"se leyeron {read} de {len(events)} eventos"
+        return {
+            "record_us": record_seconds / len(events) * 1e6,
+            "events_per_s": len(events) / total_seconds,
+            "bytes_per_event": writer.bytes_written / len(events),
+            "read_events_per_s": read / read_seconds,
+        }
+
+def run(count: int, batch_size: int):
+    events = build_events(count)
+    formats = [name for name in EXTENSIONS if name == "jsonl" or pyarrow is not None]
+    if pyarrow is None:
+        print("pyarrow no está instalado: solo se mide jsonl.")
+    print(f"{count} eventos, lotes de {batch_size}")
+    print(f"{'formato':<10} {'registrar':>12} {'escritura':>16} {'tamaño':>14} {'lectura':>16}")
+    for format in formats:
+        result = asyncio.run(run_format(format, events, batch_size))
+        print(f"{format:<10} {result['record_us']:>9.2f} us {result['events_per_s']:>10.0f} ev/s "
+              f"{result['bytes_per_event']:>8.1f} B/ev {result['read_events_per_s']:>10.0f} ev/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la exportación de eventos de mensajes")
+    parser.add_argument("--events", type=int, default=200_000, help="Cantidad de eventos")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Eventos por lote escrito")
+    args = parser.parse_args()
+    run(args.events, args.batch_size)
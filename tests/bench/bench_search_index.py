@@ -0,0 +1,99 @@
+'''
+bench_search_index.py
+Benchmark del índice de búsqueda de mensajes (services/search_index.py): throughput de indexación en
+lote y latencia de las consultas típicas de GET /search sobre una base con millones de mensajes.
+Author: @DanielChristello - 2024
+
+Ejecutar desde la raíz del proyecto:
+    python -m tests.bench.bench_search_index [--messages 1000000] [--senders 50000] [--db bench_search.db]
+'''
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from services.message_events import MessageEvent
+from services.search_index import SearchIndex
+
+WORDS = ("hola buenos dias quiero saber precio plan mensual anual envio pedido factura horario atencion "
+         "gracias consulta stock talle color rojo azul pago tarjeta transferencia cuotas reclamo demora "
+         "devolucion cambio sucursal direccion telefono whatsapp promocion descuento cupon").split()
+RARE_WORD = "zanahoria"
+
+def build_text(rng: random.Random, index: int) -> str:
+    words = rng.choices(WORDS, k=rng.randint(3, 14))
+    if index % 10_000 == 0:
+        words.append(RARE_WORD)
+    return " ".join(words)
+
+async def populate(index: SearchIndex, messages: int, senders: int, batch_size: int) -> float:
+    rng = random.Random(7)
+    start_ts = time.time() - messages  # un mensaje por segundo hacia atrás
+    started = time.perf_counter()
+    for i in range(messages):
+        wa_id = f"54911{rng.randrange(senders):08d}"
+        index.add(MessageEvent(start_ts + i, ("in", "out")[i % 2], wa_id, f"wamid.{i}", "text", build_text(rng, i)))
+        if len(index._pending) >= batch_size:
+            await index._flush()
+    await index._flush()
+    return time.perf_counter() - started
+
+async def measure(index: SearchIndex, repeat: int, **kwargs) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        page = await index.search(**kwargs)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), max(timings), len(page["results"])
+
+async def run(messages: int, senders: int, db_path: str, batch_size: int, repeat: int):
+    index = SearchIndex(db_path, flush_interval=3600.0, batch_size=batch_size, max_pending=batch_size * 2)
+    await index.open()
+    existing = (await index._reader.run(lambda conn: conn.execute("SELECT count(*) FROM messages").fetchone()))[0]
+    if existing < messages:
+        seconds = await populate(index, messages - existing, senders, batch_size)
+        print(f"indexados {messages - existing} mensajes en {seconds:.1f} s ({(messages - existing) / seconds:.0f} msg/s)")
+    total = (await index._reader.run(lambda conn: conn.execute("SELECT count(*) FROM messages").fetchone()))[0]
+    print(f"base: {total} mensajes, {os.path.getsize(db_path) / 1024 ** 2:.0f} MB")
+
+    sample = await index.search(limit=1)
+    wa_id = sample["results"][0]["wa_id"]
+    newest = sample["results"][0]["ts"]
+    # Cursor de una página profunda: 50 páginas de 20 resultados de una palabra común
+    cursor = None
+    for _ in range(50):
+        cursor = (await index.search(text="precio", cursor=cursor))["next_cursor"]
+    cases = {
+        "palabra común": {"text": "precio"},
+        "dos palabras": {"text": "precio plan"},
+        "prefijo": {"text": "promo*"},
+        "palabra rara": {"text": RARE_WORD},
+        "sin coincidencias": {"text": "inexistente"},
+        "remitente": {"wa_id": wa_id},
+        "remitente + texto": {"wa_id": wa_id, "text": "precio"},
+        "último día": {"since": newest - 86400},
+        "día + texto": {"since": newest - 86400, "until": newest - 43200, "text": "factura"},
+        "día antiguo + texto": {"since": newest - total, "until": newest - total + 86400, "text": "factura"},
+        "página 51": {"text": "precio", "cursor": cursor},
+    }
+    print(f"{'consulta':<20} {'p50':>9} {'max':>9} {'resultados':>11}")
+    for name, kwargs in cases.items():
+        p50, worst, count = await measure(index, repeat, **kwargs)
+        print(f"{name:<20} {p50:>6.2f} ms {worst:>6.2f} ms {count:>11}")
+    await index.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del índice de búsqueda de mensajes")
+    parser.add_argument("--messages", type=int, default=1_000_000, help="Mensajes en la base")
+    parser.add_argument("--senders", type=int, default=50_000, help="Remitentes distintos")
+    parser.add_argument("--db", help="Archivo SQLite (se reutiliza si ya tiene los mensajes); por defecto uno temporal")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Mensajes por lote escrito")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por consulta")
+    args = parser.parse_args()
+    if args.db:
+        asyncio.run(run(args.messages, args.senders, args.db, args.batch_size, args.repeat))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(run(args.messages, args.senders, os.path.join(directory, "search.db"), args.batch_size, args.repeat))
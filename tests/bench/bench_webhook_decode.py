@@ -0,0 +1,41 @@
+'''
+bench_webhook_decode.py
+Benchmark de decodificación del cuerpo del webhook: compara el camino clásico de FastAPI
+(json.loads + validación pydantic de dicts) con los decodificadores de schemas/decoder.py.
+Author: @DanielChristello - 2024
+
+Ejecutar desde la raíz del proyecto:
+    python -m tests.bench.bench_webhook_decode [--number 2000]
+'''
+import argparse
+import json
+import timeit
+from schemas.webhook import WebhookPayload
+from schemas.decoder import decode_payload, available_decoders
+from tests.bench.payloads import build_body, SCENARIOS
+
+def fastapi_default(raw: bytes):
+    """
+    Lo que hacía FastAPI con `payload: WebhookPayload`: json.loads y luego validar los dicts.
+    """
+    return WebhookPayload.model_validate(json.loads(raw))
+
+def run(number: int):
+    decoders = {"fastapi_default": fastapi_default}
+    for name in available_decoders():
+        decoders[name] = lambda raw, name=name: decode_payload(raw, name)
+
+    print(f"{'escenario':<20} {'bytes':>7} " + " ".join(f"{name:>16}" for name in decoders))
+    for scenario, params in SCENARIOS.items():
+        raw = build_body(**params)
+        results = []
+        for name, decode in decoders.items():
+            decode(raw)  # calentamiento
+            seconds = min(timeit.repeat(lambda: decode(raw), number=number, repeat=3))
+            results.append(seconds / number * 1e6)
+        print(f"{scenario:<20} {len(raw):>7} " + " ".join(f"{us:>13.1f} us" for us in results))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de decodificación del webhook")
+    parser.add_argument("--number", type=int, default=2000, help="Iteraciones por medición")
+    run(parser.parse_args().number)
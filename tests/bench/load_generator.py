@@ -0,0 +1,231 @@
+'''
+load_generator.py
+Generador de carga para el webhook: envía payloads realistas (tests/bench/payloads.py) a POST /webhook
+a una tasa fija (--rps, carga abierta) o con una concurrencia fija (--concurrency, carga cerrada),
+y reporta throughput y latencias p50/p95/p99.
+Author: @DanielChristello - 2024
+
+1. En modo --rps las solicitudes se lanzan según un cronograma fijo, sin esperar a las anteriores, y la
+   latencia se mide desde el instante programado: si el servidor se atrasa, el atraso cuenta (evita la
+   "omisión coordinada" que oculta las colas en los benchmarks de carga cerrada).
+2. Los cuerpos se generan antes de empezar; en cada envío solo se reemplaza el id de los mensajes para que
+   la deduplicación del servidor no descarte los repetidos.
+3. Las conexiones se reparten entre varios clientes httpx de hasta CONNECTIONS_PER_CLIENT conexiones: un
+   solo pool con cientos de conexiones se vuelve el cuello de botella del propio generador.
+4. Con --app-secret cada cuerpo se firma (X-Hub-Signature-256) como lo hace Meta; si el servidor tiene
+   APP_SECRET definido, las solicitudes sin firma se rechazan con 401.
+
+Ejecutar desde la raíz del proyecto, con el servidor en marcha:
+    python -m tests.bench.load_generator --url http://127.0.0.1:5000/webhook --rps 200 --duration 10
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+import httpx
+from tests.bench.payloads import build_body, SCENARIOS
+from services.signature import sign
+
+# Conexiones por cliente httpx (ver punto 3)
+CONNECTIONS_PER_CLIENT = 16
+
+def open_clients(connections: int, timeout: float) -> list:
+    """
+    Abre los clientes necesarios para `connections` conexiones simultáneas.
+    """
+    per_client = min(connections, CONNECTIONS_PER_CLIENT)
+    limits = httpx.Limits(max_connections=per_client, max_keepalive_connections=per_client)
+    return [httpx.AsyncClient(timeout=timeout, limits=limits) for _ in range(-(-connections // per_client))]
+
+async def close_clients(clients: list):
+    await asyncio.gather(*(client.aclose() for client in clients))
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """
+    Percentil por rango más cercano sobre una lista ya ordenada.
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+class BodyPool:
+    """
+    Cuerpos pregenerados de un escenario; cada llamada devuelve uno con ids de mensaje únicos
+    y sus encabezados (firmados si se indica `app_secret`).
+    """
+    def __init__(self, scenario: str, size: int = 200, app_secret: str = None):
+        params = SCENARIOS[scenario]
+        self._bodies = [build_body(**params) for _ in range(size)]
+        self._counter = itertools.count()
+        self.app_secret = app_secret
+
+    def next(self) -> tuple:
+        n = next(self._counter)
+        body = self._bodies[n % len(self._bodies)]
+        body = body.replace(b'"wamid.', b'"wamid.r%d.' % n)
+        headers = {"Content-Type": "application/json"}
+        if self.app_secret:
+            headers["X-Hub-Signature-256"] = sign(body, self.app_secret)
+        return body, headers
+
+class LoadResult:
+    """
+    Resultados de una corrida: latencias (segundos), códigos de estado y duración.
+    """
+    def __init__(self):
+        self.latencies: list = []
+        self.status = Counter()
+        self.started = 0.0
+        self.finished = 0.0
+
+    def record(self, latency: float, status):
+        self.latencies.append(latency)
+        self.status[status] += 1
+
+    def report(self) -> dict:
+        latencies = sorted(self.latencies)
+        elapsed = max(self.finished - self.started, 1e-9)
+        ok = sum(count for status, count in self.status.items() if isinstance(status, int) and status < 400)
+        return {
+            "requests": len(latencies),
+            "ok": ok,
+            "errors": len(latencies) - ok,
+            "status": {str(status): count for status, count in sorted(self.status.items(), key=str)},
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 2),
+                "p95": round(percentile(latencies, 95) * 1000, 2),
+                "p99": round(percentile(latencies, 99) * 1000, 2),
+                "max": round((latencies[-1] if latencies else 0.0) * 1000, 2),
+            },
+        }
+
+async def _send(client: httpx.AsyncClient, url: str, request: tuple, result: LoadResult, scheduled: float):
+    body, headers = request
+    try:
+        response = await client.post(url, content=body, headers=headers)
+        status = response.status_code
+    except httpx.TimeoutException:
+        status = "timeout"
+    except httpx.TransportError as e:
+        status = type(e).__name__
+    result.record(time.perf_counter() - scheduled, status)
+
+async def run_fixed_rps(url: str, rps: float, duration: float, pool: BodyPool, timeout: float = 30.0,
+                        max_in_flight: int = 2000) -> LoadResult:
+    """
+    Carga abierta: lanza `rps` solicitudes por segundo durante `duration` segundos.
+    """
+    result = LoadResult()
+    clients = open_clients(max_in_flight, timeout)
+    try:
+        total = int(rps * duration)
+        tasks = []
+        result.started = start = time.perf_counter()
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            client = clients[i % len(clients)]
+            tasks.append(asyncio.create_task(_send(client, url, pool.next(), result, scheduled)))
+        await asyncio.gather(*tasks)
+        result.finished = time.perf_counter()
+    finally:
+        await close_clients(clients)
+    return result
+
+async def run_fixed_concurrency(url: str, concurrency: int, duration: float, pool: BodyPool,
+                                timeout: float = 30.0) -> LoadResult:
+    """
+    Carga cerrada: `concurrency` clientes envían una solicitud tras otra durante `duration` segundos.
+    """
+    result = LoadResult()
+    clients = open_clients(concurrency, timeout)
+    try:
+        result.started = time.perf_counter()
+        deadline = result.started + duration
+
+        async def worker(client):
+            while time.perf_counter() < deadline:
+                await _send(client, url, pool.next(), result, time.perf_counter())
+
+        await asyncio.gather(*(worker(clients[i % len(clients)]) for i in range(concurrency)))
+        result.finished = time.perf_counter()
+    finally:
+        await close_clients(clients)
+    return result
+
+def print_report(report: dict, title: str = "Resultados"):
+    latency = report["latency_ms"]
+    print(f"\n{title}")
+    print(f"  solicitudes : {report['requests']} ({report['ok']} ok, {report['errors']} con error) en {report['elapsed_s']} s")
+    print(f"  throughput  : {report['throughput_rps']} req/s")
+    print(f"  latencia ms : p50={latency['p50']}  p95={latency['p95']}  p99={latency['p99']}  max={latency['max']}")
+    print(f"  estados     : {report['status']}")
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list:
+    """
+    Compara con una corrida anterior y devuelve las regresiones que superan `max_regression` (fracción).
+    """
+    regressions = []
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - max_regression):
+        regressions.append(f"throughput {report['throughput_rps']} < {baseline['throughput_rps']} req/s")
+    for key in ("p50", "p95", "p99"):
+        current, previous = report["latency_ms"][key], baseline["latency_ms"][key]
+        if current > previous * (1 + max_regression):
+            regressions.append(f"latencia {key} {current} > {previous} ms")
+    return regressions
+
+def add_load_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--rps", type=float, help="Solicitudes por segundo (carga abierta)")
+    group.add_argument("--concurrency", type=int, help="Clientes simultáneos (carga cerrada)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de carga")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="single_message", help="Tipo de payload")
+    parser.add_argument("--json", dest="json_path", help="Guardar el reporte en este archivo JSON")
+    parser.add_argument("--baseline", help="Reporte JSON previo contra el cual comparar")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="Regresión tolerada (fracción) frente a --baseline")
+    parser.add_argument("--app-secret", help="Firmar los cuerpos con este App Secret (X-Hub-Signature-256)")
+
+def run_load(url: str, args) -> dict:
+    """
+    Ejecuta la carga según los argumentos, imprime el reporte y lo compara con --baseline.
+    Devuelve el reporte; termina con código 1 si hay regresiones.
+    """
+    pool = BodyPool(args.scenario, app_secret=args.app_secret)
+    if args.concurrency:
+        result = asyncio.run(run_fixed_concurrency(url, args.concurrency, args.duration, pool))
+        mode = f"concurrencia {args.concurrency}"
+    else:
+        rps = args.rps or 100.0
+        result = asyncio.run(run_fixed_rps(url, rps, args.duration, pool))
+        mode = f"{rps:g} req/s"
+    report = result.report()
+    report["scenario"] = args.scenario
+    report["mode"] = mode
+    print_report(report, f"Resultados ({args.scenario}, {mode})")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegresiones frente a la referencia:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            raise SystemExit(1)
+        print("\nSin regresiones frente a la referencia.")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generador de carga para el webhook")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/webhook", help="URL del webhook")
+    add_load_arguments(parser)
+    args = parser.parse_args()
+    run_load(args.url, args)
@@ -0,0 +1,123 @@
+'''
+mock_graph_api.py
+Servidor local que imita el endpoint de envío de mensajes de la Graph API de Meta
+(POST /{version}/{phone_number_id}/messages) para pruebas de carga sin conexión.
+También imita los endpoints de medios: GET /{version}/{media_id} (URL del archivo), la descarga del
+archivo (contenido determinístico a partir del id) y POST /{version}/{phone_number_id}/media (subida).
+Author: @DanielChristello - 2024
+
+Permite configurar la latencia de respuesta y una tasa de errores (5xx o límites de tasa de Meta),
+y expone GET /_stats con la cantidad de llamadas recibidas y su distribución por código.
+
+Ejecutar desde la raíz del proyecto:
+    python -m tests.bench.mock_graph_api --port 9911 --latency 0.05 --jitter 0.02 --error-rate 0.01
+'''
+import argparse
+import asyncio
+import hashlib
+import itertools
+import random
+import time
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def create_app(latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+               rate_limit_rate: float = 0.0, media_size: int = 256 * 1024) -> FastAPI:
+    """
+    Crea la aplicación del mock.
+
+    Args:
+        latency (float): Segundos de demora media de cada respuesta.
+        jitter (float): Variación máxima (+/-) en segundos sobre la latencia.
+        error_rate (float): Fracción (0-1) de respuestas con `error_status`.
+        error_status (int): Código HTTP de los errores simulados.
+        rate_limit_rate (float): Fracción (0-1) de respuestas 429 con el error 130429 de Meta.
+        media_size (int): Tamaño en bytes de los archivos multimedia simulados.
+    """
+    app = FastAPI(title="Mock Graph API")
+    ids = itertools.count()
+    stats = {"calls": 0, "status": Counter(), "media_downloads": 0, "media_uploads": 0, "started": time.time()}
+
+    @app.post("/{version}/{phone_number_id}/messages")
+    async def send_message(version: str, phone_number_id: str, request: Request):
+        payload = await request.json()
+        stats["calls"] += 1
+        delay = max(latency + random.uniform(-jitter, jitter), 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        roll = random.random()
+        if roll < error_rate:
+            stats["status"][error_status] += 1
+            return JSONResponse(status_code=error_status, content={
+                "error": {"message": "Service temporarily unavailable", "type": "OAuthException", "code": 2}
+            })
+        if roll < error_rate + rate_limit_rate:
+            stats["status"][429] += 1
+            return JSONResponse(status_code=429, content={
+                "error": {"message": "(#130429) Rate limit hit", "type": "OAuthException", "code": 130429}
+            })
+        stats["status"][200] += 1
+        return {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": payload.get("to"), "wa_id": payload.get("to")}],
+            "messages": [{"id": f"wamid.mock{next(ids):012d}"}],
+        }
+
+    def media_content(media_id: str) -> bytes:
+        return random.Random(media_id).randbytes(media_size)
+
+    @app.get("/_media/{media_id}")
+    async def download_media(media_id: str):
+        content = media_content(media_id)
+        stats["media_downloads"] += 1
+        chunks = (content[i:i + 65536] for i in range(0, len(content), 65536))
+        return StreamingResponse(chunks, media_type="application/octet-stream")
+
+    @app.post("/{version}/{phone_number_id}/media")
+    async def upload_media(version: str, phone_number_id: str, request: Request):
+        form = await request.form()
+        await form["file"].read()
+        stats["media_uploads"] += 1
+        return {"id": f"mock-media-{next(ids):012d}"}
+
+    @app.get("/_stats")
+    async def read_stats():
+        elapsed = time.time() - stats["started"]
+        return {"calls": stats["calls"], "status": dict(stats["status"]), "media_downloads": stats["media_downloads"],
+                "media_uploads": stats["media_uploads"], "elapsed": round(elapsed, 3)}
+
+    # Va al final porque también coincidiría con /_media/{media_id}
+    @app.get("/{version}/{media_id}")
+    async def media_info(version: str, media_id: str, request: Request):
+        content = media_content(media_id)
+        return {
+            "messaging_product": "whatsapp",
+            "url": str(request.url_for("download_media", media_id=media_id)),
+            "mime_type": "image/jpeg",
+            "sha256": hashlib.sha256(content).hexdigest(),
+            "file_size": len(content),
+            "id": media_id,
+        }
+
+    return app
+
+def run(host: str = "127.0.0.1", port: int = 9911, **options):
+    """
+    Inicia el mock con uvicorn (bloqueante). Pensado para lanzarse en un proceso aparte.
+    """
+    import uvicorn
+    uvicorn.run(create_app(**options), host=host, port=port, log_level="warning")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock local de la Graph API de Meta")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9911)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia media en segundos")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación de la latencia en segundos")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas con error")
+    parser.add_argument("--error-status", type=int, default=503, help="Código HTTP de los errores")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fracción de respuestas 429 (130429)")
+    args = parser.parse_args()
+    run(args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        error_status=args.error_status, rate_limit_rate=args.rate_limit_rate)
@@ -0,0 +1,81 @@
+'''
+payloads.py
+Generador de payloads realistas del webhook de WhatsApp Cloud API para benchmarks y pruebas de carga.
+Los payloads se construyen con los modelos de schemas/webhook.py, de modo que siempre respetan el esquema
+que valida el servidor, e incluyen los campos que Meta envía aunque el servidor los ignore.
+Author: @DanielChristello - 2024
+'''
+import itertools
+import json
+import random
+import time
+from schemas.webhook import WebhookPayload, Entry, Change, Value, Metadata, Contact, Profile, Message, Text, Status
+
+PHONE_NUMBER_ID = "123456789012345"
+_counter = itertools.count()
+
+SAMPLE_TEXTS = [
+    "Hola",
+    "Hola, quisiera saber el horario de atención",
+    "¿Tienen envíos al interior?",
+    "Gracias!",
+    "Necesito ayuda con mi pedido número 48213, llegó incompleto y quisiera saber cómo hacer el reclamo.",
+]
+
+def _wamid() -> str:
+    return f"wamid.HBgNNTQ5MTE{next(_counter):012d}FQIAEhgUM0E"
+
+def text_message(wa_id: str, body: str = None) -> Message:
+    return Message(**{
+        "from": wa_id,
+        "id": _wamid(),
+        "timestamp": str(int(time.time())),
+        "type": "text",
+        "text": Text(body=body if body is not None else random.choice(SAMPLE_TEXTS)),
+    })
+
+def status_update(recipient_id: str, status: str = "delivered") -> Status:
+    return Status(id=_wamid(), status=status, timestamp=str(int(time.time())), recipient_id=recipient_id)
+
+def build_payload(messages: int = 1, statuses: int = 0, senders: int = 1) -> dict:
+    """
+    Construye un payload del webhook como dict (listo para serializar).
+
+    Args:
+        messages (int): Cantidad de mensajes de texto.
+        statuses (int): Cantidad de actualizaciones de estado (sent/delivered/read).
+        senders (int): Cantidad de remitentes distintos entre los que se reparten los mensajes.
+    """
+    wa_ids = [f"54911{random.randint(10_000_000, 99_999_999)}" for _ in range(max(senders, 1))]
+    value = Value(
+        messaging_product="whatsapp",
+        metadata=Metadata(display_phone_number="15551234567", phone_number_id=PHONE_NUMBER_ID),
+        contacts=[Contact(wa_id=wa_id, profile=Profile(name=f"Cliente {i}")) for i, wa_id in enumerate(wa_ids)],
+        messages=[text_message(wa_ids[i % len(wa_ids)]) for i in range(messages)],
+        statuses=[status_update(wa_ids[i % len(wa_ids)], random.choice(["sent", "delivered", "read"])) for i in range(statuses)],
+    )
+    payload = WebhookPayload(object="whatsapp_business_account", entry=[
+        Entry(id="102290129340398", changes=[Change(field="messages", value=value)])
+    ])
+    data = payload.model_dump(by_alias=True, exclude_none=True)
+    # Campos que Meta envía y que el esquema ignora (se incluyen para medir su costo)
+    for message in data["entry"][0]["changes"][0]["value"]["messages"]:
+        message["context"] = {"from": PHONE_NUMBER_ID, "id": _wamid()}
+    for status in data["entry"][0]["changes"][0]["value"]["statuses"]:
+        status["conversation"] = {"id": "CONVERSATION_ID", "origin": {"type": "service"}}
+        status["pricing"] = {"billable": True, "pricing_model": "CBP", "category": "service"}
+    return data
+
+def build_body(messages: int = 1, statuses: int = 0, senders: int = 1) -> bytes:
+    """
+    Igual que build_payload pero devuelve el cuerpo JSON en bytes, como lo recibe el servidor.
+    """
+    return json.dumps(build_payload(messages, statuses, senders), ensure_ascii=False).encode("utf-8")
+
+# Escenarios representativos del tráfico real: la mayoría son estados, algunos mensajes sueltos y ráfagas
+SCENARIOS = {
+    "single_message": dict(messages=1),
+    "single_status": dict(statuses=1),
+    "burst_10_messages": dict(messages=10, senders=3),
+    "mixed_5m_20s": dict(messages=5, statuses=20, senders=5),
+}
@@ -0,0 +1,126 @@
+'''
+run_bench.py
+Benchmark completo y sin conexión del webhook: levanta el mock de la Graph API, el servidor FastAPI
+apuntando a él y el generador de carga, e imprime throughput y latencias p50/p95/p99.
+Author: @DanielChristello - 2024
+
+No necesita Meta, ngrok ni un .env real: las variables obligatorias se completan con valores de prueba
+y el servidor se ejecuta desde un directorio temporal (allí quedan el journal y los datos que escriba).
+
+Ejecutar desde la raíz del proyecto:
+    python -m tests.bench.run_bench --rps 300 --duration 10 --mock-latency 0.05
+    python -m tests.bench.run_bench --concurrency 50 --workers 2 --json bench.json
+    python -m tests.bench.run_bench --rps 300 --baseline bench.json     # falla si hay regresiones
+
+Variables adicionales del servidor (por ejemplo WEBHOOK_ASYNC_MODE=true) se pasan con --env CLAVE=VALOR.
+'''
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from tests.bench import mock_graph_api
+from tests.bench.load_generator import add_load_arguments, run_load
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Valores de prueba para las variables obligatorias de Settings
+BENCH_ENV = {
+    "VERIFY_TOKEN": "bench",
+    "ACCESS_TOKEN": "bench",
+    "PHONE_NUMBER_ID": "123456789012345",
+    "META_API_VER": "v21.0",
+    "APP_ID": "bench",
+    "APP_SECRET": "bench",
+    "NGROK_AUTH_TOKEN": "bench",
+    "NGROK_COMMAND": "ngrok http 5000",
+    "NGROK_TIMEOUT": "5",
+    "RECIPIENT_ITEM_1": "",
+    "RECIPIENT_WAID_1": "",
+    "DEBUG": "false",
+}
+
+def wait_until_ready(url: str, timeout: float = 30.0, process=None):
+    """
+    Espera a que `url` responda (o a que el proceso termine con error).
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"El proceso terminó con código {process.returncode} antes de estar listo")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise TimeoutError(f"{url} no respondió en {timeout} s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sin conexión del webhook con un mock de la Graph API")
+    add_load_arguments(parser)
+    parser.add_argument("--port", type=int, default=5055, help="Puerto del servidor bajo prueba")
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn del servidor")
+    parser.add_argument("--mock-port", type=int, default=9911, help="Puerto del mock de la Graph API")
+    parser.add_argument("--mock-latency", type=float, default=0.05, help="Latencia media del mock (s)")
+    parser.add_argument("--mock-jitter", type=float, default=0.01, help="Variación de la latencia del mock (s)")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0, help="Fracción de respuestas 503 del mock")
+    parser.add_argument("--mock-rate-limit-rate", type=float, default=0.0, help="Fracción de respuestas 429 del mock")
+    parser.add_argument("--env", action="append", default=[], metavar="CLAVE=VALOR", help="Variable extra del servidor")
+    args = parser.parse_args()
+
+    mock = multiprocessing.Process(
+        target=mock_graph_api.run,
+        kwargs=dict(port=args.mock_port, latency=args.mock_latency, jitter=args.mock_jitter,
+                    error_rate=args.mock_error_rate, rate_limit_rate=args.mock_rate_limit_rate),
+        name="mock-graph-api",
+        daemon=True,
+    )
+    mock.start()
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+
+    workdir = tempfile.mkdtemp(prefix="wa-bench-")
+    env = dict(os.environ)
+    for key, value in BENCH_ENV.items():
+        env.setdefault(key, value)
+    env.update({
+        "META_URL": mock_url,
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(args.port),
+        "SERVER_WORKERS": str(args.workers),
+        "SETTINGS_RELOAD_INTERVAL": "0",
+        "LOG_LEVEL": "WARNING",
+        "SERVER_LOG_LEVEL": "warning",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    # La carga se firma con el mismo App Secret que usa el servidor
+    if args.app_secret is None:
+        args.app_secret = env.get("APP_SECRET")
+    # El servidor corre en su propio proceso, desde el directorio temporal para no leer el .env del proyecto
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT_DIR, env.get("PYTHONPATH")]))
+    server = subprocess.Popen(
+        [sys.executable, "-c", "from services.fa_services import start_fastapi; start_fastapi()"],
+        env=env, cwd=workdir,
+    )
+    try:
+        wait_until_ready(f"{mock_url}/_stats")
+        wait_until_ready(f"http://127.0.0.1:{args.port}/", process=server)
+        run_load(f"http://127.0.0.1:{args.port}/webhook", args)
+        mock_stats = httpx.get(f"{mock_url}/_stats").json()
+        print(f"\nGraph API simulada: {mock_stats['calls']} envíos recibidos, estados {mock_stats['status']}")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        mock.terminate()
+        mock.join(timeout=5)
+
+if __name__ == "__main__":
+    main()
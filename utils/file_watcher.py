@@ -0,0 +1,84 @@
+'''
+file_watcher.py
+Vigilancia liviana de archivos de configuración (.env, reglas de respuesta, etc.).
+Author: @DanielChristello - 2024
+
+1. Se consulta os.stat del archivo cada `interval` segundos desde una tarea asyncio: no requiere
+   dependencias externas (watchdog/inotify) y el costo por consulta es una sola llamada al sistema.
+2. Un cambio se detecta comparando (mtime_ns, tamaño, inodo), de modo que también se detectan los
+   reemplazos atómicos (escribir un archivo temporal y renombrarlo sobre el original).
+3. El callback se invoca una vez que el archivo dejó de cambiar entre dos consultas seguidas, para no
+   leer un archivo a medio escribir.
+'''
+import asyncio
+import inspect
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def file_signature(path: str):
+    """
+    Devuelve la firma (mtime_ns, tamaño, inodo) del archivo, o None si no existe.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+class FileWatcher:
+    """
+    Vigila un archivo y llama a `callback(path)` cuando cambia.
+
+    Args:
+        path (str): Archivo a vigilar (puede no existir todavía).
+        callback (callable): Función o corrutina que recibe la ruta del archivo.
+        interval (float): Segundos entre consultas.
+    """
+    def __init__(self, path: str, callback, interval: float = 2.0):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self._signature = file_signature(path)
+        self._task: asyncio.Task = None
+        self.changes = 0
+
+    def start(self):
+        """
+        Lanza la tarea de vigilancia en el event loop actual.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch(), name=f"watch:{os.path.basename(self.path)}")
+            logger.info(f"Vigilando cambios en {self.path} cada {self.interval}s.")
+
+    async def _watch(self):
+        pending = None
+        while True:
+            await asyncio.sleep(self.interval)
+            signature = file_signature(self.path)
+            if signature == self._signature:
+                pending = None
+                continue
+            if signature != pending:
+                # Cambió desde la última consulta: se espera a que se estabilice
+                pending = signature
+                continue
+            self._signature = signature
+            pending = None
+            self.changes += 1
+            try:
+                result = self.callback(self.path)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error al aplicar los cambios de {self.path}: {e}")
+
+    async def close(self):
+        """
+        Detiene la vigilancia.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
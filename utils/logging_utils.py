@@ -0,0 +1,126 @@
+'''
+logging_utils.py
+Configuración de logging de bajo costo para el camino caliente del webhook.
+Author: @DanielChristello - 2024
+
+1. Los registros se encolan (QueueHandler) y un hilo en segundo plano (QueueListener) los formatea y escribe:
+   el hilo que atiende la solicitud no paga el formateo ni la escritura.
+2. El formateo es perezoso: los mensajes se escriben con argumentos (logger.info("... %s", x)) y solo
+   se interpolan en el hilo de escritura, y solo si el registro pasó los filtros de nivel.
+3. La salida es JSON lines (un objeto JSON por línea), con los campos pasados en `extra`.
+4. Los loggers del camino caliente pueden muestrearse (LOG_SAMPLE_RATE): se escribe solo una fracción
+   de sus registros INFO/DEBUG; las advertencias y errores se escriben siempre.
+'''
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# Loggers por los que pasa cada mensaje entrante o saliente
+HOT_PATH_LOGGERS = ("services.message_handler", "services.wa_services", "uvicorn.access")
+
+# Atributos estándar de LogRecord (el resto se considera "extra" y se incluye en el JSON)
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: QueueListener = None
+_handler: logging.Handler = None
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatea cada registro como un objeto JSON en una sola línea.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Deja pasar solo una fracción `rate` de los registros por debajo de WARNING.
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+class _LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler que no formatea el registro al encolarlo (QueueHandler.prepare lo hace por defecto).
+    El formateo ocurre en el hilo del QueueListener. La cola es en memoria, por lo que no hace falta
+    que el registro sea serializable.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def setup_logging(level: str = "INFO", json_output: bool = True, sample_rate: float = 1.0,
+                  hot_loggers: tuple = HOT_PATH_LOGGERS):
+    """
+    Reemplaza los handlers del logger raíz por un QueueHandler y arranca el hilo de escritura.
+    Los loggers de uvicorn se redirigen al logger raíz para que también salgan por la cola.
+
+    Args:
+        level (str): Nivel mínimo del logger raíz.
+        json_output (bool): Si es True la salida es JSON lines; si no, el formato de texto habitual.
+        sample_rate (float): Fracción (0-1) de registros INFO/DEBUG de los loggers del camino caliente que se escriben.
+        hot_loggers (tuple): Nombres de los loggers a muestrear.
+    """
+    global _listener, _handler
+    stop_logging()
+
+    stream = logging.StreamHandler(sys.stderr)
+    if json_output:
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    _handler = _LazyQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, stream, respect_handler_level=False)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    for name in hot_loggers:
+        hot_logger = logging.getLogger(name)
+        hot_logger.filters = [f for f in hot_logger.filters if not isinstance(f, SamplingFilter)]
+        if sample_rate < 1.0:
+            hot_logger.addFilter(SamplingFilter(sample_rate))
+
+    _listener.start()
+
+def stop_logging():
+    """
+    Escribe los registros pendientes, detiene el hilo de escritura y vuelve a escribir directamente
+    (así los mensajes posteriores al apagado no se pierden).
+    """
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _listener = None
+    _handler = None
@@ -2,10 +2,15 @@
 ngrok_utils.py
 ngrrok utilities: necessary functions to manage ngrok tunnels
 Author: @DanielChristello - 2024
-Version: 1.0
-Este es un módulo de funciones para el manejo de tuneles con ngrok
+Version: 1.1
+Este es un módulo de funciones para el manejo de tuneles con ngrok.
++ Funciones síncronas (get_ngrok_tunnel, wait_for_ngrok, test_ngrok_tunnel) para los scripts sueltos.
++ TunnelMonitor: gestión asíncrona del túnel desde el servidor. Corre en segundo plano mientras el
+  servidor arranca, consulta la API local de ngrok con un solo cliente HTTP, con intervalos cortos que
+  crecen exponencialmente mientras el túnel no está listo, y expone su estado para GET /health.
 '''
 import os
+import asyncio
 import logging
 import subprocess
 import httpx
@@ -19,9 +24,49 @@ load_dotenv()
 NGROK_COMMAND = os.getenv("NGROK_COMMAND", "").split()
 NGROK_TIMEOUT = int(os.getenv("NGROK_TIMEOUT", 10))
 
+NGROK_API_URL = "http://127.0.0.1:4040"
+
 # Configuración del logger
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+_client: httpx.Client = None
+
+def _sync_client() -> httpx.Client:
+    """
+    Cliente HTTP compartido por las consultas síncronas a la API local de ngrok.
+    """
+    global _client
+    if _client is None:
+        _client = httpx.Client(base_url=NGROK_API_URL, timeout=2.0)
+    return _client
+
+def probe_intervals(initial: float = 0.05, maximum: float = 1.0):
+    """
+    Intervalos de espera entre consultas: empiezan cortos y se duplican hasta `maximum`
+    (0.05, 0.1, 0.2, ... segundos), para detectar el túnel apenas está listo sin consultar de más.
+    """
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * 2, maximum)
+
+def first_tunnel(data: dict) -> dict:
+    """
+    Devuelve el primer túnel de la respuesta de /api/tunnels, o None si no hay túneles.
+    """
+    tunnels = data.get("tunnels") or []
+    return tunnels[0] if tunnels else None
+
+def tunnel_info(tunnel: dict) -> dict:
+    """
+    Datos del túnel que se informan (nombre, URL pública y URL privada).
+    """
+    return {
+        "name": tunnel.get("name"),
+        "public_url": tunnel.get("public_url"),
+        "private_url": tunnel.get("config", {}).get("addr"),
+    }
+
 def exception_handler(func):
     """
     Decorador para manejar excepciones de forma centralizada y registrar errores en el log.
@@ -59,12 +104,9 @@ def get_ngrok_tunnel():
         dict: Contiene la información del primer túnel activo si existe, o None si no hay túneles.
     """
     try:
-        response = httpx.get("http://127.0.0.1:4040/api/tunnels")
+        response = _sync_client().get("/api/tunnels")
         response.raise_for_status()
-        data = response.json()
-        if "tunnels" in data and len(data["tunnels"]) > 0:
-            return data["tunnels"][0]
-        return None
+        return first_tunnel(response.json())
     except httpx.RequestError as e:
         logging.error(f"Error al conectar con el endpoint de ngrok: {e}")
         return None
@@ -72,7 +114,8 @@ def get_ngrok_tunnel():
 @exception_handler
 def wait_for_ngrok(timeout=NGROK_TIMEOUT):
     """
-    Espera a que ngrok inicie verificando periódicamente si hay un túnel activo.
+    Espera a que ngrok inicie verificando si hay un túnel activo, con intervalos que empiezan cortos
+    y crecen exponencialmente (ver probe_intervals).
 
     Args:
         timeout (int): Tiempo máximo de espera en segundos.
@@ -80,16 +123,17 @@ def wait_for_ngrok(timeout=NGROK_TIMEOUT):
     Returns:
         dict: Información del túnel si se encuentra, None si no se encuentra dentro del tiempo límite.
     """
-    for i in range(1, timeout + 1):
-        logging.info(f"Esperando... {i}/{timeout} segundos")
-        time.sleep(1)
+    deadline = time.monotonic() + timeout
+    for delay in probe_intervals():
         tunnel = get_ngrok_tunnel()
         if tunnel:
             return tunnel
-    return None
-
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        logging.info(f"Esperando a ngrok... {timeout - remaining:.1f}/{timeout} segundos")
+        time.sleep(min(delay, remaining))
 
-    
 @exception_handler
 def start_ngrok_tunnel():
     """
@@ -120,27 +164,123 @@ def test_ngrok_tunnel():
     logging.info("Consultando túneles activos en ngrok...")
     tunnel = get_ngrok_tunnel()
     if tunnel:
-        return {
-            "status": "Túnel activo",
-            "name": tunnel.get("name"),
-            "public_url": tunnel.get("public_url"),
-            "private_url": tunnel.get("config", {}).get("addr"),
-        }
+        return {"status": "Túnel activo", **tunnel_info(tunnel)}
 
     logging.info("No se encontró un túnel activo. Intentando crearlo...")
     if start_ngrok_tunnel():
         logging.info("Esperando a que ngrok se inicie...")
         tunnel = wait_for_ngrok(timeout=10)
         if tunnel:
-            return {
-                "status": "Túnel creado con éxito",
-                "name": tunnel.get("name"),
-                "public_url": tunnel.get("public_url"),
-                "private_url": tunnel.get("config", {}).get("addr"),
-            }
+            return {"status": "Túnel creado con éxito", **tunnel_info(tunnel)}
 
     return {"status": "Error", "message": "No se pudo detectar ni crear el túnel ngrok"}
 
+class TunnelMonitor:
+    """
+    Gestión asíncrona del túnel de ngrok desde el servidor, sin demorar su arranque.
+
+    Estados: "starting" (esperando el túnel), "ready" (túnel activo), "down" (el túnel no apareció en
+    `timeout` segundos o se perdió; se sigue consultando y vuelve a "ready" si aparece).
+
+    Args:
+        api_url (str): URL de la API local de ngrok.
+        timeout (float): Segundos de espera del túnel antes de informarlo como caído.
+        probe_initial / probe_max (float): Intervalo inicial y máximo entre consultas mientras no está listo.
+        health_interval (float): Segundos entre verificaciones cuando el túnel está activo.
+        start_tunnel (bool): Si no hay túnel al arrancar, lanzarlo (start_ngrok_tunnel). Con varios
+            workers solo uno debe hacerlo.
+        transport (httpx.AsyncBaseTransport): Transporte para consultar la API de ngrok (None usa la red).
+    """
+    def __init__(self, api_url: str = NGROK_API_URL, timeout: float = 10.0, probe_initial: float = 0.05,
+                 probe_max: float = 2.0, health_interval: float = 30.0, start_tunnel: bool = False,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.probe_initial = probe_initial
+        self.probe_max = probe_max
+        self.health_interval = health_interval
+        self.start_tunnel = start_tunnel
+        self.transport = transport
+        self.status = "starting"
+        self.tunnel: dict = None
+        self.last_error: str = None
+        self.ready_after: float = None
+        self._client: httpx.AsyncClient = None
+        self._task: asyncio.Task = None
+        # Métricas
+        self.probes = 0
+        self.failures = 0
+
+    def start(self):
+        """
+        Lanza la vigilancia en segundo plano y vuelve de inmediato.
+        """
+        self._client = httpx.AsyncClient(base_url=self.api_url, timeout=min(2.0, self.timeout), transport=self.transport)
+        self._task = asyncio.create_task(self._run(), name="ngrok-monitor")
+
+    async def probe(self) -> dict:
+        """
+        Consulta la API local de ngrok y devuelve el primer túnel activo, o None.
+        """
+        self.probes += 1
+        try:
+            response = await self._client.get("/api/tunnels")
+            response.raise_for_status()
+            tunnel = first_tunnel(response.json())
+            self.last_error = None if tunnel else "ngrok no tiene túneles activos"
+            return tunnel
+        except (httpx.HTTPError, ValueError) as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tunnel = await self.probe()
+        if tunnel is None and self.start_tunnel:
+            logging.info("No se encontró un túnel activo. Intentando crearlo...")
+            await asyncio.to_thread(start_ngrok_tunnel)
+        intervals = probe_intervals(self.probe_initial, self.probe_max)
+        while True:
+            if tunnel is not None:
+                if self.status != "ready":
+                    self.ready_after = loop.time() - started
+                    logging.info(f"Túnel ngrok activo en {self.ready_after:.2f} s: {tunnel.get('public_url')}")
+                self.status = "ready"
+                self.tunnel = tunnel_info(tunnel)
+                intervals = probe_intervals(self.probe_initial, self.probe_max)
+                await asyncio.sleep(self.health_interval)
+            else:
+                if self.status == "ready":
+                    logging.warning(f"Se perdió el túnel ngrok ({self.last_error}).")
+                    self.status = "down"
+                    started = loop.time()
+                elif self.status == "starting" and loop.time() - started >= self.timeout:
+                    logging.error(f"El túnel ngrok no está activo tras {self.timeout} s ({self.last_error}); se sigue verificando.")
+                    self.status = "down"
+                await asyncio.sleep(next(intervals))
+            tunnel = await self.probe()
+
+    def stats(self) -> dict:
+        return {
+            "status": self.status,
+            "tunnel": self.tunnel if self.status == "ready" else None,
+            "ready_after": round(self.ready_after, 3) if self.ready_after is not None else None,
+            "last_error": self.last_error,
+            "probes": self.probes,
+            "failures": self.failures,
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
 #......................................................
 # if __name__ == "__main__":
 #    """
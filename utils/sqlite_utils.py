@@ -0,0 +1,76 @@
+'''
+sqlite_utils.py
+Utilidades para usar SQLite desde código asíncrono.
+Las conexiones de sqlite3 son bloqueantes, por lo que cada almacén usa un hilo dedicado
+(SqliteExecutor) que es dueño de su conexión; el event loop solo espera el resultado.
+'''
+import asyncio
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+def open_sqlite(path: str, synchronous: str = "NORMAL") -> sqlite3.Connection:
+    """
+    Abre (o crea) una base SQLite en modo WAL.
+
+    Args:
+        path (str): Ruta del archivo. Se crean los directorios que falten.
+        synchronous (str): Valor de PRAGMA synchronous ("FULL" fuerza fsync en cada commit).
+
+    Returns:
+        sqlite3.Connection: Conexión lista para usar desde un único hilo.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    return conn
+
+class SqliteExecutor:
+    """
+    Ejecuta funciones sobre una conexión SQLite en un hilo dedicado.
+
+    Args:
+        path (str): Ruta del archivo SQLite.
+        synchronous (str): Valor de PRAGMA synchronous.
+        name (str): Nombre del hilo (para diagnóstico).
+    """
+    def __init__(self, path: str, synchronous: str = "NORMAL", name: str = "sqlite"):
+        self.path = path
+        self.synchronous = synchronous
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._conn: sqlite3.Connection = None
+
+    async def run(self, func, *args):
+        """
+        Ejecuta func(conn, *args) en el hilo de la base y devuelve su resultado.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._call, func, args)
+
+    def run_sync(self, func, *args):
+        """
+        Igual que run() pero bloqueando el hilo actual (para arranque y cierre).
+        """
+        return self._pool.submit(self._call, func, args).result()
+
+    def _call(self, func, args):
+        if self._conn is None:
+            self._conn = open_sqlite(self.path, self.synchronous)
+        return func(self._conn, *args)
+
+    def close(self):
+        """
+        Cierra la conexión y detiene el hilo.
+        """
+        def _close(conn):
+            conn.close()
+        if self._conn is not None:
+            self.run_sync(_close)
+            self._conn = None
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,117 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import httpx
+from services.fa_services import read_health
+from utils import ngrok_utils
+from utils.ngrok_utils import TunnelMonitor, probe_intervals
+'''
+Pruebas de la vigilancia del túnel de ngrok: estados starting/ready/down, backoff de las consultas y /health.
+'''
+TUNNEL = {"name": "metafastapi", "public_url": "https://abc.ngrok.app", "config": {"addr": "http://localhost:8000"}}
+
+class FakeNgrokApi:
+    """
+    API local de ngrok simulada: `mode` es "up" (un túnel), "empty" (sin túneles) o "error" (500).
+    """
+    def __init__(self, mode: str = "empty"):
+        self.mode = mode
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/tunnels"
+        if self.mode == "error":
+            return httpx.Response(500)
+        return httpx.Response(200, json={"tunnels": [TUNNEL] if self.mode == "up" else []})
+
+def health(monitor: TunnelMonitor):
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(tunnel=monitor)))
+    response = read_health(request)
+    if isinstance(response, dict):
+        return 200, response
+    return response.status_code, json.loads(response.body)
+
+async def wait_for_status(monitor: TunnelMonitor, status: str):
+    for _ in range(400):
+        if monitor.status == status:
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError(f"el monitor sigue en '{monitor.status}', se esperaba '{status}'")
+
+def build_monitor(api: FakeNgrokApi) -> TunnelMonitor:
+    return TunnelMonitor("http://ngrok", timeout=0.05, probe_initial=0.005, probe_max=0.02, health_interval=0.01,
+                         transport=httpx.MockTransport(api))
+
+def test_probe_intervals_double_up_to_maximum():
+    intervals = probe_intervals(0.05, 0.3)
+    assert [next(intervals) for _ in range(5)] == [0.05, 0.1, 0.2, 0.3, 0.3]
+
+def test_starting_ready_down_ready():
+    api = FakeNgrokApi("empty")
+
+    async def scenario():
+        monitor = build_monitor(api)
+        monitor.start()
+        try:
+            steps = [(monitor.status, health(monitor)[0])]
+            await wait_for_status(monitor, "down")
+            steps.append((monitor.status, health(monitor)[0]))
+            api.mode = "up"
+            await wait_for_status(monitor, "ready")
+            code, body = health(monitor)
+            steps.append((monitor.status, code))
+            api.mode = "error"
+            await wait_for_status(monitor, "down")
+            steps.append((monitor.status, health(monitor)[0]))
+            last_error = monitor.last_error
+            api.mode = "up"
+            await wait_for_status(monitor, "ready")
+            steps.append((monitor.status, health(monitor)[0]))
+            return steps, body, last_error, monitor.stats()
+        finally:
+            await monitor.close()
+
+    steps, body, last_error, stats = asyncio.run(scenario())
+    assert steps == [("starting", 200), ("down", 503), ("ready", 200), ("down", 503), ("ready", 200)]
+    assert body["tunnel"]["tunnel"] == {"name": "metafastapi", "public_url": "https://abc.ngrok.app",
+                                        "private_url": "http://localhost:8000"}
+    assert last_error.startswith("HTTPStatusError")
+    assert stats["failures"] >= 1
+    assert stats["ready_after"] is not None
+
+def test_probe_backoff_restarts_after_tunnel_is_lost(monkeypatch):
+    api = FakeNgrokApi("empty")
+    delays = []
+    original = ngrok_utils.probe_intervals
+
+    def recording_intervals(initial, maximum):
+        for delay in original(initial, maximum):
+            delays.append(delay)
+            yield delay
+
+    monkeypatch.setattr(ngrok_utils, "probe_intervals", recording_intervals)
+
+    async def scenario():
+        monitor = build_monitor(api)
+        monitor.start()
+        try:
+            await wait_for_status(monitor, "down")
+            while delays[-1] < monitor.probe_max:
+                await asyncio.sleep(0.005)
+            api.mode = "up"
+            await wait_for_status(monitor, "ready")
+            seen = len(delays)
+            api.mode = "empty"
+            await wait_for_status(monitor, "down")
+            while len(delays) == seen:
+                await asyncio.sleep(0.005)
+            return delays[:seen], delays[seen]
+        finally:
+            await monitor.close()
+
+    before, after = asyncio.run(scenario())
+    assert before[0] == 0.005 and before[-1] == 0.02
+    # Tras perder el túnel las consultas vuelven a empezar por el intervalo inicial
+    assert after == 0.005
+
+def test_health_without_tunnel_monitor():
+    assert health(None) == (200, {"status": "ok", "tunnel": None})